@@ -10,17 +10,19 @@ PyNullWeb - a web server that returns minimal content.
 
 from __future__ import print_function
 
-import ConfigParser
-import argparse
+import sys
 
-from typing import Dict, List, Tuple  # NOQA, pylint: disable=unused-import
+import pynullweb.handoff
+import pynullweb.modes
+import pynullweb.reload
 
-import pynullweb.handler
-import pynullweb.server
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, List, Tuple  # NOQA, pylint: disable=unused-import
 
 
 def parser2dict(config_parser):
-    # type: (ConfigParser.ConfigParser) -> Dict[str, Dict[str, str]]
+    # type: (Any) -> Dict[str, Dict[str, str]]
     """Transform the data from a config parser into a dict of dicts."""
     result = {}
     for section in config_parser.sections():
@@ -32,15 +34,53 @@ def parser2dict(config_parser):
 
 
 def get_config(args):
-    # type: (argparse.Namespace) -> Dict[str, Dict[str, str]]
-    """Read config file and set configuration."""
-    config_parser = ConfigParser.SafeConfigParser()
+    # type: (Any) -> Dict[str, Dict[str, str]]
+    """Read config file and set configuration.
+
+    Values are not interpolated, so that file names may contain "%".
+    """
+    try:
+        from ConfigParser import RawConfigParser
+    except ImportError:  # Python 3
+        from configparser import RawConfigParser  # type: ignore
+    config_parser = RawConfigParser()
     config_parser.add_section("server")
     config_parser.set("server", "verbose", "0")
     config_parser.set("server", "port", "2468")
+    config_parser.set("server", "listen", "")
     config_parser.set("server", "redirect", "")
     config_parser.set("server", "localhosts", "")
+    config_parser.set("server", "mode", pynullweb.modes.DEFAULT_MODE)
+    config_parser.set("server", "workers", "0")
+    config_parser.set("server", "negotiation_cache", "256")
+    config_parser.set("server", "max_accept_length", "4096")
+    config_parser.set("server", "payloads", "")
+    config_parser.set("server", "blocklists", "")
+    config_parser.set("server", "rules", "")
+    config_parser.set("server", "access_log", "stderr")
+    config_parser.set("server", "access_log_sample", "1")
+    config_parser.set("server", "access_log_queue", "8192")
+    config_parser.set("server", "metrics_path", "")
+    config_parser.set("server", "profile_seconds", "0")
+    config_parser.set("server", "profile_output", "")
+    config_parser.set("server", "keep_alive_timeout", "15")
+    config_parser.set("server", "keep_alive_requests", "100")
+    config_parser.set("server", "drain_timeout", "10")
+    config_parser.set("server", "backlog", "128")
+    config_parser.set("server", "max_connections", "0")
+    config_parser.set("server", "rate_limit", "0")
+    config_parser.set("server", "rate_burst", "0")
+    config_parser.set("server", "header_timeout", "10")
+    config_parser.set("server", "tls_port", "")
+    config_parser.set("server", "tls_dir", "")
+    config_parser.set("server", "tls_contexts", "256")
+    config_parser.set("server", "tls_certificates", "4096")
     # read config
+    if args.config:
+        read_file = getattr(config_parser, "read_file", None) or \
+            config_parser.readfp  # Python 2
+        with open(args.config) as config_file:
+            read_file(config_file)
     config = parser2dict(config_parser)
     if args.verbose:
         config["server"]["verbose"] = args.verbose
@@ -50,23 +90,161 @@ def get_config(args):
         config["server"]["port"] = args.port
     else:
         config["server"]["port"] = str(int(config["server"]["port"]))
+    if args.listen:
+        config["server"]["listen"] = ",".join(args.listen)
     if args.redirect:
         config["server"]["redirect"] = args.redirect
     if args.localhosts:
         config["server"]["localhosts"] = args.localhosts
+    if args.mode:
+        config["server"]["mode"] = args.mode
+    if args.workers:
+        config["server"]["workers"] = str(args.workers)
+    if args.keep_alive_timeout is not None:
+        config["server"]["keep_alive_timeout"] = str(args.keep_alive_timeout)
+    if args.keep_alive_requests is not None:
+        config["server"]["keep_alive_requests"] = str(
+            args.keep_alive_requests)
+    if args.drain_timeout is not None:
+        config["server"]["drain_timeout"] = str(args.drain_timeout)
+    if args.backlog is not None:
+        config["server"]["backlog"] = str(args.backlog)
+    if args.max_connections is not None:
+        config["server"]["max_connections"] = str(args.max_connections)
+    if args.rate_limit is not None:
+        config["server"]["rate_limit"] = str(args.rate_limit)
+    if args.rate_burst is not None:
+        config["server"]["rate_burst"] = str(args.rate_burst)
+    if args.header_timeout is not None:
+        config["server"]["header_timeout"] = str(args.header_timeout)
+    if args.tls_port is not None:
+        config["server"]["tls_port"] = str(args.tls_port)
+    if args.tls_dir:
+        config["server"]["tls_dir"] = args.tls_dir
+    if args.tls_contexts is not None:
+        config["server"]["tls_contexts"] = str(args.tls_contexts)
+    if args.tls_certificates is not None:
+        config["server"]["tls_certificates"] = str(args.tls_certificates)
+    if args.negotiation_cache is not None:
+        config["server"]["negotiation_cache"] = str(args.negotiation_cache)
+    if args.max_accept_length is not None:
+        config["server"]["max_accept_length"] = str(args.max_accept_length)
+    if args.payloads:
+        config["server"]["payloads"] = args.payloads
+    if args.blocklist:
+        config["server"]["blocklists"] = ",".join(args.blocklist)
+    if args.rule:
+        config["server"]["rules"] = "\n".join(args.rule)
+    if args.access_log is not None:
+        config["server"]["access_log"] = \
+            "" if args.access_log == "off" else args.access_log
+    if args.access_log_sample is not None:
+        config["server"]["access_log_sample"] = str(args.access_log_sample)
+    if args.access_log_queue is not None:
+        config["server"]["access_log_queue"] = str(args.access_log_queue)
+    if args.metrics_path:
+        config["server"]["metrics_path"] = args.metrics_path
+    if args.profile_seconds is not None:
+        config["server"]["profile_seconds"] = str(args.profile_seconds)
+    if args.profile_output:
+        config["server"]["profile_output"] = args.profile_output
     return config
 
 
 def main():
     # type: () -> None
     """Start the main program."""
+    import argparse
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c", "--config", type=str, metavar="FILE",
+        help="configuration file, reloaded on change and on SIGHUP")
     parser.add_argument(
         '-p', '--port', type=int, help="port number of web server")
     parser.add_argument(
-        "-l", "--localhosts", type=str, help="list of local hosts")
+        "-L", "--listen", action="append", metavar="ADDRESS",
+        help="PORT, HOST:PORT, [IPV6]:PORT, or unix:PATH, instead of --port")
+    parser.add_argument(
+        "-l", "--localhosts", type=str,
+        help="comma-separated local host names, *.domain for whole domains")
     parser.add_argument(
         "-r", "--redirect", type=str, help="redirect local traffic")
+    parser.add_argument(
+        "-m", "--mode", choices=pynullweb.modes.server_modes(),
+        help="concurrency mode of web server")
+    parser.add_argument(
+        "-w", "--workers", type=int,
+        help="number of worker threads / processes")
+    parser.add_argument(
+        "--keep-alive-timeout", type=float,
+        help="seconds an idle connection is kept open, 0 to close it after "
+        "the response (not in modes single and prefork)")
+    parser.add_argument(
+        "--keep-alive-requests", type=int,
+        help="maximum number of requests per connection")
+    parser.add_argument(
+        "--drain-timeout", type=float, metavar="SECONDS",
+        help="time to finish open connections after a restart (SIGUSR2)")
+    parser.add_argument(
+        "--backlog", type=int, metavar="SIZE",
+        help="connections waiting to be accepted")
+    parser.add_argument(
+        "--max-connections", type=int, metavar="N",
+        help="open connections (per worker process), more get status 503")
+    parser.add_argument(
+        "--rate-limit", type=float, metavar="RATE",
+        help="requests per second and client address, more get status 503")
+    parser.add_argument(
+        "--rate-burst", type=float, metavar="N",
+        help="requests a client may send at once (default: rate limit)")
+    parser.add_argument(
+        "--header-timeout", type=float, metavar="SECONDS",
+        help="time to receive a request head, 0 for no limit")
+    parser.add_argument(
+        "--tls-port", type=int, metavar="PORT",
+        help="port number of an additional TLS listener")
+    parser.add_argument(
+        "--tls-dir", type=str, metavar="DIR",
+        help="local certificate authority (default ~/.pynullweb/tls)")
+    parser.add_argument(
+        "--tls-contexts", type=int, metavar="N",
+        help="number of cached TLS contexts, one per host name")
+    parser.add_argument(
+        "--tls-certificates", type=int, metavar="N",
+        help="number of certificates kept in the TLS directory")
+    parser.add_argument(
+        "--negotiation-cache", type=int,
+        help="number of cached content negotiation results")
+    parser.add_argument(
+        "--max-accept-length", type=int,
+        help="number of Accept header characters used for negotiation")
+    parser.add_argument(
+        "--payloads", type=str,
+        help="directory of files to deliver as additional minimal content")
+    parser.add_argument(
+        "-b", "--blocklist", action="append", metavar="PATH[:STATUS]",
+        help="hosts file or domain list, answered with status (default 200)")
+    parser.add_argument(
+        "--rule", action="append", metavar="RULE",
+        help="response rule, e.g. \"host=example.com ext=js status=204\"")
+    parser.add_argument(
+        "--access-log", type=str, metavar="TARGET",
+        help="stderr (default), stdout, syslog, file name, or off")
+    parser.add_argument(
+        "--access-log-sample", type=int, metavar="N",
+        help="log only every N-th request")
+    parser.add_argument(
+        "--access-log-queue", type=int, metavar="SIZE",
+        help="queued log records, more are dropped")
+    parser.add_argument(
+        "--metrics-path", type=str, metavar="PATH",
+        help="URL path of metrics in Prometheus format, e.g. /.metrics")
+    parser.add_argument(
+        "--profile-seconds", type=float, metavar="SECONDS",
+        help="sample stacks for this time when receiving SIGUSR1")
+    parser.add_argument(
+        "--profile-output", type=str, metavar="FILE",
+        help="file for the collapsed stacks, %%d is replaced by the pid")
     parser.add_argument(
         "-v", "--verbose", action="count", default=0,
         help="increase verbosity")
@@ -75,8 +253,11 @@ def main():
     config = get_config(args)
 
     server_address = ("", int(config["server"]["port"]))
-    httpd = pynullweb.server.NullWebServer(
-        server_address, pynullweb.handler.NullWebHandler, config)
+    httpd = pynullweb.modes.create_server(server_address, None, config)
+    httpd.reloader = pynullweb.reload.ConfigReloader(
+        lambda: get_config(args), httpd.reconfigure, args.config or "")
+    httpd.handoff = pynullweb.handoff.Handoff(
+        [sys.executable, "-m", "pynullweb"] + sys.argv[1:])
     httpd.serve_forever()
 
 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Accesslog - asynchronous, batched logging of answered requests.
+
+Request handlers only append a tuple with the raw data of a request to a
+bounded queue. A background thread formats the queued records and writes
+them in batches to the log target, so that slow log I/O never delays a
+response. If the queue is full, new records are dropped and counted.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import collections
+import sys
+import threading
+import time
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Callable, Dict, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+    Record = Tuple[float, str, str, Any, str, Any, Any, Any]
+
+
+def to_text(value):  # type: (Any) -> str
+    """Return a field of a record as a string."""
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode("latin-1")
+    return str(value)
+
+
+def format_record(record, date):  # type: (Record, str) -> str
+    """Format a record as line in (almost) common log format.
+
+    Records without a method contain an arbitrary message instead of the
+    request path.
+    """
+    _, peer, host, method, path, version, code, size = record
+    if method is None:
+        return "%s %s - [%s] %s\n" % (peer, to_text(host), date, path)
+    return '%s %s - [%s] "%s %s %s" %s %s\n' % (
+        peer, to_text(host), date, to_text(method), path, to_text(version),
+        code, size)
+
+
+class StreamSink(object):
+    """Write lines to a file object."""
+
+    def __init__(self, stream, owned=False):  # type: (Any, bool) -> None
+        """Initialize with the file object; close it only if owned."""
+        self.stream = stream
+        self.owned = owned
+
+    def write(self, lines):  # type: (List[str]) -> None
+        """Write and flush the lines."""
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+    def close(self):  # type: () -> None
+        """Close the file object, if it was opened by the sink."""
+        if self.owned:
+            self.stream.close()
+
+
+class SyslogSink(object):
+    """Send lines to the local syslog daemon."""
+
+    def __init__(self):  # type: () -> None
+        """Open the connection to syslog."""
+        import syslog
+        self.syslog = syslog
+        syslog.openlog("pynullweb", 0, syslog.LOG_DAEMON)
+
+    def write(self, lines):  # type: (List[str]) -> None
+        """Send one syslog message per line."""
+        for line in lines:
+            self.syslog.syslog(self.syslog.LOG_INFO, line.rstrip("\n"))
+
+    def close(self):  # type: () -> None
+        """Close the connection to syslog."""
+        self.syslog.closelog()
+
+
+def open_sink(target):  # type: (str) -> Any
+    """Return the sink for a log target.
+
+    The target is "stderr", "stdout", "syslog", or the path of a file,
+    where lines are appended.
+    """
+    if target == "stderr":
+        return StreamSink(sys.stderr)
+    if target == "stdout":
+        return StreamSink(sys.stdout)
+    if target == "syslog":
+        return SyslogSink()
+    return StreamSink(open(target, "a"), owned=True)
+
+
+class AccessLog(object):
+    """Bounded queue of log records, written by a background thread.
+
+    Appending to and removing from a deque is atomic, so neither request
+    handlers nor the writer need a lock. If sample is greater than one, only
+    every sample-th request is logged. Messages are never sampled. The
+    counters are not synchronized, they may be slightly off when many
+    threads log at the same time.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, sink=None, sample=1, capacity=8192, interval=0.5):
+        # type: (Any, int, int, float) -> None
+        """Initialize the log; records are written only after start()."""
+        self.sink = sink
+        self.sample = max(1, sample)
+        self.capacity = capacity
+        self.interval = interval
+        self.requests = 0
+        self.sampled = 0
+        self.dropped = 0
+        self.written = 0
+        self._reported = 0
+        self._queue = collections.deque()  # type: collections.deque
+        self._stopping = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._second = -1
+        self._date = ""
+
+    @classmethod
+    def from_config(cls, config):
+        # type: (Dict[str, str]) -> AccessLog
+        """Create the access log from the server configuration.
+
+        An empty target disables the access log.
+        """
+        target = config.get("access_log", "stderr")
+        return cls(
+            open_sink(target) if target else None,
+            int(config.get("access_log_sample", "1")),
+            int(config.get("access_log_queue", "8192")))
+
+    @property
+    def enabled(self):  # type: () -> bool
+        """Return True, if records are logged at all."""
+        return self.sink is not None
+
+    def log(self, peer, host, method, path, version, code, size="-"):
+        # type: (str, Any, Any, str, Any, Any, Any) -> None
+        """Queue the record of an answered request.
+
+        Method and version may be given as bytes, they are decoded by the
+        writer.
+        """
+        if self.sink is None:
+            return
+        self.requests += 1
+        if self.sample > 1 and self.requests % self.sample:
+            self.sampled += 1
+            return
+        self.put((time.time(), peer, host, method, path, version, code, size))
+
+    def message(self, peer, host, text):  # type: (str, Any, str) -> None
+        """Queue an arbitrary message, e.g. an error."""
+        if self.sink is not None:
+            self.put((time.time(), peer, host, None, text, None, None, None))
+
+    def put(self, record):  # type: (Record) -> None
+        """Append a record to the queue, drop it if the queue is full."""
+        if len(self._queue) >= self.capacity:
+            self.dropped += 1
+        else:
+            self._queue.append(record)
+
+    def date(self, seconds):  # type: (float) -> str
+        """Return the formatted local time, computed once per second."""
+        second = int(seconds)
+        if second != self._second:
+            self._date = time.strftime(
+                "%d/%b/%Y %H:%M:%S", time.localtime(second))
+            self._second = second
+        return self._date
+
+    def flush(self):  # type: () -> None
+        """Format and write all queued records."""
+        if self.sink is None:
+            return
+        lines = []
+        queue = self._queue
+        while True:
+            try:
+                record = queue.popleft()
+            except IndexError:
+                break
+            lines.append(format_record(record, self.date(record[0])))
+        self.written += len(lines)
+        dropped = self.dropped
+        if dropped != self._reported:
+            lines.append("- - - [%s] access log dropped %d records\n" % (
+                self.date(time.time()), dropped - self._reported))
+            self._reported = dropped
+        if lines:
+            try:
+                self.sink.write(lines)
+            except (IOError, OSError, ValueError):
+                pass
+
+    def run(self):  # type: () -> None
+        """Write queued records periodically until the log is closed."""
+        while not self._stopping.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def start(self):  # type: () -> None
+        """Start the writer thread.
+
+        After a fork, the child process must call this method again, because
+        threads are not inherited.
+        """
+        if self.sink is None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):  # type: () -> None
+        """Stop the writer thread, after it wrote all queued records."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def close(self):  # type: () -> None
+        """Stop writing and close the sink."""
+        self.stop()
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def stats(self):  # type: () -> Dict[str, int]
+        """Return the counters of the log."""
+        return {
+            "requests": self.requests, "sampled": self.sampled,
+            "dropped": self.dropped, "written": self.written,
+            "queued": len(self._queue)}
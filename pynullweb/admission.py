@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Admission - limit open connections and request rates under overload.
+
+A server that is flooded, e.g. by a misbehaving device or a crawler, should
+spend as little as possible on the requests it will not serve. Connections
+beyond the limit of open connections, and requests of clients that exceed
+their rate, are answered with a canned 503 response and closed, before the
+request is parsed. The servers count what was shed.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import collections
+import threading
+import time
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+# Number of clients with a token bucket, before the least recent is removed
+MAX_CLIENTS = 65536
+
+
+class RateLimiter(object):
+    """Token buckets of requests per client address.
+
+    A client may send up to burst requests at once, and rate requests per
+    second in the long run. If there are too many clients, the bucket of
+    the least recent one is removed. It is most likely full again, which
+    is equivalent to no bucket.
+    """
+
+    def __init__(self, rate, burst=0.0, max_clients=MAX_CLIENTS):
+        # type: (float, float, int) -> None
+        """Initialize with the rate per second, and the bucket size."""
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_clients = max_clients
+        self._buckets = collections.OrderedDict()  # type: Dict[str, Tuple[float, float]]  # NOQA
+        self._lock = threading.Lock()
+
+    def allow(self, client, now=None):
+        # type: (str, Optional[float]) -> bool
+        """Take a token from the bucket of a client, if it is not empty."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def __len__(self):  # type: () -> int
+        """Return the number of clients with a bucket."""
+        return len(self._buckets)
+
+
+class AdmissionControl(object):
+    """Decide which connections and requests are served.
+
+    A limit of zero means no limit. In pre-fork mode, the limit of open
+    connections applies to every worker process.
+    """
+
+    def __init__(self, max_connections=0, rate=0.0, burst=0.0):
+        # type: (int, float, float) -> None
+        """Initialize with the limits."""
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(rate, burst) if rate > 0 else None
+        self.active = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        # type: (Dict[str, str]) -> AdmissionControl
+        """Create the admission control of the server configuration."""
+        return cls(
+            int(config.get("max_connections", "0")),
+            float(config.get("rate_limit", "0")),
+            float(config.get("rate_burst", "0")))
+
+    def open(self):  # type: () -> bool
+        """Count a new connection, return False if it must be shed.
+
+        Every connection must be counted as closed later, even a shed one.
+        """
+        with self._lock:
+            self.active += 1
+            return not self.max_connections or \
+                self.active <= self.max_connections
+
+    def close(self):  # type: () -> None
+        """Count a closed connection."""
+        with self._lock:
+            self.active -= 1
+
+    def allow(self, client):  # type: (str) -> bool
+        """Return True, if a request of the client may be served."""
+        return self.limiter is None or self.limiter.allow(client)
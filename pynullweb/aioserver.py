@@ -0,0 +1,520 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Aioserver - null web server based on an asyncio event loop (Python 3 only).
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+from __future__ import print_function
+
+import asyncio
+import sys
+import threading
+import time
+
+import pynullweb.accesslog
+import pynullweb.admission
+import pynullweb.handoff
+import pynullweb.listeners
+import pynullweb.metrics
+import pynullweb.profiler
+import pynullweb.reload
+import pynullweb.response
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+    import socket  # NOQA, pylint: disable=unused-import
+    import pynullweb.rules  # NOQA, pylint: disable=unused-import
+    import pynullweb.tls  # NOQA, pylint: disable=unused-import
+
+
+MAX_HEAD_SIZE = 65536
+MIN_CHECK_INTERVAL = 0.05
+
+
+def parse_head(head):
+    # type: (bytes) -> Optional[Tuple[bytes, str, bytes, Dict[bytes, str]]]
+    """Parse the head of a request into method, path, version and headers.
+
+    Only the headers that are relevant for the null web server are returned,
+    their names are lower case. Return None, if the head is malformed.
+    """
+    lines = head.split(b"\n")
+    words = lines[0].split()
+    if len(words) != 3 or not words[2].startswith(b"HTTP/"):
+        return None
+    method, path, version = words
+    headers = {}  # type: Dict[bytes, str]
+    for line in lines[1:]:
+        name, sep, value = line.partition(b":")
+        if not sep:
+            return None
+        name = name.strip().lower()
+        if name in (b"host", b"accept", b"connection", b"if-none-match",
+                    b"if-modified-since"):
+            headers[name] = value.strip().decode("latin-1")
+    return method, path.decode("latin-1"), version, headers
+
+
+class NullWebProtocol(asyncio.Protocol):
+    """Connection to a client of the asyncio null web server."""
+
+    __slots__ = (
+        "server", "transport", "buffer", "last_active", "head_started",
+        "peer", "requests_left", "shed")
+
+    def __init__(self, server):
+        # type: (AsyncNullWebServer) -> None
+        """Initialize the connection state."""
+        self.server = server
+        self.transport = None  # type: Optional[asyncio.Transport]
+        self.buffer = b""
+        self.last_active = self.head_started = time.time()
+        self.peer = "-"
+        self.requests_left = server.keep_alive_requests
+        self.shed = False
+
+    def connection_made(self, transport):
+        # type: (asyncio.BaseTransport) -> None
+        """Register a new connection."""
+        self.transport = transport  # type: ignore
+        peer = transport.get_extra_info("peername")
+        if peer:
+            self.peer = peer[0]
+        self.server.connections.add(self)
+        self.server.metrics.connection(1)
+        if not self.server.admission.open():
+            # Close after the client, so that the response is not reset
+            self.shed = True
+            self.server.metrics.count("shed", "connections")
+            self.transport.write(self.server.snapshot.responses.error(503))
+            if self.transport.can_write_eof():
+                self.transport.write_eof()
+            else:  # TLS
+                self.transport.close()
+
+    def connection_lost(self, exc):
+        # type: (Optional[Exception]) -> None
+        """Unregister a closed connection."""
+        self.server.connections.discard(self)
+        self.server.metrics.connection(-1)
+        self.server.admission.close()
+        self.transport = None
+        if self.server.draining:
+            self.server.stop_when_drained()
+
+    def data_received(self, data):
+        # type: (bytes) -> None
+        """Answer all complete requests, keep partial data for later.
+
+        The header timeout of a partial request starts when its first data
+        is received, even if it follows other requests.
+        """
+        if self.shed:
+            return
+        self.last_active = time.time()
+        buf = self.buffer + data if self.buffer else data
+        responses = []  # type: List[pynullweb.response.Body]
+        keep_alive = True
+        while keep_alive:
+            end = buf.find(b"\r\n\r\n")
+            if end < 0:
+                break
+            self.requests_left -= 1
+            start = time.time()
+            keep_alive = self.server.respond(
+                buf[:end].replace(b"\r\n", b"\n"), self.peer, responses,
+                self.requests_left <= 0 or self.server.draining or
+                self.server.keep_alive_timeout <= 0)
+            self.server.metrics.observe(time.time() - start)
+            buf = buf[end + 4:]
+            self.head_started = self.last_active
+        if responses:
+            self.transport.writelines(responses)
+        if not keep_alive:
+            self.transport.close()
+        elif len(buf) > MAX_HEAD_SIZE:
+            self.transport.write(self.server.snapshot.responses.error(431))
+            self.transport.close()
+        else:
+            if buf and not self.buffer:
+                self.head_started = self.last_active
+            self.buffer = buf
+
+
+class AsyncNullWebServer(object):
+    """Null web server that serves connections within one event loop.
+
+    It provides the same interface as the BaseHTTPServer-based null web
+    servers, so it can be used as a drop-in replacement. All listening
+    sockets are served by the same event loop.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, server_address, request_handler, config):
+        # type: (Tuple[str, int], type, Dict[str, Dict[str, str]]) -> None
+        """Initialize the server data and bind the listening socket."""
+        self._verbose = int(config["server"]["verbose"])
+        self.reconfigure(config)
+        self.reloader = None  # type: Optional[pynullweb.reload.ConfigReloader]
+        self.access_log = pynullweb.accesslog.AccessLog.from_config(
+            config["server"])
+        self.keep_alive_timeout = float(
+            config["server"].get("keep_alive_timeout", "15"))
+        self.keep_alive_requests = int(
+            config["server"].get("keep_alive_requests", "100"))
+        self.metrics = pynullweb.metrics.create_metrics(self)
+        self.metrics_path = config["server"].get("metrics_path", "")
+        self.profiler = pynullweb.profiler.ProfileTrigger.from_config(
+            config["server"])
+        self.handoff = None  # type: Optional[pynullweb.handoff.Handoff]
+        self.drain_timeout = float(config["server"].get("drain_timeout", "10"))
+        self.draining = False
+        self.header_timeout = float(
+            config["server"].get("header_timeout", "10"))
+        self.admission = pynullweb.admission.AdmissionControl.from_config(
+            config["server"])
+        self.connections = set()  # type: set
+        self.loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._servers = []  # type: List[asyncio.AbstractServer]
+        self._stopped = threading.Event()
+        backlog = int(config["server"].get("backlog", "128"))
+        inherited = pynullweb.handoff.inherited_sockets()
+        self.sockets = []  # type: List[socket.socket]
+        self.tls = None  # type: Optional[pynullweb.tls.TlsListener]
+        try:
+            for family, address in pynullweb.listeners.from_config(
+                    config["server"], server_address):
+                self.sockets.append(pynullweb.listeners.bind(
+                    family, address, backlog, inherited))
+            if config["server"].get("tls_port"):
+                self.tls = self.listen_tls(
+                    config["server"], server_address[0], backlog, inherited)
+        except Exception:
+            self.server_close()
+            raise
+        finally:
+            for listener in inherited:  # Address is no longer configured
+                listener.close()
+        self.socket = self.sockets[0]
+        self.server_address = self.socket.getsockname()
+        self.server_port = self.server_address[1] \
+            if isinstance(self.server_address, tuple) else 0
+        if self._verbose > 0:
+            print("Server listening on port %d" % (self.server_port,))
+            print("- Mode        = asyncio")
+            print("- Local hosts = %s" % (self.localhosts,))
+            print("- Redirect    = %s" % (self.redirect,))
+            if self.profiler is not None:
+                print("- Profiling   = %gs on SIGUSR1" % (
+                    self.profiler.seconds,))
+            for listener in self.sockets[1:]:
+                print("- Listening   = %s" % (
+                    pynullweb.listeners.describe(listener),))
+            if self.tls is not None:
+                print("- TLS         = %s" % (
+                    pynullweb.listeners.describe(self.tls.socket),))
+
+    def listen_tls(self, config, host, backlog, inherited):
+        # type: (Dict[str, str], str, int, List[socket.socket]) -> pynullweb.tls.TlsListener  # NOQA
+        """Create the TLS listener, TLS support is imported only if needed.
+
+        The handshakes run on the event loop, so they do not wait for
+        certificates to be minted.
+        """
+        import pynullweb.tls
+        listener = pynullweb.tls.TlsListener.from_config(
+            config, host, backlog, inherited, wait=False)
+        pynullweb.metrics.register_tls(self.metrics, listener.contexts)
+        return listener
+
+    def reconfigure(self, config):
+        # type: (Dict[str, Dict[str, str]]) -> None
+        """Put the reloadable part of a configuration into effect.
+
+        Requests that are being answered keep the previous snapshot.
+        """
+        self.snapshot = pynullweb.reload.Snapshot.from_config(
+            config["server"], self.protocol_version)
+
+    @property
+    def redirect(self):
+        # type: () -> str
+        """Return URL prefix for local redirection."""
+        return self.snapshot.redirect
+
+    @property
+    def localhosts(self):
+        # type: () -> Tuple[str, ...]
+        """Return tuple of local host names."""
+        return self.snapshot.localhosts
+
+    @property
+    def workers(self):
+        # type: () -> int
+        """Return the number of threads / processes that serve requests."""
+        return 1
+
+    @property
+    def listeners(self):
+        # type: () -> List[socket.socket]
+        """Return the listening sockets, the TLS listener last."""
+        if self.tls is None:
+            return list(self.sockets)
+        return self.sockets + [self.tls.socket]
+
+    def respond(self, head, peer, responses, last):
+        # type: (bytes, str, List[pynullweb.response.Body], bool) -> bool
+        """Append the response for the request head to the list of responses.
+
+        If last is True, the connection will be closed after the response.
+        Return True, if the connection should be kept alive.
+        """
+        snapshot = self.snapshot
+        if not self.admission.allow(peer):
+            self.metrics.count("shed", "rate")
+            responses.append(snapshot.responses.error(503))
+            return False
+        request = parse_head(head)
+        if request is None:
+            self.metrics.count("error", 400)
+            responses.append(snapshot.responses.error(400))
+            return False
+        method, path, version, headers = request
+        if method not in (b"GET", b"HEAD"):
+            self.metrics.count("error", 501)
+            responses.append(snapshot.responses.error(501))
+            self.log_request(peer, headers, method, path, version, 501)
+            return False
+        keep_alive = version >= b"HTTP/1.1" and \
+            headers.get(b"connection", "").lower() != "close"
+        close = keep_alive and last
+        if self.metrics_path and path == self.metrics_path:
+            content = self.metrics.render().encode("utf-8")
+            responses.append(snapshot.responses.document(
+                pynullweb.metrics.CONTENT_TYPE, content,
+                method.decode("ascii"), close))
+            self.log_request(
+                peer, headers, method, path, version, 200, str(len(content)))
+            return keep_alive and not close
+        host = headers.get(b"host")
+        status = snapshot.blocklists.classify(host)
+        rule = snapshot.rules.match(host, method.decode("ascii"), path)
+        if snapshot.host_matcher.match(host):
+            self.metrics.count("redirect")
+            responses.append(
+                snapshot.responses.redirect(snapshot.redirect + path, close))
+            self.log_request(peer, headers, method, path, version, 302)
+        elif rule is not None:
+            self.respond_rule(
+                rule, peer, (method, path, version, headers), responses,
+                close)
+        elif status is not None and status != 200:
+            self.metrics.count("blocked", status)
+            responses.append(snapshot.responses.status(status, close))
+            self.log_request(peer, headers, method, path, version, status)
+        else:
+            response = snapshot.responses.not_modified(
+                headers.get(b"if-none-match"),
+                headers.get(b"if-modified-since"), close)
+            if response is not None:
+                self.metrics.count("not_modified")
+                responses.append(response)
+                self.log_request(peer, headers, method, path, version, 304)
+                return keep_alive and not close
+            content_type = snapshot.negotiator.get_content_type(
+                headers.get(b"accept"), path)
+            self.metrics.count("content", content_type)
+            response, body, length = snapshot.responses.content(
+                content_type, method.decode("ascii"), close)
+            responses.append(response)
+            if body:
+                responses.append(body)
+            self.log_request(
+                peer, headers, method, path, version, 200, str(length))
+        return keep_alive and not close
+
+    def respond_rule(  # pylint: disable=too-many-arguments
+            self, rule, peer, request, responses, close):
+        # type: (pynullweb.rules.Rule, str, Tuple[bytes, str, bytes, Dict[bytes, str]], List[pynullweb.response.Body], bool) -> None  # NOQA
+        """Append the response of a rule to the list of responses.
+
+        Rules with content answer conditional requests with 304 Not
+        Modified. Their headers are added in any case.
+        """
+        method, path, version, headers = request
+        snapshot = self.snapshot
+        response = None  # type: Optional[bytes]
+        if rule.status == 200:
+            response = snapshot.responses.not_modified(
+                headers.get(b"if-none-match"),
+                headers.get(b"if-modified-since"), close)
+        if response is not None:
+            self.metrics.count("rule", 304)
+            responses.append(rule.add_headers(response))
+            self.log_request(peer, headers, method, path, version, 304)
+            return
+        content_type = None
+        if rule.status == 200 and rule.content_type is None:
+            content_type = snapshot.negotiator.get_content_type(
+                headers.get(b"accept"), path)
+        response, body, length = rule.response(
+            snapshot.responses, content_type, method.decode("ascii"), close)
+        self.metrics.count("rule", rule.status)
+        responses.append(response)
+        if body:
+            responses.append(body)
+        self.log_request(
+            peer, headers, method, path, version, rule.status,
+            str(length) if rule.status == 200 else "-")
+
+    def log_request(  # pylint: disable=too-many-arguments
+            self, peer, headers, method, path, version, code, size="-"):
+        # type: (str, Dict[bytes, str], bytes, str, bytes, int, str) -> None
+        """Queue the record of an answered request for the access log."""
+        self.access_log.log(
+            peer, headers.get(b"host", "-"), method, path, version, code, size)
+
+    def close_idle_connections(self):
+        # type: () -> None
+        """Close all connections that were idle for too long.
+
+        Connections, whose request head is not complete within the header
+        timeout, are answered with 408 Request Timeout. This includes new
+        connections without any request; shed connections are closed
+        without response. The keep-alive timeout applies after a response,
+        or if there is no header timeout.
+        """
+        now = time.time()
+        deadline = now - self.keep_alive_timeout
+        head_deadline = now - self.header_timeout
+        try:
+            for protocol in list(self.connections):
+                transport = protocol.transport
+                if not transport:
+                    continue
+                if self.header_timeout > 0 and (
+                        protocol.buffer or
+                        protocol.requests_left == self.keep_alive_requests):
+                    if protocol.head_started < head_deadline:
+                        if not protocol.shed:
+                            self.metrics.count("shed", "header_timeout")
+                            transport.write(
+                                self.snapshot.responses.error(408))
+                        transport.close()
+                elif protocol.last_active < deadline:
+                    transport.close()
+        finally:
+            self.loop.call_later(  # type: ignore
+                max(MIN_CHECK_INTERVAL, min(
+                    self.keep_alive_timeout or 1.0,
+                    self.header_timeout or 1.0, 1.0)),
+                self.close_idle_connections)
+
+    def serve_forever(self, poll_interval=0.5):
+        # type: (float) -> None
+        """Handle requests until shutdown."""
+        # pylint: disable=unused-argument
+        self._stopped.clear()
+        self.access_log.start()
+        if self.profiler is not None:
+            self.profiler.install()
+        if self.reloader is not None:
+            self.reloader.install()
+            self.reloader.start()
+        if self.handoff is not None:
+            self.handoff.install(self.restart)
+        self.loop = asyncio.new_event_loop()
+        try:
+            for listener in self.listeners:
+                context = self.tls.context if self.tls is not None and \
+                    listener is self.tls.socket else None
+                self._servers.append(self.loop.run_until_complete(
+                    self.loop.create_server(
+                        lambda: NullWebProtocol(self), sock=listener,
+                        ssl=context)))
+            pynullweb.handoff.notify_ready()
+            self.close_idle_connections()
+            self.loop.run_forever()
+            for server in self._servers:
+                server.close()
+            for protocol in list(self.connections):
+                protocol.transport.close()
+            for server in self._servers:
+                self.loop.run_until_complete(server.wait_closed())
+            self._servers = []
+        finally:
+            self.loop.close()
+            if self.reloader is not None:
+                self.reloader.stop()
+            self.access_log.stop()
+            self._stopped.set()
+
+    def start_draining(self):
+        # type: () -> None
+        """Stop accepting connections, close the idle ones.
+
+        Connections with a partial request are closed after the response.
+        After the drain timeout, the serve_forever loop stops in any case.
+        """
+        self.draining = True
+        for server in self._servers:
+            server.close()
+        for protocol in list(self.connections):
+            if not protocol.buffer and protocol.transport:
+                protocol.transport.close()
+        self.loop.call_later(  # type: ignore
+            self.drain_timeout, self.loop.stop)
+        self.stop_when_drained()
+
+    def stop_when_drained(self):
+        # type: () -> None
+        """Stop the serve_forever loop, if all connections are closed."""
+        if not self.connections:
+            self.loop.stop()  # type: ignore
+
+    def shutdown_gracefully(self):
+        # type: () -> None
+        """Stop accepting connections, finish the open ones, then stop.
+
+        Wait until the serve_forever loop stops.
+        """
+        if self.loop is not None and not self._stopped.is_set():
+            self.loop.call_soon_threadsafe(self.start_draining)
+            self._stopped.wait()
+
+    def hand_over(self):
+        # type: () -> None
+        """Start the successor process, then stop gracefully."""
+        if self.handoff is not None and self.handoff.spawn(*self.listeners):
+            self.shutdown_gracefully()
+        else:
+            print("Restart failed: new server did not start", file=sys.stderr)
+
+    def restart(self):
+        # type: () -> None
+        """Hand over to a successor process in the background."""
+        thread = threading.Thread(target=self.hand_over)
+        thread.daemon = True
+        thread.start()
+
+    def shutdown(self):
+        # type: () -> None
+        """Stop the serve_forever loop and wait until it stops."""
+        if self.loop is not None and not self._stopped.is_set():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._stopped.wait()
+
+    def server_close(self):
+        # type: () -> None
+        """Clean up the server."""
+        for listener in self.sockets:
+            listener.close()
+        if self.tls is not None:
+            self.tls.close()
+        self.access_log.close()
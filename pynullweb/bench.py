@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bench - load generator to measure throughput and latency of the web server.
+
+Start a server in the given mode on localhost (or use an already running
+server), drive it with concurrent clients that send a realistic mix of
+requests, and report requests per second and latency percentiles as JSON:
+
+    python -m pynullweb.bench --mode thread --clients 32 --duration 10
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+LOCAL_HOST = "router.lan"
+
+# (weight, host, path, Accept header)
+REQUEST_MIX = [
+    (20, "ads.example.com", "/pixel.gif",
+     "image/webp,image/apng,image/*,*/*;q=0.8"),
+    (15, "tracker.example.net", "/banner.png?id=4711",
+     "image/avif,image/webp,*/*"),
+    (10, "cdn.example.org", "/ad.jpg",
+     "image/webp,image/png,image/svg+xml,image/*;q=0.8,video/*;q=0.8,"
+     "*/*;q=0.5"),
+    (15, "ads.example.com", "/frame.html",
+     "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,"
+     "*/*;q=0.8"),
+    (15, "stats.example.com", "/track.js", "*/*"),
+    (5, "stats.example.com", "/style.css", "text/css,*/*;q=0.1"),
+    (5, "api.example.com", "/v1/event", "application/json"),
+    (5, "ads.example.com", "/", None),
+    (10, LOCAL_HOST, "/index.html", "text/html,*/*;q=0.8"),
+]  # type: List[Tuple[int, str, str, Optional[str]]]
+
+
+def build_request(host, path, accept, keep_alive):
+    # type: (str, str, Optional[str], bool) -> bytes
+    """Build the bytes of a request."""
+    lines = [
+        "GET %s HTTP/%s" % (path, "1.1" if keep_alive else "1.0"),
+        "Host: " + host,
+        "User-Agent: pynullweb-bench"]
+    if accept is not None:
+        lines.append("Accept: " + accept)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("ascii")
+
+
+def build_requests(keep_alive):
+    # type: (bool) -> List[bytes]
+    """Return a list of requests, each repeated according to its weight."""
+    result = []
+    for weight, host, path, accept in REQUEST_MIX:
+        result.extend([build_request(host, path, accept, keep_alive)] * weight)
+    return result
+
+
+def read_response(client, buf):
+    # type: (socket.socket, bytes) -> Tuple[int, bool, bytes]
+    """Read one response.
+
+    Return its status code, whether the server closes the connection, and
+    the unconsumed data.
+    """
+    while b"\r\n\r\n" not in buf:
+        data = client.recv(65536)
+        if not data:
+            raise EOFError("Connection closed while reading header")
+        buf += data
+    head, _, buf = buf.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    close = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"connection":
+            close = value.strip().lower() == b"close"
+    while len(buf) < length:
+        data = client.recv(65536)
+        if not data:
+            raise EOFError("Connection closed while reading content")
+        buf += data
+    return status, close, buf[length:]
+
+
+class Client(object):  # pylint: disable=too-few-public-methods
+    """A client that sends requests until a deadline, recording latencies."""
+
+    def __init__(self, address, keep_alive, seed):
+        # type: (Tuple[str, int], bool, int) -> None
+        """Initialize the client."""
+        self.address = address
+        self.keep_alive = keep_alive
+        self.requests = build_requests(keep_alive)
+        self.random = random.Random(seed)
+        self.latencies = []  # type: List[float]
+        self.errors = 0
+        self.status_codes = {}  # type: Dict[int, int]
+
+    def run(self, deadline):
+        # type: (float) -> None
+        """Send requests until the deadline."""
+        client = None
+        buf = b""
+        while time.time() < deadline:
+            request = self.random.choice(self.requests)
+            start = time.time()
+            try:
+                if client is None:
+                    client = socket.create_connection(self.address, 10)
+                    buf = b""
+                client.sendall(request)
+                status, close, buf = read_response(client, buf)
+            except (EOFError, IOError, ValueError, IndexError):
+                self.errors += 1
+                status, close = 0, True
+            self.latencies.append(time.time() - start)
+            self.status_codes[status] = self.status_codes.get(status, 0) + 1
+            if not self.keep_alive or close:
+                if client is not None:
+                    client.close()
+                client = None
+        if client is not None:
+            client.close()
+
+
+def run_clients(address, clients, keep_alive_ratio, duration, seed=0):
+    # type: (Tuple[str, int], int, float, float, int) -> Dict[str, Any]
+    """Run concurrent clients in threads, return their raw results."""
+    keep_alive_clients = int(round(clients * keep_alive_ratio))
+    workers = [
+        Client(address, i < keep_alive_clients, seed + i)
+        for i in range(clients)]
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(target=worker.run, args=(deadline,))
+        for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = []  # type: List[float]
+    status_codes = {}  # type: Dict[int, int]
+    for worker in workers:
+        latencies.extend(worker.latencies)
+        for status, count in worker.status_codes.items():
+            status_codes[status] = status_codes.get(status, 0) + count
+    return {
+        "latencies": latencies,
+        "errors": sum(worker.errors for worker in workers),
+        "status_codes": status_codes,
+    }
+
+
+def _run_clients_process(args):
+    # type: (Tuple[Tuple[str, int], int, float, float, int]) -> Dict[str, Any]
+    """Run clients in a separate process."""
+    return run_clients(*args)
+
+
+def percentile(values, fraction):
+    # type: (List[float], float) -> float
+    """Return a percentile of a sorted list of values.
+
+    The percentile is given as a fraction between 0 and 1.
+    """
+    if not values:
+        return 0.0
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(results, elapsed):
+    # type: (List[Dict[str, Any]], float) -> Dict[str, Any]
+    """Merge raw client results into a report."""
+    latencies = sorted(
+        latency for result in results for latency in result["latencies"])
+    status_codes = {}  # type: Dict[str, int]
+    for result in results:
+        for status, count in result["status_codes"].items():
+            key = str(status)
+            status_codes[key] = status_codes.get(key, 0) + count
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": sum(result["errors"] for result in results),
+        "status_codes": status_codes,
+        "elapsed": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / total, 3) if total else 0.0,
+            "p50": round(1000 * percentile(latencies, 0.5), 3),
+            "p99": round(1000 * percentile(latencies, 0.99), 3),
+            "p999": round(1000 * percentile(latencies, 0.999), 3),
+            "max": round(1000 * latencies[-1], 3) if total else 0.0,
+        },
+    }
+
+
+def run_benchmark(  # pylint: disable=too-many-arguments
+        address, clients, keep_alive_ratio, duration, processes=1, seed=0):
+    # type: (Tuple[str, int], int, float, float, int, int) -> Dict[str, Any]
+    """Drive the server at address with load, return the report."""
+    start = time.time()
+    if processes <= 1:
+        results = [
+            run_clients(address, clients, keep_alive_ratio, duration, seed)]
+    else:
+        per_process = max(1, clients // processes)
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_run_clients_process, [
+                (address, per_process, keep_alive_ratio, duration,
+                 seed + i * per_process)
+                for i in range(processes)])
+        finally:
+            pool.close()
+            pool.join()
+    return summarize(results, time.time() - start)
+
+
+def free_port():
+    # type: () -> int
+    """Return a currently unused TCP port on localhost."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def start_server(  # pylint: disable=too-many-arguments
+        port, mode=None, workers=None, extra_args=None, python=None):
+    # type: (int, Optional[str], Optional[int], Optional[List[str]], Optional[str]) -> Any  # NOQA
+    """Start a null web server process and wait until it accepts requests.
+
+    The server runs with the given Python interpreter, by default with the
+    interpreter of the benchmark.
+    """
+    command = [
+        python or sys.executable, "-m", "pynullweb", "--port", str(port),
+        "--localhosts", LOCAL_HOST, "--redirect", "http://" + LOCAL_HOST]
+    if mode:
+        command.extend(["--mode", mode])
+    if workers:
+        command.extend(["--workers", str(workers)])
+    command.extend(extra_args or [])
+    with open(os.devnull, "w") as devnull:
+        process = subprocess.Popen(command, stdout=devnull, stderr=devnull)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server terminated: %d" % (process.returncode,))
+        try:
+            socket.create_connection(("127.0.0.1", port), 1).close()
+            return process
+        except socket.error:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def stop_server(process):
+    # type: (Any) -> None
+    """Stop a server process."""
+    process.terminate()
+    process.wait()
+
+
+def main():
+    # type: () -> None
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(prog="python -m pynullweb.bench")
+    parser.add_argument(
+        "--server", type=str,
+        help="host:port of a running server, instead of starting one")
+    parser.add_argument("-m", "--mode", type=str, help="server mode")
+    parser.add_argument(
+        "-w", "--workers", type=int, help="server threads / processes")
+    parser.add_argument(
+        "-c", "--clients", type=int, default=16,
+        help="number of concurrent clients")
+    parser.add_argument(
+        "-k", "--keep-alive", type=float, default=0.5,
+        help="fraction of clients that use persistent connections")
+    parser.add_argument(
+        "-d", "--duration", type=float, default=5.0,
+        help="seconds to generate load")
+    parser.add_argument(
+        "-p", "--processes", type=int, default=1,
+        help="number of client processes")
+    parser.add_argument(
+        "--python", type=str,
+        help="interpreter of the started server, to compare Python builds")
+    parser.add_argument(
+        "--server-arg", action="append", default=[],
+        help="additional argument for the started server")
+    parser.add_argument(
+        "-o", "--output", type=str, help="file to write the JSON report to")
+    args = parser.parse_args()
+
+    process = None
+    if args.server:
+        host, _, port = args.server.rpartition(":")
+        address = (host or "127.0.0.1", int(port))
+    else:
+        address = ("127.0.0.1", free_port())
+        process = start_server(
+            address[1], args.mode, args.workers, args.server_arg,
+            args.python)
+    try:
+        report = run_benchmark(
+            address, args.clients, args.keep_alive, args.duration,
+            args.processes)
+    finally:
+        if process is not None:
+            stop_server(process)
+    report["config"] = {
+        "mode": args.mode, "workers": args.workers, "clients": args.clients,
+        "keep_alive": args.keep_alive, "duration": args.duration,
+        "processes": args.processes, "server_args": args.server_arg,
+        "server_python": None if args.server else (
+            args.python or sys.executable),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Blocklist - classify host names by large lists of blocked domains.
+
+A domain list is compiled into a compact index: all domain names with their
+labels reversed ("ads.example.com" becomes "com.example.ads") are sorted and
+stored in one byte string, together with an array of their offsets. Lookups
+use binary search. The index is saved next to the list, so that the next
+start only needs to memory-map it:
+
+    python -m pynullweb.blocklist hosts.txt
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+from __future__ import print_function
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import pynullweb.hosts
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, Iterable, List, Optional, Tuple, Union  # NOQA, pylint: disable=unused-import
+
+
+INDEX_MAGIC = b"PNWDIX01"
+INDEX_HEADER = struct.Struct("<8sII")
+INDEX_SUFFIX = ".idx"
+
+# Addresses used by hosts files to block a host name
+BLOCKING_ADDRESSES = frozenset([
+    "0.0.0.0", "127.0.0.1", "::", "::1", "0", "255.255.255.255"])
+
+IGNORED_NAMES = frozenset([
+    "localhost", "localhost.localdomain", "local", "broadcasthost",
+    "ip6-localhost", "ip6-loopback", "0.0.0.0"])
+
+
+def parse_line(line):  # type: (str) -> Optional[str]
+    """Return the domain name of a line of a hosts file or domain list.
+
+    Lines are either of the form "0.0.0.0 ads.example.com" or just contain
+    the domain name. Comments and host names of the local machine are
+    ignored.
+    """
+    line = line.partition("#")[0]
+    words = line.split()
+    if not words:
+        return None
+    if len(words) > 1 and words[0] in BLOCKING_ADDRESSES:
+        name = words[1]
+    elif len(words) == 1:
+        name = words[0]
+    else:
+        return None
+    name = name.lower().rstrip(".")
+    if name in IGNORED_NAMES or "." not in name:
+        return None
+    return name
+
+
+def reverse_name(name):  # type: (str) -> bytes
+    """Return the domain name with reversed labels, as bytes."""
+    return ".".join(reversed(name.split("."))).encode("utf-8")
+
+
+def int_array(data=b""):  # type: (bytes) -> array.array
+    """Return an array of unsigned 32 bit little-endian integers."""
+    result = array.array("I")
+    if result.itemsize != 4:  # pragma: no cover
+        result = array.array("L")
+    if data:
+        if hasattr(result, "frombytes"):
+            result.frombytes(data)
+        else:  # Python 2
+            result.fromstring(data)
+        if sys.byteorder == "big":  # pragma: no cover
+            result.byteswap()
+    return result
+
+
+class DomainIndex(object):
+    """Sorted set of domain names, packed into a byte string.
+
+    A domain name is found, if it or one of its parent domains is in the
+    set. Beside the byte string, only one 32 bit offset per domain name is
+    needed.
+    """
+
+    def __init__(self, blob, offsets, base=0):
+        # type: (Union[bytes, mmap.mmap], array.array, int) -> None
+        """Initialize the index with packed, sorted names and their offsets.
+
+        There is one more offset than names; it denotes the end of the last
+        name. The offsets are relative to position base of the blob.
+        """
+        self._blob = blob
+        self._offsets = offsets
+        self._base = base
+        self._count = max(0, len(offsets) - 1)
+
+    @classmethod
+    def build(cls, names):  # type: (Iterable[str]) -> DomainIndex
+        """Build an index from domain names."""
+        keys = sorted(set(reverse_name(name) for name in names))
+        offsets = int_array()
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key)
+        offsets.append(position)
+        return cls(b"".join(keys), offsets)
+
+    @classmethod
+    def load(cls, path):  # type: (str) -> DomainIndex
+        """Load a saved index, memory-mapping its names."""
+        with open(path, "rb") as index_file:
+            header = index_file.read(INDEX_HEADER.size)
+            if len(header) != INDEX_HEADER.size:
+                raise ValueError("Index file %r is truncated" % (path,))
+            magic, count, size = INDEX_HEADER.unpack(header)
+            if magic != INDEX_MAGIC:
+                raise ValueError("File %r is not a domain index" % (path,))
+            offsets = int_array(index_file.read(4 * (count + 1)))
+            if len(offsets) != count + 1 or offsets[-1] != size:
+                raise ValueError("Index file %r is truncated" % (path,))
+            if not size:
+                return cls(b"", offsets)
+            blob = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        base = INDEX_HEADER.size + 4 * (count + 1)
+        if len(blob) < base + size:
+            raise ValueError("Index file %r is truncated" % (path,))
+        return cls(blob, offsets, base)
+
+    def save(self, path):  # type: (str) -> None
+        """Save the index to a file.
+
+        The file is replaced at once, so that processes that memory-mapped
+        the old file keep reading it.
+        """
+        offsets = int_array()
+        offsets.extend(self._offsets)
+        if sys.byteorder == "big":  # pragma: no cover
+            offsets.byteswap()
+        data = offsets.tobytes() if hasattr(offsets, "tobytes") \
+            else offsets.tostring()
+        temporary = "%s.%d.%d" % (
+            path, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(temporary, "wb") as index_file:
+                index_file.write(INDEX_HEADER.pack(
+                    INDEX_MAGIC, self._count, self._offsets[-1]))
+                index_file.write(data)
+                index_file.write(
+                    self._blob[self._base:self._base + self._offsets[-1]])
+            os.rename(temporary, path)
+        except Exception:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def __len__(self):  # type: () -> int
+        """Return the number of domain names."""
+        return self._count
+
+    def __getitem__(self, index):  # type: (int) -> bytes
+        """Return the reversed domain name at the given sorted position."""
+        return self._blob[
+            self._base + self._offsets[index]:
+            self._base + self._offsets[index + 1]]
+
+    def __contains__(self, name):  # type: (str) -> bool
+        """Check if name or one of its parent domains is in the index.
+
+        The parent domains are searched from the top-level domain down. As
+        they sort before their sub-domains, each search starts at the
+        position of the previous one.
+        """
+        if not self._count:
+            return False
+        key = reverse_name(name)
+        position = 0
+        end = key.find(b".")
+        while True:
+            prefix = key if end < 0 else key[:end]
+            position = bisect.bisect_left(self, prefix, position)
+            if position < self._count and self[position] == prefix:
+                return True
+            if end < 0:
+                return False
+            end = key.find(b".", end + 1)
+
+
+def index_path(path):  # type: (str) -> str
+    """Return the file name of the saved index of a domain list."""
+    return path + INDEX_SUFFIX
+
+
+def read_names(path):  # type: (str) -> Iterable[str]
+    """Yield the domain names of a hosts file or domain list."""
+    with open(path, "rb") as list_file:
+        for line in list_file:
+            name = parse_line(line.decode("utf-8", "replace"))
+            if name:
+                yield name
+
+
+def load_domain_list(path):  # type: (str) -> DomainIndex
+    """Return the index of a domain list.
+
+    A saved index is used, if it is newer than the list. Otherwise the index
+    is built and saved, if possible.
+    """
+    saved_path = index_path(path)
+    try:
+        if os.path.getmtime(saved_path) >= os.path.getmtime(path):
+            return DomainIndex.load(saved_path)
+    except (OSError, IOError, ValueError):
+        pass
+    index = DomainIndex.build(read_names(path))
+    try:
+        index.save(saved_path)
+    except (OSError, IOError):
+        pass
+    return index
+
+
+def parse_blocklist_spec(spec):  # type: (str) -> Tuple[str, int]
+    """Split a specification "path[:status]" into path and status code."""
+    path, _, status = spec.strip().rpartition(":")
+    if path and status.isdigit():
+        return path, int(status)
+    return spec.strip(), 200
+
+
+class Blocklists(object):
+    """Ordered domain lists, each with the status code of its responses.
+
+    Results are cached by host name. The cache is cleared when it is full.
+    """
+
+    def __init__(self, lists=None, cache_size=4096):
+        # type: (Optional[List[Tuple[int, DomainIndex]]], int) -> None
+        """Initialize with a list of status codes and indexes."""
+        self.lists = lists or []
+        self.cache_size = cache_size
+        self._cache = {}  # type: Dict[str, Optional[int]]
+
+    @classmethod
+    def from_config(cls, raw_specs, cache_size=4096):
+        # type: (str, int) -> Blocklists
+        """Load comma-separated specifications of domain lists."""
+        lists = []
+        for spec in raw_specs.split(","):
+            if spec.strip():
+                path, status = parse_blocklist_spec(spec)
+                lists.append((status, load_domain_list(path)))
+        return cls(lists, cache_size)
+
+    def classify(self, host):  # type: (Optional[str]) -> Optional[int]
+        """Return the status code for a host, or None if it is not listed.
+
+        The first list that contains the host name determines the code.
+        """
+        if not self.lists or not host:
+            return None
+        try:
+            return self._cache[host]
+        except KeyError:
+            pass
+        result = None
+        name = pynullweb.hosts.normalize_host(host)
+        for status, index in self.lists:
+            if name in index:
+                result = status
+                break
+        if len(self._cache) >= self.cache_size:
+            self._cache = {}
+        self._cache[host] = result
+        return result
+
+    def __len__(self):  # type: () -> int
+        """Return the total number of listed domain names."""
+        return sum(len(index) for _, index in self.lists)
+
+
+def main():
+    # type: () -> None
+    """Compile domain lists and report time and size of their indexes."""
+    for path in sys.argv[1:]:
+        start = time.time()
+        index = DomainIndex.build(read_names(path))
+        built = time.time()
+        index.save(index_path(path))
+        start_load = time.time()
+        index = DomainIndex.load(index_path(path))
+        loaded = time.time()
+        print("%s: %d names, built in %.3fs, loaded in %.3fs, %d bytes" % (
+            path, len(index), built - start, loaded - start_load,
+            os.path.getsize(index_path(path))))
+
+
+if __name__ == "__main__":
+    main()
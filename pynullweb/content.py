@@ -8,53 +8,228 @@ Content - handles (minimal) content to be delivered by the web request.
 :license: Apache 2.0, see LICENSE
 """
 
-from base64 import b64decode
+import collections
+import mmap
+import os
+import zlib
+from binascii import a2b_base64
 
-from typing import List, Tuple  # NOQA, pylint: disable=unused-import
+import pynullweb.mimetable
 
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Callable, Dict, List, Optional, Tuple, Union  # NOQA, pylint: disable=unused-import
 
-def deliver_text_html():  # type: () -> str
+
+def deliver_text_html():  # type: () -> bytes
     """Return minimal HTML content."""
-    return "<html></html>\n"
+    return b"<html></html>\n"
 
 
-def deliver_image_gif():  # type: () -> str
+def deliver_image_gif():  # type: () -> bytes
     """Return a minimal GIF image."""
-    return b64decode("""
+    return a2b_base64("""
 R0lGODlhAQABAIABAP///wAAACH5BAEKAAEALAAAAAABAAEAAAICTAEAOw==
 """)
 
 
-def deliver_image_png():  # type: () -> str
+def deliver_image_png():  # type: () -> bytes
     """Return a minimal PNG image."""
-    return b64decode("""
+    return a2b_base64("""
 iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVQYV2NgYAAAAAMAAWgmWQ0
 AAAAASUVORK5CYII=
 """)
 
 
-def deliver_image_jpeg():  # type: () -> str
+def deliver_image_jpeg():  # type: () -> bytes
     """Return a minimal JPEG image."""
-    return b64decode("""
+    return a2b_base64("""
 /9j/2wBDAAMCAgICAgMCAgIDAwMDBAYEBAQEBAgGBgUGCQgKCgkICQkKDA8MCgsOCwkJDRENDg8Q
 EBEQCgwSExIQEw8QEBD/yQALCAABAAEBAREA/8wABgAQEAX/2gAIAQEAAD8A0s8g/9k=
 """)
 
 
-DELIVER_MAP = {
-    ("text", "html"): deliver_text_html,
-    ("image", "gif"): deliver_image_gif,
-    ("image", "png"): deliver_image_png,
-    ("image", "jpeg"): deliver_image_jpeg,
-}
+def deliver_image_webp():  # type: () -> bytes
+    """Return a minimal WebP image."""
+    return a2b_base64("""
+UklGRhoAAABXRUJQVlA4TA0AAAAvAAAAEAcQERGIiP4HAA==
+""")
+
+
+def deliver_image_svg():  # type: () -> bytes
+    """Return a minimal SVG image."""
+    return b'<svg xmlns="http://www.w3.org/2000/svg"/>\n'
+
+
+def deliver_text_css():  # type: () -> bytes
+    """Return an empty style sheet."""
+    return b"\n"
+
+
+def deliver_text_javascript():  # type: () -> bytes
+    """Return an empty script."""
+    return b"\n"
+
+
+def deliver_application_json():  # type: () -> bytes
+    """Return an empty JSON object."""
+    return b"{}\n"
+
+
+def deliver_text_plain():  # type: () -> bytes
+    """Return an empty line of text."""
+    return b"\n"
+
+
+def deliver_font_woff():  # type: () -> bytes
+    """Return a WOFF font without any tables."""
+    return a2b_base64("""
+d09GRgABAAAAAAAsAAAAAAAAAAwAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA=
+""")
+
+
+def deliver_font_woff2():  # type: () -> bytes
+    """Return a WOFF2 font without any tables."""
+    return a2b_base64("""
+d09GMgABAAAAAAAwAAAAAAAAAAwAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA
+""")
+
+
+def deliver_application_octet_stream():  # type: () -> bytes
+    """Return a single zero byte."""
+    return b"\0"
+
+
+# Order matters: for equally weighted media ranges, content negotiation
+# prefers the content type that comes first.
+DELIVER_MAP = collections.OrderedDict([
+    (("text", "html"), deliver_text_html),
+    (("image", "gif"), deliver_image_gif),
+    (("image", "png"), deliver_image_png),
+    (("image", "jpeg"), deliver_image_jpeg),
+    (("image", "webp"), deliver_image_webp),
+    (("image", "svg+xml"), deliver_image_svg),
+    (("text", "css"), deliver_text_css),
+    (("text", "javascript"), deliver_text_javascript),
+    (("application", "javascript"), deliver_text_javascript),
+    (("application", "json"), deliver_application_json),
+    (("text", "plain"), deliver_text_plain),
+    (("font", "woff2"), deliver_font_woff2),
+    (("font", "woff"), deliver_font_woff),
+    (("application", "octet-stream"), deliver_application_octet_stream),
+])  # type: Dict[Tuple[str, str], Callable[[], bytes]]
+
+# Modification time of the built-in payloads: 2017-01-01 00:00:00 GMT
+BUILTIN_MODIFIED = 1483228800
+
+
+def split_mime_type(mime_type):  # type: (str) -> Tuple[str, str]
+    """Split a mime type into the pair (type, subtype)."""
+    main_type, _, sub_type = mime_type.lower().partition("/")
+    return (main_type, sub_type)
+
+
+def map_file(path):  # type: (str) -> memoryview
+    """Return the read-only, memory-mapped content of a file."""
+    with open(path, "rb") as payload_file:
+        try:
+            mapped = mmap.mmap(
+                payload_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            return memoryview(b"")
+    try:
+        return memoryview(mapped)
+    except TypeError:  # Python 2: mmap has no buffer interface
+        data = mapped[:]
+        mapped.close()
+        return memoryview(data)
+
+
+class PayloadRegistry(object):
+    """Ordered collection of minimal payloads by content type.
+
+    Every payload is stored once as a read-only memoryview, so that it can
+    be sent any number of times without copying it. Each payload has an
+    entity tag, derived from content type and content, and a modification
+    time, so that clients can revalidate their cached copies.
+    """
+
+    def __init__(self):  # type: () -> None
+        """Initialize an empty registry."""
+        self._payloads = collections.OrderedDict()  # type: Dict[Tuple[str, str], memoryview]  # NOQA
+        self._validators = {}  # type: Dict[Tuple[str, str], Tuple[str, int]]
+
+    def register(self, content_type, data, modified=BUILTIN_MODIFIED):
+        # type: (Tuple[str, str], Union[str, bytes, memoryview], int) -> None
+        """Register the payload for a content type.
+
+        modified is the modification time in seconds since the epoch. A
+        content type that is registered again keeps its position.
+        """
+        if not isinstance(data, (bytes, memoryview)):
+            data = data.encode("latin-1")
+        view = memoryview(data)
+        checksum = zlib.crc32(
+            view.tobytes(), zlib.crc32("/".join(content_type).encode("ascii")))
+        self._payloads[content_type] = view
+        self._validators[content_type] = (
+            '"%08x"' % (checksum & 0xffffffff,), int(modified))
+
+    def load_directory(self, path):  # type: (str) -> List[Tuple[str, str]]
+        """Register all files of a directory as payloads.
+
+        The content type of a file is derived from its name extension, files
+        with unknown extensions are ignored. Return the registered types.
+        """
+        result = []
+        for name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, name)
+            content_type = pynullweb.mimetable.guess_type(name)
+            if not content_type or not os.path.isfile(file_path):
+                continue
+            self.register(
+                content_type, map_file(file_path),
+                int(os.stat(file_path).st_mtime))
+            result.append(content_type)
+        return result
+
+    def content_types(self):  # type: () -> List[Tuple[str, str]]
+        """Return the list of registered content types, in order."""
+        return list(self._payloads)
+
+    def get(self, content_type):
+        # type: (Tuple[str, str]) -> Optional[memoryview]
+        """Return payload of content type, or None if it is unknown."""
+        return self._payloads.get(content_type)
+
+    def validators(self, content_type):
+        # type: (Tuple[str, str]) -> Optional[Tuple[str, int]]
+        """Return entity tag and modification time of a payload, or None."""
+        return self._validators.get(content_type)
+
+
+def default_payloads():  # type: () -> PayloadRegistry
+    """Return a registry of the built-in payloads."""
+    registry = PayloadRegistry()
+    for content_type, deliver_function in DELIVER_MAP.items():
+        registry.register(content_type, deliver_function())
+    return registry
+
+
+PAYLOADS = default_payloads()
 
 
 def content_types():  # type: () -> List[Tuple[str, str]]
     """Return a list of content types that are handled by this module."""
-    return DELIVER_MAP.keys()
+    return PAYLOADS.content_types()
+
+
+def payload(content_type):  # type: (Tuple[str, str]) -> Optional[memoryview]
+    """Return the registered payload of a content type, or None."""
+    return PAYLOADS.get(content_type)
 
 
-def minimal_content(content_type):  # type: (Tuple[str, str]) -> str
+def minimal_content(content_type):  # type: (Tuple[str, str]) -> bytes
     """Return minimal content for given content type.
 
     content_type is a string pair (type, subtype).
@@ -62,5 +237,5 @@ def minimal_content(content_type):  # type: (Tuple[str, str]) -> str
     Return the content as a binary string. The string is empty for content
     types that are not handled by this module.
     """
-    deliver_function = DELIVER_MAP.get(content_type, None)
-    return "" if deliver_function is None else deliver_function()
+    view = PAYLOADS.get(content_type)
+    return b"" if view is None else view.tobytes()
@@ -10,101 +10,417 @@ Handler - handles web requests.
 
 from __future__ import print_function
 
-import BaseHTTPServer
+import io
+import select
+import socket
 import sys
+import time
 
-from typing import cast
-from typing import Optional, Tuple  # NOQA, pylint: disable=unused-import
+try:
+    import BaseHTTPServer
+except ImportError:  # Python 3
+    import http.server as BaseHTTPServer  # type: ignore
 
-import pynullweb.content
-import pynullweb.header
-import pynullweb.server  # NOQA, pylint: disable=unused-import
+import pynullweb.metrics
 
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+    import pynullweb.reload  # NOQA, pylint: disable=unused-import
+    import pynullweb.response  # NOQA, pylint: disable=unused-import
+    import pynullweb.server  # NOQA, pylint: disable=unused-import
 
-ACCEPT_HEADERS = pynullweb.content.content_types()
+
+# Headers used by the null web server, by their lower case names. Requests
+# with other headers that need handling are parsed by the base method.
+FAST_HEADERS = {
+    b"host": "Host", b"accept": "Accept", b"connection": "Connection",
+    b"if-none-match": "If-None-Match",
+    b"if-modified-since": "If-Modified-Since",
+    b"expect": None,
+}
+FAST_VERSIONS = (b"HTTP/1.1", b"HTTP/1.0")
+MAX_HEADERS = 100
+MAX_LINE = 65536
+END_OF_HEAD = (b"\r\n", b"\n", b"")
+
+if sys.version_info[0] > 2:
+    def native_str(data):  # type: (bytes) -> str
+        """Return header bytes as str, as the base parser does."""
+        return data.decode("latin-1")
+else:
+    def native_str(data):  # type: (bytes) -> str
+        """Return header bytes as str, which they are on Python 2."""
+        return data
 
 
 class NullWebHandler(BaseHTTPServer.BaseHTTPRequestHandler):
-    """A handler that returns minimal content."""
+    """A handler that returns minimal content.
+
+    HTTP/1.1 connections are kept alive until they are idle for too long or
+    until a maximum number of requests were served, if the server supports
+    persistent connections. Responses to pipelined requests are buffered
+    and sent together.
+    """
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    @property
+    def null_server(self):
+        # type: () -> pynullweb.server.NullWebServer
+        """Return the server, which holds the null web configuration."""
+        return self.server  # type: ignore
+
+    def setup(self):
+        # type: () -> None
+        """Prepare the connection, set its idle timeout.
+
+        A keep-alive timeout of 0 disables persistent connections.
+        """
+        server = self.null_server
+        self.timeout = server.keep_alive_timeout or None
+        self.requests_left = server.keep_alive_requests
+        self.close_announced = False
+        self.expect_request()
+        server.metrics.connection(1)
+        server.connections.add(self)
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def handle(self):
+        # type: () -> None
+        """Complete the handshake of a TLS connection, then handle requests.
+
+        Failed handshakes, e.g. of clients that do not trust the local
+        certificate authority, close the connection silently.
+        """
+        do_handshake = getattr(self.connection, "do_handshake", None)
+        if do_handshake is not None:
+            try:
+                do_handshake()
+            except socket.error:
+                return
+        BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
 
-    def send_null_response(self, code, size="-"):
-        # type: (int, str) -> None
-        """Send the response header and log the response code.
+    def finish(self):
+        # type: () -> None
+        """Finish the connection."""
+        server = self.null_server
+        server.connections.discard(self)
+        server.metrics.connection(-1)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def expect_request(self):
+        # type: () -> None
+        """Mark the connection as idle, until the next request arrives.
 
-        Also send two standard headers with the server software
-        version and the current date.
+        The head of the next request must be complete within keep-alive
+        timeout and header timeout, otherwise the server closes the
+        connection.
         """
-        self.log_request(code, size=size)
-        if code in self.responses:
-            message = self.responses[code][0]
+        self.idle = True
+        self.head_deadline = time.time() + (self.timeout or 0.0) + \
+            self.null_server.header_timeout
+
+    def input_pending(self):
+        # type: () -> bool
+        """Return True, if data of another request was already received."""
+        buffer = getattr(self.rfile, "_rbuf", None)  # Python 2 file object
+        if buffer is not None and buffer.tell() > 0:
+            return True
+        pending = getattr(self.connection, "pending", None)
+        if pending is not None:  # TLS: only decrypted data is a request
+            if pending() or buffer is not None:
+                return bool(pending())
         else:
-            message = ""
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if readable or buffer is not None:
+                return bool(readable)
+        # Python 3: the buffered reader hides its data, peek without blocking
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except socket.error:  # Incomplete TLS record
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
 
-        if self.request_version != "HTTP/0.9":
-            self.wfile.write(
-                "%s %d %s\r\n" % (self.protocol_version, code, message))
-        self.send_header("Server", "Apache")
-        self.send_header("Date", self.date_time_string())
+    def parse_request(self):
+        # type: () -> bool
+        """Parse the request line and read the headers.
+
+        Return False, if an error response was sent. Only the headers used
+        by the null web server are kept, in a dict with their usual names.
+        Other versions than HTTP/1.0 and HTTP/1.1, header lines that are
+        folded, malformed, too long, or too many, repeated headers of the
+        null web server, and Expect headers are left to the base method.
+        """
+        words = self.raw_requestline.split()
+        if len(words) != 3 or words[2] not in FAST_VERSIONS:
+            return BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self)
+        headers = {}
+        lines = []
+        readline = self.rfile.readline
+        line = readline(MAX_LINE + 1)
+        while line not in END_OF_HEAD:
+            lines.append(line)
+            name, sep, value = line.partition(b":")
+            if not sep or len(lines) > MAX_HEADERS or \
+                    len(line) > MAX_LINE or line[:1] in b" \t":
+                return self.parse_request_fully(lines)
+            lower = name.lower()
+            if lower in FAST_HEADERS:
+                key = FAST_HEADERS[lower]
+                if key is None or key in headers:
+                    return self.parse_request_fully(lines)
+                headers[key] = native_str(value.strip())
+            line = readline(MAX_LINE + 1)
+        self.headers = headers  # type: ignore
+        self.requestline = native_str(self.raw_requestline.rstrip(b"\r\n"))
+        self.command = native_str(words[0])
+        path = native_str(words[1])
+        if path.startswith("//"):  # Not a network path, as in the base
+            path = "/" + path.lstrip("/")
+        self.path = path
+        self.request_version = native_str(words[2])
+        connection = headers.get("Connection", "").lower()
+        self.close_connection = connection == "close" or (
+            words[2] != b"HTTP/1.1" and connection != "keep-alive")
+        return True
+
+    def parse_request_fully(self, lines):
+        # type: (List[bytes]) -> bool
+        """Parse the request by the base method, after some headers were read.
+
+        The rest of the head is read, and all of it is passed to the base
+        method, which answers malformed requests with an error.
+        """
+        line = lines[-1]
+        while line not in END_OF_HEAD and len(lines) <= MAX_HEADERS:
+            line = self.rfile.readline(MAX_LINE + 1)
+            lines.append(line)
+        rfile = self.rfile
+        self.rfile = io.BytesIO(b"".join(lines) + b"\r\n")
+        try:
+            return BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self)
+        finally:
+            self.rfile = rfile
+
+    def handle_one_request(self):
+        # type: () -> None
+        """Handle a single HTTP request.
+
+        In contrast to the base method, the response is not sent if there is
+        another pipelined request, and idle connections time out silently.
+        While the server drains its connections, the connection is closed
+        after the response. The connection is idle, i.e. it may be closed
+        by the server, after all responses were sent. It is closed at once,
+        if other connections wait to be handled. Requests of clients
+        that exceed their rate are shed before they are parsed.
+        """
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.timeout:
+            self.close_connection = True
+            return
+        self.idle = False
+        if self.head_deadline < 0:  # Closed by the server
+            self.close_connection = True
+            return
+        server = self.null_server
+        self.head_deadline = time.time() + server.header_timeout
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ""
+            self.request_version = ""
+            self.command = ""
+            self.send_error(414)
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if not server.admission.allow(self.client_address[0]):
+            server.metrics.count("shed", "rate")
+            self.wfile.write(server.snapshot.responses.error(503))
+            self.close_connection = True
+            return
+        try:
+            if not self.parse_request():
+                return
+            if self.head_deadline < 0:  # Closed by the server
+                self.close_connection = True
+                return
+            self.head_deadline = 0.0
+            method = getattr(self, "do_" + self.command, None)
+            if method is None:
+                server.metrics.count("error", 501)
+                self.send_error(
+                    501, "Unsupported method (%r)" % (self.command,))
+                return
+            self.requests_left -= 1
+            if self.request_version < "HTTP/1.1":
+                self.close_connection = True
+            elif not self.close_connection and (
+                    self.requests_left <= 0 or server.draining or
+                    not server.persistent_connections or not self.timeout):
+                self.close_connection = self.close_announced = True
+            start = time.time()
+            method()
+            server.metrics.observe(time.time() - start)
+            if self.close_connection or not self.input_pending():
+                self.wfile.flush()
+                self.expect_request()
+                if server.requests_waiting():  # Free the thread
+                    self.close_connection = True
+        except socket.timeout as exc:
+            self.log_error("Request timed out: %r", exc)
+            self.close_connection = True
+
+    def log_request(self, code="-", size="-"):
+        # type: (object, object) -> None
+        """Queue the record of an answered request for the access log."""
+        headers = getattr(self, "headers", None)
+        self.null_server.access_log.log(
+            self.client_address[0],
+            headers.get("Host", "-") if headers else "-",
+            getattr(self, "command", None) or "-", getattr(self, "path", ""),
+            getattr(self, "request_version", ""), code, size)
 
     def log_message(  # pylint: disable=arguments-differ
             self, message_format, *args):
         # type: (str, str) -> None
-        """Log an arbitrary message."""
-        sys.stderr.write("%s %s - [%s] %s\n" % (
+        """Queue an arbitrary message for the access log."""
+        headers = getattr(self, "headers", None)
+        self.null_server.access_log.message(
             self.client_address[0],
-            self.headers.get("Host", "-"),
-            self.log_date_time_string(),
-            message_format % args))
-
-    @staticmethod
-    def is_localhost(host, localhosts):
-        # type: (str, Tuple[str, ...]) -> bool
-        """Check if request is for local host."""
-        if not host:
-            return True
-        for localhost in localhosts:
-            if host == localhost:
-                return True
-            if host.startswith(localhost + ":"):
-                return True
-        return False
+            headers.get("Host", "-") if headers else "-",
+            message_format % args)
 
-    def redirect_localhost(self):
-        # type: () -> bool
+    def redirect_localhost(self, snapshot):
+        # type: (pynullweb.reload.Snapshot) -> bool
         """Redirect to local content."""
-        server = cast(pynullweb.server.NullWebServer, self.server)
-        if self.is_localhost(self.headers.get("Host"), server.localhosts):
-            self.send_null_response(302)
-            self.send_header("Location", server.redirect + self.path)
-            self.end_headers()
+        if snapshot.host_matcher.match(self.headers.get("Host")):
+            self.null_server.metrics.count("redirect")
+            self.log_request(302)
+            self.wfile.write(snapshot.responses.redirect(
+                snapshot.redirect + self.path, self.close_announced))
             return True
         return False
 
+    def send_blocked(self, snapshot):
+        # type: (pynullweb.reload.Snapshot) -> bool
+        """Send the status of a blocklist that contains the requested host.
+
+        Hosts on lists with status 200 receive minimal content, as usual.
+        """
+        status = snapshot.blocklists.classify(self.headers.get("Host"))
+        if status is None or status == 200:
+            return False
+        self.null_server.metrics.count("blocked", status)
+        self.log_request(status)
+        self.wfile.write(
+            snapshot.responses.status(status, self.close_announced))
+        return True
+
+    def send_not_modified(self, snapshot):
+        # type: (pynullweb.reload.Snapshot) -> bool
+        """Send 304 Not Modified, if the client's copy is still current."""
+        response = snapshot.responses.not_modified(
+            self.headers.get("If-None-Match"),
+            self.headers.get("If-Modified-Since"), self.close_announced)
+        if response is None:
+            return False
+        self.null_server.metrics.count("not_modified")
+        self.log_request(304)
+        self.wfile.write(response)
+        return True
+
+    def send_rule(self, snapshot):
+        # type: (pynullweb.reload.Snapshot) -> bool
+        """Send the response of the first rule that matches the request.
+
+        Rules with content answer conditional requests with 304 Not
+        Modified. Their headers are added in any case.
+        """
+        rule = snapshot.rules.match(
+            self.headers.get("Host"), self.command, self.path)
+        if rule is None:
+            return False
+        metrics = self.null_server.metrics
+        if rule.status != 200:
+            metrics.count("rule", rule.status)
+            self.log_request(rule.status)
+            self.wfile.write(rule.response(
+                snapshot.responses, None, self.command,
+                self.close_announced)[0])
+            return True
+        response = snapshot.responses.not_modified(
+            self.headers.get("If-None-Match"),
+            self.headers.get("If-Modified-Since"), self.close_announced)
+        if response is not None:
+            metrics.count("rule", 304)
+            self.log_request(304)
+            self.wfile.write(rule.add_headers(response))
+            return True
+        metrics.count("rule", 200)
+        self.send_content(*rule.response(
+            snapshot.responses, rule.content_type or
+            snapshot.negotiator.get_content_type(
+                self.headers.get("Accept"), self.path),
+            self.command, self.close_announced))
+        return True
+
+    def send_metrics(self, snapshot):
+        # type: (pynullweb.reload.Snapshot) -> None
+        """Send the metrics of the server in Prometheus text format."""
+        content = self.null_server.metrics.render().encode("utf-8")
+        self.log_request(200, str(len(content)))
+        self.wfile.write(snapshot.responses.document(
+            pynullweb.metrics.CONTENT_TYPE, content, self.command,
+            self.close_announced))
+
     def send_head(self):
-        # type: () -> Optional[str]
-        """Execute common code for GET and HEAD requests."""
-        if self.redirect_localhost():
-            return None
-        content_type = pynullweb.header.get_content_type(
-            self.headers.get("Accept"),
-            ACCEPT_HEADERS,
-            self.path)
-        content = pynullweb.content.minimal_content(content_type)
-
-        self.send_null_response(200, str(len(content)))
-        self.send_header("Content-type", "/".join(content_type))
-        self.send_header("Content-length", str(len(content)))
-        self.send_header("Cache-control", "public,max-age=86400")
-        self.send_header("Expires", "Wed, 01 Jan 2070 16:17:18 GMT")
-        self.end_headers()
-        return content
+        # type: () -> None
+        """Send the complete response for GET and HEAD requests.
+
+        Status line, headers, and content are taken from the response cache
+        of the server and written at once. Only large payloads are sent
+        separately. The configuration snapshot is taken once, so that a
+        concurrent reload does not affect the request.
+        """
+        server = self.null_server
+        snapshot = server.snapshot
+        if server.metrics_path and self.path == server.metrics_path:
+            self.send_metrics(snapshot)
+            return
+        if self.redirect_localhost(snapshot) or self.send_rule(snapshot) \
+                or self.send_blocked(snapshot) \
+                or self.send_not_modified(snapshot):
+            return
+        content_type = snapshot.negotiator.get_content_type(
+            self.headers.get("Accept"), self.path)
+        server.metrics.count("content", content_type)
+        self.send_content(*snapshot.responses.content(
+            content_type, self.command, self.close_announced))
+
+    def send_content(self, response, body, length):
+        # type: (bytes, pynullweb.response.Body, int) -> None
+        """Send a response, and its large payload, if there is one.
+
+        HTTP/0.9 clients receive only the content.
+        """
+        self.log_request(200, str(length))
+        if self.request_version == "HTTP/0.9":
+            response = response[len(response) + len(body) - length:]
+        self.wfile.write(response)
+        if body:
+            # Send large payloads directly, without copying them
+            self.wfile.flush()
+            self.connection.sendall(body)
 
     def do_GET(self):  # pylint: disable=invalid-name
         # type: () -> None
         """Implement the HTTP GET method."""
-        content = self.send_head()
-        if content:
-            self.wfile.write(content)
+        self.send_head()
 
     def do_HEAD(self):  # pylint: disable=invalid-name
         # type: () -> None
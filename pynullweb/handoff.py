@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Handoff - restart a server without closing its listening socket.
+
+On SIGUSR2, a running server starts a new server process, e.g. after an
+upgrade, that inherits the listening sockets. The numbers of their file
+descriptors and their address families are passed in the environment
+variable PYNULLWEB_LISTEN_FD, e.g. "5:2,6:10". As
+soon as the new process serves requests, it reports this through a pipe,
+whose descriptor is passed in PYNULLWEB_READY_FD. Only then the old process
+stops accepting connections, finishes the open ones within a deadline, and
+exits. Meanwhile, new connections wait in the backlog of the shared socket,
+so that no connection is refused.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import select
+import signal
+import socket
+import sys
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Callable, List, Tuple  # NOQA, pylint: disable=unused-import
+
+
+LISTEN_FD = "PYNULLWEB_LISTEN_FD"
+READY_FD = "PYNULLWEB_READY_FD"
+
+
+def socket_from_fd(value):  # type: (str) -> socket.socket
+    """Return the listening socket of an inherited file descriptor.
+
+    The value is the number of the descriptor, optionally followed by the
+    address family, which Python 2 cannot detect.
+    """
+    fileno, _, family = value.partition(":")
+    if sys.version_info[0] > 2:
+        return socket.socket(fileno=int(fileno))
+    listener = socket.socket(_sock=socket.fromfd(  # type: ignore
+        int(fileno), int(family or socket.AF_INET), socket.SOCK_STREAM))
+    os.close(int(fileno))
+    return listener
+
+
+def inherited_sockets():  # type: () -> List[socket.socket]
+    """Return the listening sockets of the previous process, in order.
+
+    The environment variable is removed, so that it is not passed on.
+    """
+    value = os.environ.pop(LISTEN_FD, "")
+    return [socket_from_fd(item) for item in value.split(",") if item]
+
+
+def notify_ready():  # type: () -> None
+    """Report to the previous process, that this process serves requests."""
+    value = os.environ.pop(READY_FD, "")
+    if not value:
+        return
+    fileno = int(value)
+    try:
+        os.write(fileno, b"1")
+    except OSError:  # Previous process gave up waiting
+        pass
+    finally:
+        os.close(fileno)
+
+
+def close_other_fds(keep):  # type: (Tuple[int, ...]) -> None
+    """Close all file descriptors after stderr, except the given ones."""
+    start = 3
+    for fileno in sorted(keep):
+        os.closerange(start, fileno)
+        start = fileno + 1
+    os.closerange(start, os.sysconf("SC_OPEN_MAX"))
+
+
+class Handoff(object):
+    """Start a successor process that takes over the listening sockets."""
+
+    def __init__(self, command, timeout=10.0):
+        # type: (List[str], float) -> None
+        """Initialize with the command of the successor.
+
+        The successor must report within timeout seconds that it serves
+        requests, otherwise it is terminated.
+        """
+        self.command = command
+        self.timeout = timeout
+        self.process = None  # type: Any
+
+    def spawn(self, *listeners):  # type: (*socket.socket) -> bool
+        """Start the successor, return True as soon as it serves requests.
+
+        The successor receives the listening sockets in the given order.
+        Return False, if a successor is already running, or if it did not
+        report in time.
+        """
+        if self.process is not None and self.process.poll() is None:
+            return False
+        import subprocess
+        read_fd, write_fd = os.pipe()
+        fds = tuple(listener.fileno() for listener in listeners) + (write_fd,)
+        env = dict(os.environ)
+        env[LISTEN_FD] = ",".join(
+            "%d:%d" % (listener.fileno(), listener.family)
+            for listener in listeners)
+        env[READY_FD] = str(write_fd)
+        try:
+            if sys.version_info[0] > 2:
+                self.process = subprocess.Popen(
+                    self.command, env=env, pass_fds=fds)
+            else:
+                self.process = subprocess.Popen(
+                    self.command, env=env,
+                    preexec_fn=lambda: close_other_fds(fds))
+        finally:
+            os.close(write_fd)
+        try:
+            readable, _, _ = select.select([read_fd], [], [], self.timeout)
+            ready = bool(readable) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+        if not ready and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        return ready
+
+    def install(self, callback, signum=signal.SIGUSR2):
+        # type: (Callable[[], None], int) -> bool
+        """Call back on a signal, return False if this is not possible.
+
+        Signal handlers can only be installed by the main thread.
+        """
+        try:
+            signal.signal(signum, lambda *_: callback())
+        except ValueError:
+            return False
+        return True
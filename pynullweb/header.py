@@ -10,32 +10,82 @@ Handler - handles web requests.
 
 from __future__ import print_function
 
-import mimetypes
-import re
-
-from typing import List, Optional, Tuple  # NOQA, pylint: disable=unused-import
-
-
-ACCEPT_RE = re.compile(
-    r"""(                         # media-range capturing-parenthesis
-            [^\s;,]+              # type/subtype
-            (?:[ \t]*;[ \t]*      # ";"
-            (?:                   # parameter non-capturing-parenthesis
-                [^\s;,q][^\s;,]*  # token that doesn't start with "q"
-            |                     # or
-                q[^\s;,=][^\s;,]* # token that is more than just "q"
-            )
-            )*                    # zero or more parameters
-        )                         # end of media-range
-        (?:[ \t]*;[ \t]*q=        # weight is a "q" parameter
-            (\d*(?:\.\d+)?)       # qvalue capturing-parentheses
-            [^,]*                 # "extension" accept params: who cares?
-        )?                        # accept params are optional
-    """, re.VERBOSE)
-
-
-def parse_accept_header(header):
-    # type: (str) -> List[Tuple[str, str, float]]
+import collections
+import threading
+
+import pynullweb.mimetable
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, Iterator, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+    CacheKey = Tuple[Optional[str], Optional[str]]
+
+
+MAX_ACCEPT_LENGTH = 4096
+
+QUALITY_CHARS = "0123456789."
+
+
+def parse_quality(value):  # type: (str) -> float
+    """Return the weight of a "q" parameter value, between 0 and 1.
+
+    Characters after the number are ignored. An empty value means 1.
+    """
+    rest = value.lstrip(QUALITY_CHARS)
+    try:
+        quality = float(value[:len(value) - len(rest)] if rest else value)
+    except ValueError:
+        return 1.0
+    return max(min(quality, 1.0), 0.0)
+
+
+def iter_accept_header(header, max_length=None):
+    # type: (str, Optional[int]) -> Iterator[Tuple[str, str, float]]
+    """Yield the media ranges of an Accept:-header in order of appearance.
+
+    Each media range is a 3-tuple (main-type, sub-type, weight), like in
+    function parse_accept_header. The header is scanned once, from left to
+    right. Parameters before the "q" parameter remain part of the sub-type,
+    parameters after it are skipped without looking at them.
+
+    If max_length is given, only the media ranges that are completely within
+    the first max_length characters are used.
+    """
+    if not header:
+        return
+    if max_length is not None and len(header) > max_length:
+        header = header[:max(0, header.rfind(",", 0, max_length + 1))]
+    header = header.lower()
+    find = header.find
+    end = len(header)
+    start = 0
+    while start < end:
+        stop = find(",", start, end)
+        if stop < 0:
+            stop = end
+        media_end = stop
+        quality = 1.0
+        semi = find(";", start, stop)
+        if semi >= 0:
+            weight = find("q=", semi, stop)
+            while weight >= 0:
+                param = header.rfind(";", semi, weight)
+                if not header[param + 1:weight].strip():
+                    weight_end = find(";", weight, stop)
+                    quality = parse_quality(header[
+                        weight + 2:weight_end if weight_end >= 0 else stop])
+                    media_end = param
+                    break
+                weight = find("q=", weight + 2, stop)
+        media_range = header[start:media_end].strip()
+        start = stop + 1
+        if media_range:
+            main_type, slash, sub_type = media_range.partition("/")
+            yield main_type, sub_type if slash else "*", quality
+
+
+def parse_accept_header(header, max_length=None):
+    # type: (str, Optional[int]) -> List[Tuple[str, str, float]]
     """Return parsed Accept:-header as a list of weighted mime types.
 
     The result is a list of 3-tuples (main-type, sub-type, weigth), where
@@ -51,21 +101,9 @@ def parse_accept_header(header):
     """
     if not header:
         return []
-    result = []
-    for match in ACCEPT_RE.finditer(header.lower()):
-        parts = match.group(1).split("/")
-        main_type = parts[0]
-        if len(parts) == 1:
-            sub_type = "*"
-        else:
-            sub_type = parts[1]
-        quality_str = match.group(2)
-        if not quality_str:
-            quality = 1.0
-        else:
-            quality = max(min(float(quality_str), 1.0), 0.0)
-        result.append((main_type, sub_type, quality))
-    return sorted(result, key=lambda x: (x[2], x[0], x[1]), reverse=True)
+    return sorted(
+        iter_accept_header(header, max_length),
+        key=lambda x: (x[2], x[0], x[1]), reverse=True)
 
 
 def does_type_match(main_type, sub_type, main_item, sub_item):
@@ -115,15 +153,94 @@ def best_match(values,  # type: List[Tuple[str, str, float]]
     return result
 
 
+class Negotiator(object):
+    """Content negotiation compiled from a list of content types.
+
+    Exact types and "type/*" wildcards are resolved by a single dict lookup
+    each. A media range with main type "*", like "*/sub", matches any
+    content type, so it resolves to the first one without a lookup. The
+    cost of negotiation does not grow with the number of content types.
+    Results are the same as those of function best_match: the content type
+    with the highest quality wins; for equal qualities, the type that comes
+    first in the list wins.
+    """
+
+    def __init__(self, content_types, max_length=MAX_ACCEPT_LENGTH):
+        # type: (List[Tuple[str, str]], Optional[int]) -> None
+        """Compile the index for the given content types."""
+        self.content_types = list(content_types)
+        self.max_length = max_length
+        self._exact = {}  # type: Dict[Tuple[str, str], int]
+        self._main = {}  # type: Dict[str, int]
+        for index, (main_type, sub_type) in enumerate(self.content_types):
+            self._exact.setdefault((main_type, sub_type), index)
+            self._main.setdefault(main_type, index)
+
+    def resolve(self, main_type, sub_type):
+        # type: (str, str) -> Optional[int]
+        """Return index of first content type matching a media range.
+
+        A media range "*/*" is ignored, it matches nothing.
+        """
+        if main_type == "*":
+            if sub_type == "*" or not self.content_types:
+                return None
+            return 0
+        if sub_type == "*":
+            return self._main.get(main_type)
+        return self._exact.get((main_type, sub_type))
+
+    def best_match(self, values):
+        # type: (List[Tuple[str, str, float]]) -> Optional[Tuple[str, str]]
+        """Return best matching mime type for parsed Accept header.
+
+        The values must be sorted by descending quality, as returned by
+        function parse_accept_header.
+        """
+        best_index = -1
+        best_quality = 0.0
+        for main_type, sub_type, quality in values:
+            if quality < best_quality or quality <= 0.0:
+                break
+            index = self.resolve(main_type, sub_type)
+            if index is None:
+                continue
+            if quality > best_quality or index < best_index:
+                best_index = index
+                best_quality = quality
+                if index == 0:
+                    break
+        return self.content_types[best_index] if best_index >= 0 else None
+
+    def negotiate(self, accept_header):
+        # type: (str) -> Optional[Tuple[str, str]]
+        """Return best matching mime type for an Accept:-header.
+
+        The header is tokenized in one pass, without sorting. Tokenizing stops
+        as soon as the first content type matched with weight 1, because no
+        other media range can lead to a better match. Only the first
+        max_length characters of the header are considered.
+        """
+        best_index = -1
+        best_quality = 0.0
+        for main_type, sub_type, quality in iter_accept_header(
+                accept_header, self.max_length):
+            if quality < best_quality or quality <= 0.0:
+                continue
+            index = self.resolve(main_type, sub_type)
+            if index is None:
+                continue
+            if quality > best_quality or index < best_index:
+                best_index = index
+                best_quality = quality
+                if index == 0 and quality >= 1.0:
+                    break
+        return self.content_types[best_index] if best_index >= 0 else None
+
+
 def best_match_on_path(path):  # type: (str) -> Tuple[str, str]
     """Return mime type based on URI path."""
-    if path:
-        mime_type, _ = mimetypes.guess_type(path)
-        if mime_type:
-            main_sub_type = mime_type.split('/')
-            if len(main_sub_type) > 1:
-                return (main_sub_type[0], main_sub_type[1])
-    return ("text", "html")
+    return pynullweb.mimetable.guess_type(path) or ("text", "html")
 
 
 def get_content_type(accept_header, content_types, url_path):
@@ -132,3 +249,82 @@ def get_content_type(accept_header, content_types, url_path):
     content_type = best_match(
         parse_accept_header(accept_header), content_types)
     return content_type if content_type else best_match_on_path(url_path)
+
+
+def path_suffix(url_path):  # type: (str) -> str
+    """Return the part of the last path segment that determines its type.
+
+    This is its extension, as used by mimetable.guess_type, so that paths
+    with the same suffix always have the same content type.
+    """
+    return pynullweb.mimetable.path_extension(url_path)
+
+
+class NegotiationCache(object):
+    """Bounded, thread-safe LRU cache of negotiated content types.
+
+    Negotiation results are cached by Accept header. Only if the header does
+    not lead to a content type, the result is cached by path suffix. Every
+    lookup counts as a hit or a miss.
+    """
+
+    def __init__(self, content_types, maxsize=256,
+                 max_length=MAX_ACCEPT_LENGTH):
+        # type: (List[Tuple[str, str]], int, Optional[int]) -> None
+        """Initialize an empty cache for the given content types."""
+        self.negotiator = Negotiator(content_types, max_length)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()  # type: Dict[CacheKey, Optional[Tuple[str, str]]]  # NOQA
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        # type: (CacheKey) -> Tuple[bool, Optional[Tuple[str, str]]]
+        """Return whether key is cached and its value, mark it as used."""
+        with self._lock:
+            try:
+                value = self._cache.pop(key)
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._cache[key] = value
+            self.hits += 1
+            return True, value
+
+    def _store(self, key, value):
+        # type: (CacheKey, Optional[Tuple[str, str]]) -> None
+        """Store value under key, evict the least recently used entry."""
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def get_content_type(self, accept_header, url_path):
+        # type: (str, str) -> Tuple[str, str]
+        """Calculate content type based on accept header and url path."""
+        accept_header = accept_header or ""
+        max_length = self.negotiator.max_length
+        if max_length is not None and len(accept_header) > max_length:
+            # Negotiation only looks at this prefix
+            accept_header = accept_header[
+                :max(0, accept_header.rfind(",", 0, max_length + 1))]
+        accept_key = (accept_header, None)
+        found, content_type = self._lookup(accept_key)
+        if not found:
+            content_type = self.negotiator.negotiate(accept_header)
+            self._store(accept_key, content_type)
+        if content_type:
+            return content_type
+
+        path_key = (None, path_suffix(url_path))
+        found, content_type = self._lookup(path_key)
+        if found and content_type:
+            return content_type
+        path_type = best_match_on_path(url_path)
+        self._store(path_key, path_type)
+        return path_type
+
+    def __len__(self):  # type: () -> int
+        """Return the number of cached entries."""
+        return len(self._cache)
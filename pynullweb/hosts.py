@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Hosts - decide whether a request is for a local host.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, Iterable, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+# Key that marks a trie node as the end of a domain suffix. It cannot
+# collide with a label, because labels are never empty.
+SUFFIX_END = ""
+
+
+def cleanup_localhosts(raw_hosts):
+    # type: (str) -> Tuple[str, ...]
+    """Transform comma-separated host names into tuple of strings."""
+    return tuple([
+        name.strip() for name in raw_hosts.split(",") if name.strip()])
+
+
+def strip_port(host):  # type: (str) -> str
+    """Return the host name of a Host:-header value, without port."""
+    if host.startswith("["):  # IPv6 address
+        end = host.find("]")
+        return host[:end + 1] if end >= 0 else host
+    colon = host.find(":")
+    return host[:colon] if colon >= 0 else host
+
+
+def normalize_host(host):  # type: (str) -> str
+    """Return the host name in lower case, without port and trailing dot."""
+    return strip_port(host.strip()).lower().rstrip(".")
+
+
+class HostMatcher(object):
+    """Matcher for local host names, compiled from a list of names.
+
+    A name is either an exact host name, like "router.lan", or a domain
+    suffix, like "*.lan", which matches all host names within that domain,
+    but not the domain itself. Exact names are kept in a set. Domain suffixes
+    are kept in a trie of reversed labels, so "*.home.lan" is stored as
+    lan -> home. Ports and the case of names are ignored.
+    """
+
+    def __init__(self, names):  # type: (Iterable[str]) -> None
+        """Compile the matcher."""
+        self._exact = set()  # type: set
+        self._suffixes = {}  # type: Dict[str, Any]
+        for name in names:
+            name = name.strip()
+            if name.startswith("*."):
+                self.add_suffix(name[2:])
+            elif name.startswith("."):
+                self.add_suffix(name[1:])
+            else:
+                name = normalize_host(name)
+                if name:
+                    self._exact.add(name)
+
+    def add_suffix(self, domain):  # type: (str) -> None
+        """Add a domain, whose sub-domains are all local."""
+        domain = normalize_host(domain)
+        if not domain:
+            return
+        node = self._suffixes
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        node[SUFFIX_END] = True
+
+    def match(self, host):  # type: (Optional[str]) -> bool
+        """Check if the value of a Host:-header denotes a local host.
+
+        A request without a host name is always local.
+        """
+        if not host or host in self._exact:
+            return True
+        name = normalize_host(host)
+        if not name or name in self._exact:
+            return True
+        if not self._suffixes:
+            return False
+        labels = name.split(".")
+        node = self._suffixes
+        for index in range(len(labels) - 1, 0, -1):
+            node = node.get(labels[index])
+            if node is None:
+                return False
+            if SUFFIX_END in node:
+                return True
+        return False
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Listeners - listening sockets on several addresses.
+
+A server may listen on several addresses at once: IPv4 and IPv6 addresses,
+several ports, and Unix sockets, e.g. for local health probes. All of them
+are served by the same server, which shares its configuration and tables.
+
+Listen addresses are written as PORT, HOST:PORT, [IPV6]:PORT, or unix:PATH.
+IPv6 sockets accept only IPv6 connections, so that a dual-stack server
+listens on both 0.0.0.0:PORT and [::]:PORT.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import errno
+import os
+import socket
+import stat
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, List, Tuple  # NOQA, pylint: disable=unused-import
+
+
+# Client address of connections to Unix sockets
+LOCAL_CLIENT = ("-", 0)
+
+
+def parse_address(text, default_host=""):
+    # type: (str, str) -> Tuple[int, Any]
+    """Return address family and socket address of a listen address.
+
+    A port without host uses the default host, all IPv4 interfaces if it is
+    empty. Host names are resolved.
+    """
+    text = text.strip()
+    if text.startswith("unix:"):
+        if not text[5:]:
+            raise ValueError("Listen address without path: %r" % (text,))
+        return getattr(socket, "AF_UNIX"), text[5:]
+    if text.startswith("["):
+        host, _, port = text[1:].partition("]")
+        if not port.startswith(":"):
+            raise ValueError("Listen address without port: %r" % (text,))
+        port = port[1:]
+    elif ":" in text:
+        host, _, port = text.rpartition(":")
+    else:
+        host, port = default_host, text
+    if not port.isdigit():
+        raise ValueError("Listen address without port: %r" % (text,))
+    if not host:
+        return socket.AF_INET, ("0.0.0.0", int(port))
+    family, _, _, _, address = socket.getaddrinfo(
+        host, int(port), 0, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)[0]
+    return family, address
+
+
+def from_config(config, server_address):
+    # type: (Dict[str, str], Tuple[str, int]) -> List[Tuple[int, Any]]
+    """Return the listen addresses of the server configuration.
+
+    Without configured addresses, the server address is used.
+    """
+    addresses = [
+        parse_address(text, server_address[0])
+        for text in config.get("listen", "").split(",") if text.strip()]
+    if not addresses:
+        addresses.append(parse_address(
+            "%s:%d" % server_address if ":" not in server_address[0] else
+            "[%s]:%d" % server_address))
+    return addresses
+
+
+def same_address(family, address, listener):
+    # type: (int, Any, socket.socket) -> bool
+    """Return True, if the socket listens on the address."""
+    if listener.family != family:
+        return False
+    bound = listener.getsockname()
+    if isinstance(address, tuple):
+        return tuple(bound[:2]) == tuple(address[:2])
+    return bound == address
+
+
+def remove_stale_socket(path):  # type: (str) -> None
+    """Remove a Unix socket, on which no server listens anymore.
+
+    Raise socket.error, if the path is not a socket, or if a server still
+    accepts connections on it.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return
+    if stat.S_ISSOCK(mode):
+        probe = socket.socket(getattr(socket, "AF_UNIX"), socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except socket.error as exc:
+            if exc.args[0] != errno.ECONNREFUSED:
+                raise
+            os.remove(path)
+            return
+        finally:
+            probe.close()
+    raise socket.error(errno.EADDRINUSE, "Address in use: %s" % (path,))
+
+
+def bind(family, address, backlog, inherited=()):
+    # type: (int, Any, int, List[socket.socket]) -> socket.socket
+    """Return a listening socket on the address.
+
+    If an inherited socket listens on the address, it is taken from the
+    list and used. A stale Unix socket is removed before binding, other
+    files are not.
+    """
+    for listener in inherited:
+        if same_address(family, address, listener):
+            inherited.remove(listener)  # type: ignore
+            listener.listen(backlog)
+            return listener
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if isinstance(address, tuple):
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if family == socket.AF_INET6:
+                listener.setsockopt(
+                    socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        else:
+            remove_stale_socket(address)
+        listener.bind(address)
+        listener.listen(backlog)
+    except socket.error:
+        listener.close()
+        raise
+    return listener
+
+
+def describe(listener):  # type: (socket.socket) -> str
+    """Return the listen address of a socket, as it is configured."""
+    address = listener.getsockname()
+    if not isinstance(address, tuple):
+        return "unix:" + address
+    if listener.family == socket.AF_INET6:
+        return "[%s]:%d" % address[:2]
+    return "%s:%d" % address
+
+
+def accept(listener):
+    # type: (socket.socket) -> Tuple[socket.socket, Tuple[str, int]]
+    """Accept a connection, return it with the client address.
+
+    Clients of Unix sockets have the address LOCAL_CLIENT.
+    """
+    connection, client_address = listener.accept()
+    if not isinstance(client_address, tuple):
+        client_address = LOCAL_CLIENT
+    return connection, client_address
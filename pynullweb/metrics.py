@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Metrics - counters of the served requests, in Prometheus text format.
+
+Counters are kept per thread, so that counting needs no lock. They are
+merged only when the metrics are scraped. In pre-fork mode, every worker
+process has its own metrics.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import bisect
+import threading
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Callable, Dict, List, Tuple  # NOQA, pylint: disable=unused-import
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+
+# Keys of the per-thread counters, beside (kind, detail) of responses
+DURATION_COUNT = ("duration", "count")
+DURATION_SUM = ("duration", "sum")
+CONNECTIONS = ("connections", None)
+
+
+def format_labels(kind, detail):  # type: (str, Any) -> str
+    """Return the labels of a response counter."""
+    if kind == "content":
+        return 'kind="content",content_type="%s"' % ("/".join(detail),)
+    if detail is None:
+        return 'kind="%s"' % (kind,)
+    return 'kind="%s",status="%s"' % (kind, detail)
+
+
+class Metrics(object):
+    """Per-thread counters of responses, latencies, and connections.
+
+    Responses are counted by kind: "content" with the content type as
+    detail, "redirect", "not_modified", "blocked", "rule" and "error" with
+    the status code. Shed connections and requests are counted as "shed" with
+    the reason as detail.
+    Additional values, e.g. cache statistics, are retrieved by callbacks
+    when the metrics are rendered.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        # type: (Tuple[float, ...]) -> None
+        """Initialize empty metrics."""
+        self.buckets = buckets
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []  # type: List[Dict[Any, Any]]
+        self._callbacks = []  # type: List[Tuple[str, str, str, Callable[[], float]]]  # NOQA
+
+    def values(self):  # type: () -> Dict[Any, Any]
+        """Return the counters of the current thread."""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._all.append(values)
+            return values
+
+    def count(self, kind, detail=None):  # type: (str, Any) -> None
+        """Count a response."""
+        values = self.values()
+        key = (kind, detail)
+        values[key] = values.get(key, 0) + 1
+
+    def observe(self, seconds):  # type: (float) -> None
+        """Add the duration of a request to the latency histogram."""
+        values = self.values()
+        key = ("bucket", bisect.bisect_left(self.buckets, seconds))
+        values[key] = values.get(key, 0) + 1
+        values[DURATION_COUNT] = values.get(DURATION_COUNT, 0) + 1
+        values[DURATION_SUM] = values.get(DURATION_SUM, 0.0) + seconds
+
+    def connection(self, delta):  # type: (int) -> None
+        """Change the number of open connections."""
+        values = self.values()
+        values[CONNECTIONS] = values.get(CONNECTIONS, 0) + delta
+
+    def register(self, name, metric_type, description, callback):
+        # type: (str, str, str, Callable[[], float]) -> None
+        """Register a callback that returns the value of a metric."""
+        self._callbacks.append((name, metric_type, description, callback))
+
+    def merged(self):  # type: () -> Dict[Any, Any]
+        """Return the sum of the counters of all threads."""
+        with self._lock:
+            all_values = list(self._all)
+        result = {}  # type: Dict[Any, Any]
+        for values in all_values:
+            for key, value in dict(values).items():
+                result[key] = result.get(key, 0) + value
+        return result
+
+    def render(self):  # type: () -> str
+        """Return all metrics in Prometheus text format."""
+        values = self.merged()
+        lines = [
+            "# HELP pynullweb_responses_total Responses by kind.",
+            "# TYPE pynullweb_responses_total counter"]
+        for key in sorted(
+                (key for key in values if key[0] in (
+                    "content", "redirect", "not_modified", "blocked", "rule",
+                    "error")), key=str):
+            lines.append("pynullweb_responses_total{%s} %d" % (
+                format_labels(*key), values[key]))
+        lines.extend([
+            "# HELP pynullweb_request_duration_seconds Time to answer a "
+            "request.",
+            "# TYPE pynullweb_request_duration_seconds histogram"])
+        cumulative = 0
+        for index, bound in enumerate(self.buckets):
+            cumulative += values.get(("bucket", index), 0)
+            lines.append(
+                'pynullweb_request_duration_seconds_bucket{le="%s"} %d' % (
+                    bound, cumulative))
+        count = values.get(DURATION_COUNT, 0)
+        lines.extend([
+            'pynullweb_request_duration_seconds_bucket{le="+Inf"} %d' % (
+                count,),
+            "pynullweb_request_duration_seconds_sum %.6f" % (
+                values.get(DURATION_SUM, 0.0),),
+            "pynullweb_request_duration_seconds_count %d" % (count,),
+            "# HELP pynullweb_connections Open client connections.",
+            "# TYPE pynullweb_connections gauge",
+            "pynullweb_connections %d" % (values.get(CONNECTIONS, 0),),
+            "# HELP pynullweb_shed_total Connections and requests shed by "
+            "admission control.",
+            "# TYPE pynullweb_shed_total counter"])
+        for key in sorted(key for key in values if key[0] == "shed"):
+            lines.append('pynullweb_shed_total{reason="%s"} %d' % (
+                key[1], values[key]))
+        for name, metric_type, description, callback in self._callbacks:
+            lines.extend([
+                "# HELP %s %s" % (name, description),
+                "# TYPE %s %s" % (name, metric_type),
+                "%s %s" % (name, callback())])
+        return "\n".join(lines) + "\n"
+
+
+def create_metrics(server):  # type: (Any) -> Metrics
+    """Create the metrics of a null web server.
+
+    Statistics of its negotiation cache and access log are included. The
+    negotiation cache is replaced on reload, so its counters start over.
+    """
+    metrics = Metrics()
+    access_log = server.access_log
+    metrics.register(
+        "pynullweb_negotiation_cache_hits_total", "counter",
+        "Content negotiations answered by the cache.",
+        lambda: server.snapshot.negotiator.hits)
+    metrics.register(
+        "pynullweb_negotiation_cache_misses_total", "counter",
+        "Content negotiations not found in the cache.",
+        lambda: server.snapshot.negotiator.misses)
+    metrics.register(
+        "pynullweb_access_log_sampled_total", "counter",
+        "Requests not logged due to sampling.",
+        lambda: access_log.sampled)
+    metrics.register(
+        "pynullweb_access_log_dropped_total", "counter",
+        "Log records dropped, because the queue was full.",
+        lambda: access_log.dropped)
+    return metrics
+
+
+def register_tls(metrics, contexts):  # type: (Metrics, Any) -> None
+    """Include the statistics of the TLS contexts of a server."""
+    metrics.register(
+        "pynullweb_tls_context_hits_total", "counter",
+        "TLS handshakes whose context was cached.",
+        lambda: contexts.hits)
+    metrics.register(
+        "pynullweb_tls_context_misses_total", "counter",
+        "TLS handshakes whose context was created.",
+        lambda: contexts.misses)
+    metrics.register(
+        "pynullweb_tls_certificates_minted_total", "counter",
+        "Certificates minted by the local certificate authority.",
+        lambda: contexts.authority.minted)
+    metrics.register(
+        "pynullweb_tls_failures_total", "counter",
+        "Server names without certificate, the default one was sent.",
+        lambda: contexts.failures)
+    metrics.register(
+        "pynullweb_tls_mint_dropped_total", "counter",
+        "Server names not minted, because too many were waiting.",
+        lambda: contexts.dropped)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbench - micro-benchmarks for content negotiation and host matching.
+
+Measure the functions of module header that run on every request against
+a corpus of real-world Accept headers, the local host matcher against
+growing lists of host names, lookups in a large domain blocklist and in
+growing rule tables, the overhead of counting metrics, and the parsing of
+request heads.
+Report nanoseconds per call and, on Python 3, the peak number of bytes
+allocated per call. Times are also reported relative to a fixed
+calibration workload, so that results of faster or slower machines can be
+compared. Results can be saved as a baseline; a later run fails if it is
+slower than the baseline by more than a threshold factor:
+
+    python -m pynullweb.microbench --save tests/microbench_baseline.json
+    python -m pynullweb.microbench --check tests/microbench_baseline.json
+
+Saving keeps the entries of an existing baseline and adds only new
+benchmarks, so that the baseline of existing benchmarks is not moved by
+accident. Use --reset to record all of them anew.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import io
+import json
+import os
+import sys
+import timeit
+
+from typing import Any, Callable, Dict, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+import pynullweb.blocklist
+import pynullweb.content
+import pynullweb.handler
+import pynullweb.header
+import pynullweb.hosts
+import pynullweb.metrics
+import pynullweb.response
+import pynullweb.rules
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None  # type: ignore
+
+Results = Dict[str, Dict[str, Any]]
+
+
+def pathological_header(ranges, params):
+    # type: (int, int) -> str
+    """Return a long Accept header with many media ranges and parameters."""
+    parameters = "".join(
+        ";p%d=\"v%d\"" % (i, i) for i in range(params))
+    return ", ".join(
+        "application/x-type%d%s;q=0.%d" % (i, parameters, i % 10)
+        for i in range(ranges))
+
+
+CORPUS = collections.OrderedDict([
+    ("chrome-document",
+     "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,"
+     "image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;"
+     "q=0.7"),
+    ("chrome-image", "image/avif,image/webp,image/apng,image/svg+xml,"
+     "image/*,*/*;q=0.8"),
+    ("chrome-script", "*/*"),
+    ("firefox-document",
+     "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,"
+     "image/webp,*/*;q=0.8"),
+    ("firefox-image", "image/avif,image/webp,*/*"),
+    ("firefox-style", "text/css,*/*;q=0.1"),
+    ("safari-document",
+     "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"),
+    ("safari-image", "image/webp,image/png,image/svg+xml,image/*;q=0.8,"
+     "video/*;q=0.8,*/*;q=0.5"),
+    ("curl", "*/*"),
+    ("googlebot", "text/html,application/xhtml+xml,application/xml;q=0.9,"
+     "*/*;q=0.8"),
+    ("bingbot", "*/*"),
+    ("empty", ""),
+    ("long-ranges", pathological_header(200, 0)),
+    ("long-params", pathological_header(20, 30)),
+])  # type: Dict[str, str]
+
+PATHS = collections.OrderedDict([
+    ("gif", "/pixel.gif"),
+    ("query", "/banner.png?id=4711&ref=http%3A%2F%2Fexample.com%2F"),
+    ("script", "/track.js"),
+    ("none", "/"),
+])  # type: Dict[str, str]
+
+HOST_COUNTS = (10, 100, 10000)
+
+HOSTS = collections.OrderedDict([
+    ("exact", "host7.lan:8080"),
+    ("suffix", "nas.zone7.example.org"),
+    ("miss", "pagead2.googlesyndication.com"),
+])  # type: Dict[str, str]
+
+
+# Request head of a browser that loads an image of a blocked host
+REQUEST_HEAD = (
+    b"GET /pagead/pixel.gif?id=4711 HTTP/1.1\r\n"
+    b"Host: pagead2.googlesyndication.com\r\n"
+    b"Connection: keep-alive\r\n"
+    b"User-Agent: Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    b"(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36\r\n"
+    b"Accept: image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;"
+    b"q=0.8\r\n"
+    b"Referer: https://news.example.com/\r\n"
+    b"Accept-Encoding: gzip, deflate, br\r\n"
+    b"Accept-Language: de-DE,de;q=0.9,en;q=0.8\r\n"
+    b"Cookie: id=22a7c1b0c0d1e2f3; IDE=AHWqTUk3\r\n\r\n")
+
+
+class ParseOnlyHandler(pynullweb.handler.NullWebHandler):
+    """Handler that only parses request heads, without connection."""
+
+    def __init__(self):  # pylint: disable=super-init-not-called
+        """Do not handle a connection."""
+        self.rfile = io.BytesIO()
+
+
+def parse_request(handler, parse, head):
+    # type: (ParseOnlyHandler, Callable[[Any], bool], bytes) -> bool
+    """Parse a request head with the given method."""
+    handler.rfile = io.BytesIO(head)
+    handler.raw_requestline = handler.rfile.readline(65537)
+    return parse(handler)
+
+
+def local_hosts(count):  # type: (int) -> List[str]
+    """Return a list of local host names, half of them domain suffixes."""
+    return [
+        "host%d.lan" % i if i % 2 else "*.zone%d.example.org" % i
+        for i in range(count)]
+
+
+BLOCKLIST_SIZE = 100000
+
+
+def blocked_domains(count):  # type: (int) -> List[str]
+    """Return a list of domain names, as found in blocklists."""
+    return [
+        "ads%d.tracker%d.example.%s" % (
+            i, i % 997, ("com", "net", "org")[i % 3])
+        for i in range(count)]
+
+
+RULE_COUNTS = (10, 1000)
+
+RULE_REQUESTS = collections.OrderedDict([
+    ("hit", ("www.site7.example.org", "GET", "/ads/banner.js")),
+    ("miss", ("pagead2.googlesyndication.com", "GET", "/pagead/pixel.gif")),
+])  # type: Dict[str, Tuple[str, str, str]]
+
+
+def site_rules(count):  # type: (int) -> List[str]
+    """Return a list of rules, as written for site-specific tweaks."""
+    return [
+        ("host=site%d.example.org path=/ads ext=js status=204" if i % 2 else
+         "host=site%d.example.com method=HEAD status=404") % i
+        for i in range(count)]
+
+
+def benchmarks():
+    # type: () -> List[Tuple[str, Callable[..., Any], Tuple[Any, ...]]]
+    """Return list of benchmarks as name, function, and arguments."""
+    header = pynullweb.header
+    content_types = list(pynullweb.content.content_types())
+    result = []  # type: List[Tuple[str, Callable[..., Any], Tuple[Any, ...]]]
+    for name, accept in CORPUS.items():
+        result.append((
+            "parse_accept_header/" + name, header.parse_accept_header,
+            (accept,)))
+    for name, accept in CORPUS.items():
+        result.append((
+            "iter_accept_header/" + name,
+            lambda accept: list(header.iter_accept_header(accept)), (accept,)))
+    for name, accept in CORPUS.items():
+        result.append((
+            "best_match/" + name, header.best_match,
+            (header.parse_accept_header(accept), content_types)))
+    negotiator = header.Negotiator(content_types)
+    for name, accept in CORPUS.items():
+        result.append((
+            "negotiator/" + name, negotiator.best_match,
+            (header.parse_accept_header(accept),)))
+    for name, accept in CORPUS.items():
+        result.append((
+            "negotiate/" + name, negotiator.negotiate, (accept,)))
+    result.append((
+        "does_type_match/wildcard", header.does_type_match,
+        ("image", "*", "image", "gif")))
+    result.append((
+        "does_type_match/exact", header.does_type_match,
+        ("text", "html", "text", "plain")))
+    for name, path in PATHS.items():
+        result.append((
+            "best_match_on_path/" + name, header.best_match_on_path, (path,)))
+    for name, accept in CORPUS.items():
+        result.append((
+            "get_content_type/" + name, header.get_content_type,
+            (accept, content_types, "/pixel.gif")))
+    for count in HOST_COUNTS:
+        matcher = pynullweb.hosts.HostMatcher(local_hosts(count))
+        for name, host in HOSTS.items():
+            result.append((
+                "host_matcher/%s-%d" % (name, count), matcher.match, (host,)))
+    index = pynullweb.blocklist.DomainIndex.build(
+        blocked_domains(BLOCKLIST_SIZE))
+    for name, host in (
+            ("hit", "www.ads4711.tracker723.example.net"),
+            ("miss", "pagead2.googlesyndication.com")):
+        result.append((
+            "domain_index/%s-%d" % (name, BLOCKLIST_SIZE),
+            index.__contains__, (host,)))
+    for count in RULE_COUNTS:
+        rules = pynullweb.rules.RuleTable.from_config(
+            "\n".join(site_rules(count)))
+        for name, request in RULE_REQUESTS.items():
+            result.append((
+                "rules/%s-%d" % (name, count), rules.match, request))
+    metrics = pynullweb.metrics.Metrics()
+    result.append((
+        "metrics/count", metrics.count, ("content", ("image", "gif"))))
+    result.append(("metrics/observe", metrics.observe, (0.0003,)))
+    responses = pynullweb.response.ResponseCache("HTTP/1.1")
+    etag, modified = pynullweb.content.PAYLOADS.validators(("image", "gif"))
+    result.append((
+        "response/content", responses.content, (("image", "gif"), "GET")))
+    result.append((
+        "response/not_modified-etag", responses.not_modified, (etag, None)))
+    result.append((
+        "response/not_modified-date", responses.not_modified,
+        (None, pynullweb.response.http_date(modified))))
+    for name, parse in (
+            ("fast", ParseOnlyHandler.parse_request),
+            ("base", pynullweb.handler.BaseHTTPServer.BaseHTTPRequestHandler
+             .parse_request)):
+        result.append((
+            "parse_request/" + name, parse_request,
+            (ParseOnlyHandler(), parse, REQUEST_HEAD)))
+    return result
+
+
+# Name of the calibration result, whose time is the unit of relative times
+CALIBRATION = "calibration"
+
+CALIBRATION_WORDS = tuple(
+    " Word%d.Example " % (i,) for i in range(64))  # type: Tuple[str, ...]
+
+
+def calibration():  # type: () -> int
+    """Run a fixed workload of string and dict operations."""
+    counts = {}  # type: Dict[str, int]
+    for word in CALIBRATION_WORDS:
+        key = word.strip().lower().partition(".")[0]
+        counts[key] = counts.get(key, 0) + len(key)
+    return len(counts)
+
+
+def measure_time(function, args, min_time):
+    # type: (Callable[..., Any], Tuple[Any, ...], float) -> float
+    """Return the best time of some repetitions in nanoseconds per call."""
+    timer = timeit.Timer(lambda: function(*args))
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time / 5:
+            break
+        number *= 4
+    best = min([elapsed] + timer.repeat(repeat=4, number=number))
+    return 1e9 * best / number
+
+
+def measure_allocation(function, args):
+    # type: (Callable[..., Any], Tuple[Any, ...]) -> Optional[int]
+    """Return the peak number of bytes allocated by one call."""
+    if tracemalloc is None:
+        return None
+    function(*args)  # Warm up caches
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before)
+
+
+def run(min_time=0.2, selection=None):
+    # type: (float, Optional[str]) -> Results
+    """Run all (selected) benchmarks, return the results by name."""
+    results = collections.OrderedDict()  # type: Results
+    results[CALIBRATION] = {
+        "ns_per_op": round(measure_time(calibration, (), min_time), 1),
+        "relative": 1.0}
+    for name, function, args in benchmarks():
+        if selection and selection not in name:
+            continue
+        # Calibrate next to each benchmark, as the machine's speed varies
+        unit = measure_time(calibration, (), min_time / 2)
+        elapsed = measure_time(function, args, min_time)
+        results[name] = {
+            "ns_per_op": round(elapsed, 1),
+            "relative": round(elapsed / unit, 4),
+            "alloc_bytes": measure_allocation(function, args),
+        }
+    return results
+
+
+def merge(baseline, results):
+    # type: (Results, Results) -> Results
+    """Return the baseline, extended by the results of new benchmarks."""
+    merged = collections.OrderedDict(baseline)  # type: Results
+    for name, result in results.items():
+        if name not in merged:
+            merged[name] = result
+    return merged
+
+
+def compare(results, baseline, threshold):
+    # type: (Results, Results, float) -> List[str]
+    """Return a description of all results that regressed against baseline.
+
+    A result regressed if it needs more time or allocates more bytes than
+    the baseline, multiplied by the threshold factor. Times are compared
+    relative to the calibration workload, if both have relative times.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or name == CALIBRATION:
+            continue
+        time_key = "relative" if "relative" in result and \
+            "relative" in base else "ns_per_op"
+        for key in (time_key, "alloc_bytes"):
+            value, base_value = result.get(key), base.get(key)
+            if value is None or not base_value:
+                continue
+            if value > base_value * threshold:
+                regressions.append("%s: %s %s > %s * %.2f" % (
+                    name, key, value, base_value, threshold))
+    return regressions
+
+
+def main():
+    # type: () -> None
+    """Run the micro-benchmarks."""
+    parser = argparse.ArgumentParser(prog="python -m pynullweb.microbench")
+    parser.add_argument(
+        "--save", type=str, help="store results as baseline in file")
+    parser.add_argument(
+        "--reset", action="store_true",
+        help="with --save, record existing benchmarks anew, too")
+    parser.add_argument(
+        "--check", type=str, help="compare results with baseline in file")
+    parser.add_argument(
+        "--threshold", type=float, default=1.5,
+        help="allowed slowdown factor against baseline")
+    parser.add_argument(
+        "--min-time", type=float, default=0.2,
+        help="minimum seconds to measure each benchmark")
+    parser.add_argument(
+        "-k", "--select", type=str,
+        help="run only benchmarks whose name contains this string")
+    args = parser.parse_args()
+
+    results = run(args.min_time, args.select)
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.save:
+        saved = results
+        if not args.reset and os.path.exists(args.save):
+            with open(args.save) as baseline_file:
+                saved = merge(json.load(
+                    baseline_file, object_pairs_hook=collections.OrderedDict),
+                    results)
+        with open(args.save, "w") as baseline_file:
+            baseline_file.write(json.dumps(saved, indent=2) + "\n")
+    if args.check:
+        with open(args.check) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mimetable - precomputed content types of file name extensions.
+
+In contrast to module mimetypes, no MIME databases of the system are read,
+so that neither importing this module nor the first lookup is slow. The
+table contains the types of the Python standard library for extensions
+that are commonly found on the web.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+EXTENSION_TYPES = {
+    ".7z": ("application", "x-7z-compressed"),
+    ".atom": ("application", "atom+xml"),
+    ".avif": ("image", "avif"),
+    ".bin": ("application", "octet-stream"),
+    ".bmp": ("image", "bmp"),
+    ".css": ("text", "css"),
+    ".csv": ("text", "csv"),
+    ".dll": ("application", "octet-stream"),
+    ".eot": ("application", "vnd.ms-fontobject"),
+    ".exe": ("application", "octet-stream"),
+    ".flac": ("audio", "flac"),
+    ".gif": ("image", "gif"),
+    ".htm": ("text", "html"),
+    ".html": ("text", "html"),
+    ".ico": ("image", "vnd.microsoft.icon"),
+    ".jpe": ("image", "jpeg"),
+    ".jpeg": ("image", "jpeg"),
+    ".jpg": ("image", "jpeg"),
+    ".js": ("text", "javascript"),
+    ".json": ("application", "json"),
+    ".m3u8": ("application", "vnd.apple.mpegurl"),
+    ".m4a": ("audio", "mp4"),
+    ".manifest": ("text", "cache-manifest"),
+    ".map": ("application", "json"),
+    ".mjs": ("text", "javascript"),
+    ".mov": ("video", "quicktime"),
+    ".mp3": ("audio", "mpeg"),
+    ".mp4": ("video", "mp4"),
+    ".mpeg": ("video", "mpeg"),
+    ".mpg": ("video", "mpeg"),
+    ".oga": ("audio", "ogg"),
+    ".ogg": ("audio", "ogg"),
+    ".ogv": ("video", "ogg"),
+    ".otf": ("font", "otf"),
+    ".pdf": ("application", "pdf"),
+    ".png": ("image", "png"),
+    ".rss": ("application", "rss+xml"),
+    ".svg": ("image", "svg+xml"),
+    ".swf": ("application", "x-shockwave-flash"),
+    ".tif": ("image", "tiff"),
+    ".tiff": ("image", "tiff"),
+    ".ttf": ("font", "ttf"),
+    ".txt": ("text", "plain"),
+    ".vtt": ("text", "vtt"),
+    ".wasm": ("application", "wasm"),
+    ".wav": ("audio", "x-wav"),
+    ".weba": ("audio", "webm"),
+    ".webm": ("video", "webm"),
+    ".webmanifest": ("application", "manifest+json"),
+    ".webp": ("image", "webp"),
+    ".woff": ("font", "woff"),
+    ".woff2": ("font", "woff2"),
+    ".xhtml": ("application", "xhtml+xml"),
+    ".xml": ("text", "xml"),
+    ".zip": ("application", "zip"),
+}  # type: Dict[str, Tuple[str, str]]
+
+
+def path_extension(url_path):  # type: (Optional[str]) -> str
+    """Return the extension of a path in lower case, or an empty string.
+
+    Query and fragment of the path are ignored, as is the leading dot of
+    hidden file names.
+    """
+    if not url_path:
+        return ""
+    end = len(url_path)
+    for separator in "?#":
+        position = url_path.find(separator, 0, end)
+        if position >= 0:
+            end = position
+    slash = url_path.rfind("/", 0, end)
+    dot = url_path.rfind(".", slash + 1, end)
+    if dot <= slash + 1:
+        return ""
+    return url_path[dot:end].lower()
+
+
+def guess_type(url_path):  # type: (Optional[str]) -> Optional[Tuple[str, str]]
+    """Return the content type of a path by its extension, or None.
+
+    Query and fragment of the path are ignored, the extension is not case
+    sensitive.
+    """
+    return EXTENSION_TYPES.get(path_extension(url_path))
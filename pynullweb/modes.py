@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Modes - select and create the server for a concurrency mode.
+
+The server modules are only imported when a server is created, so that
+only the code of the selected mode is loaded: the asyncio server does not
+need the BaseHTTPServer-based servers and vice versa.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import sys
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, List, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+# Concurrency modes of the BaseHTTPServer-based servers in module server
+LEGACY_MODES = ("prefork", "single", "thread")
+
+ASYNCIO_AVAILABLE = sys.version_info >= (3, 4)
+DEFAULT_MODE = "asyncio" if ASYNCIO_AVAILABLE else "single"
+
+
+def server_modes():
+    # type: () -> List[str]
+    """Return the names of all available concurrency modes."""
+    modes = list(LEGACY_MODES)
+    if ASYNCIO_AVAILABLE:
+        modes.append("asyncio")
+    return modes
+
+
+def create_server(server_address, request_handler, config):
+    # type: (Tuple[str, int], Optional[type], Dict[str, Dict[str, str]]) -> Any
+    """Create a null web server for the configured concurrency mode.
+
+    The request handler is ignored by the asyncio server, which parses
+    requests by itself. If it is None, NullWebHandler is used.
+    """
+    mode = config["server"].get("mode", DEFAULT_MODE)
+    if mode == "asyncio" and ASYNCIO_AVAILABLE:
+        import pynullweb.aioserver
+        return pynullweb.aioserver.AsyncNullWebServer(
+            server_address, request_handler, config)
+    if mode not in LEGACY_MODES:
+        raise ValueError("Unknown server mode: %r" % (mode,))
+    import pynullweb.server
+    if request_handler is None:
+        import pynullweb.handler
+        request_handler = pynullweb.handler.NullWebHandler
+    return pynullweb.server.SERVER_MODES[mode](
+        server_address, request_handler, config)
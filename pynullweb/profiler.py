@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profiler - sample the stacks of a running server.
+
+The stacks of all threads are taken at a fixed interval and counted. Where
+available, a profiling timer interrupts the process after each interval of
+used CPU time; otherwise a background thread samples at intervals of wall
+clock time. The result is written in collapsed stack format, one line per
+stack with its frames separated by semicolons, as read by flamegraph.pl and
+speedscope. Profiling is started by a signal:
+
+    python -m pynullweb --profile-seconds 10
+    kill -USR1 <pid>
+
+Nothing is installed if profiling is not configured, so it costs nothing.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, List, Optional, Set  # NOQA, pylint: disable=unused-import
+
+
+DEFAULT_INTERVAL = 0.005
+
+
+def frame_name(frame):  # type: (Any) -> str
+    """Return the name of the function of a frame, with its module."""
+    return "%s.%s" % (
+        frame.f_globals.get("__name__", "?"), frame.f_code.co_name)
+
+
+def collapse(frame):  # type: (Any) -> str
+    """Return the stack of a frame, outermost frame first."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class StackSampler(object):
+    """Count the stacks of all threads."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):  # type: (float) -> None
+        """Initialize with the time between two samples, in seconds."""
+        self.interval = interval
+        self.samples = 0
+        self.stacks = {}  # type: Dict[str, int]
+        self.ignored = set()  # type: Set[int]
+
+    def sample(self, current=None):  # type: (Any) -> None
+        """Take one sample of the stacks of all threads.
+
+        The stack of the sampling thread is taken from the current frame. If
+        it is None, the sampling thread is skipped. Ignored threads are
+        always skipped.
+        """
+        own = threading.current_thread().ident
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        for ident, frame in frames.items():
+            if ident == own:
+                frame = current
+            if frame is not None and ident not in self.ignored:
+                stack = collapse(frame)
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def handle_signal(self, signum, frame):  # type: (int, Any) -> None
+        """Take a sample, when the profiling timer expires."""
+        # pylint: disable=unused-argument
+        self.sample(frame)
+
+    def run(self, seconds):  # type: (float) -> None
+        """Take samples in the current thread for the given time."""
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+
+    def lines(self):  # type: () -> List[str]
+        """Return the counted stacks in collapsed stack format."""
+        return [
+            "%s %d\n" % (stack, count)
+            for stack, count in sorted(self.stacks.items())]
+
+    def write(self, path):  # type: (str) -> None
+        """Write the counted stacks to a file."""
+        with open(path, "w") as profile_file:
+            profile_file.writelines(self.lines())
+
+
+def default_output():  # type: () -> str
+    """Return the name of the profile file of the current process."""
+    return os.path.join(
+        os.environ.get("TMPDIR", "/tmp"),
+        "pynullweb-%d-%d.folded" % (os.getpid(), int(time.time())))
+
+
+class ProfileTrigger(object):
+    """Start sampling, when the process receives a signal.
+
+    Only one profile is taken at a time, further signals are ignored until
+    it is written.
+    """
+
+    def __init__(self, seconds, output="", interval=DEFAULT_INTERVAL):
+        # type: (float, str, float) -> None
+        """Initialize with duration, output file name, and interval."""
+        self.seconds = seconds
+        self.output = output
+        self.interval = interval
+        self.thread = None  # type: Optional[threading.Thread]
+        self.last_output = None  # type: Optional[str]
+
+    @classmethod
+    def from_config(cls, config):
+        # type: (Dict[str, str]) -> Optional[ProfileTrigger]
+        """Return a trigger, or None if profiling is not configured."""
+        seconds = float(config.get("profile_seconds", "0"))
+        if seconds <= 0:
+            return None
+        return cls(seconds, config.get("profile_output", ""))
+
+    def write(self, sampler):  # type: (StackSampler) -> None
+        """Write the stacks of the sampler to the output file.
+
+        A "%d" in the output file name is replaced by the process id, so
+        that pre-forked workers write separate files.
+        """
+        output = self.output or default_output()
+        if "%d" in output:
+            output = output % (os.getpid(),)
+        sampler.write(output)
+        self.last_output = output
+
+    def profile_thread(self):  # type: () -> None
+        """Take a profile by sampling in this thread, and write it."""
+        sampler = StackSampler(self.interval)
+        sampler.run(self.seconds)
+        self.write(sampler)
+
+    def profile_timer(self, sampler):  # type: (StackSampler) -> None
+        """Stop the profiling timer after the duration, write the profile."""
+        sampler.ignored.add(threading.current_thread().ident)
+        time.sleep(self.seconds)
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        self.write(sampler)
+
+    def start(self, *_):  # type: (*Any) -> None
+        """Start profiling in the background, if not already running.
+
+        The profiling timer is used, if it is available and this method is
+        called by the main thread, e.g. as signal handler.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        target, args = self.profile_thread, ()  # type: Any, Any
+        if hasattr(signal, "setitimer"):
+            sampler = StackSampler(self.interval)
+            try:
+                signal.signal(signal.SIGPROF, sampler.handle_signal)
+            except ValueError:  # Not in main thread
+                pass
+            else:
+                signal.setitimer(
+                    signal.ITIMER_PROF, self.interval, self.interval)
+                target, args = self.profile_timer, (sampler,)
+        self.thread = threading.Thread(target=target, args=args)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def install(self, signum=signal.SIGUSR1):  # type: (int) -> bool
+        """Start profiling on a signal, return False if this is not possible.
+
+        Signal handlers can only be installed by the main thread.
+        """
+        try:
+            signal.signal(signum, self.start)
+        except ValueError:
+            return False
+        return True
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reload - replace the configuration of a running server.
+
+Everything that is compiled from the reloadable settings is bundled in an
+immutable snapshot. A background thread loads the configuration again on
+SIGHUP or when the configuration file changes, builds a new snapshot, and
+replaces the snapshot of the server by a single assignment. Request
+handlers take the snapshot once per request, so they need no lock and never
+see a mix of old and new settings. Open connections are not affected.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+from __future__ import print_function
+
+import collections
+import os
+import signal
+import sys
+import threading
+
+import pynullweb.blocklist
+import pynullweb.content
+import pynullweb.header
+import pynullweb.hosts
+import pynullweb.response
+import pynullweb.rules
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Callable, Dict, Optional, Tuple  # NOQA, pylint: disable=unused-import
+
+
+def load_payloads(path):  # type: (str) -> pynullweb.content.PayloadRegistry
+    """Return the built-in payloads, extended by the files of a directory."""
+    if not path:
+        return pynullweb.content.PAYLOADS
+    registry = pynullweb.content.default_payloads()
+    registry.load_directory(path)
+    return registry
+
+
+class Snapshot(collections.namedtuple("Snapshot", (
+        "localhosts", "redirect", "host_matcher", "blocklists", "responses",
+        "negotiator", "rules"))):
+    """Immutable bundle of the compiled, reloadable configuration.
+
+    Local hosts, redirect, blocklists, payloads, the negotiation settings and
+    the rules take effect on reload, all other settings need a restart.
+    Local host names are only used, if there is a redirect URL.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config, protocol_version):
+        # type: (Dict[str, str], str) -> Snapshot
+        """Compile the reloadable settings of the server configuration."""
+        redirect = config.get("redirect", "")
+        localhosts = pynullweb.hosts.cleanup_localhosts(
+            config.get("localhosts", "")) if redirect else ()
+        payloads = load_payloads(config.get("payloads", ""))
+        return cls(
+            localhosts, redirect, pynullweb.hosts.HostMatcher(localhosts),
+            pynullweb.blocklist.Blocklists.from_config(
+                config.get("blocklists", "")),
+            pynullweb.response.ResponseCache(protocol_version, payloads),
+            pynullweb.header.NegotiationCache(
+                payloads.content_types(),
+                int(config.get("negotiation_cache", "256")),
+                int(config.get("max_accept_length", "4096"))),
+            pynullweb.rules.RuleTable.from_config(
+                config.get("rules", ""), payloads.content_types()))
+
+
+class ConfigReloader(object):
+    """Reload the configuration on a signal, or when its file changes.
+
+    load returns the complete configuration, activate puts it into effect. If
+    one of them fails, the current configuration stays in effect.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, load, activate, path="", interval=1.0):
+        # type: (Callable[[], Any], Callable[[Any], None], str, float) -> None
+        """Initialize with the functions and the watched file."""
+        self.load = load
+        self.activate = activate
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.modified = self.file_state()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def file_state(self):  # type: () -> Optional[Tuple[float, int]]
+        """Return modification time and size of the watched file."""
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def reload(self):  # type: () -> bool
+        """Load and apply the configuration, return True on success."""
+        self.modified = self.file_state()
+        try:
+            self.activate(self.load())
+        except Exception as exc:  # pylint: disable=broad-except
+            self.failures += 1
+            print("Configuration not reloaded: %s" % (exc,), file=sys.stderr)
+            return False
+        self.reloads += 1
+        return True
+
+    def request(self, *_):  # type: (*Any) -> None
+        """Ask the background thread to reload, e.g. as signal handler."""
+        self._wake.set()
+
+    def run(self):  # type: () -> None
+        """Reload on request or file change, until stopped."""
+        while True:
+            self._wake.wait(self.interval)
+            if self._stopping:
+                break
+            requested = self._wake.is_set()
+            self._wake.clear()
+            if requested or self.file_state() != self.modified:
+                self.reload()
+
+    def start(self):  # type: () -> None
+        """Start the background thread.
+
+        After a fork, the child process must call this method again, because
+        threads are not inherited.
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):  # type: () -> None
+        """Stop the background thread."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def install(self, signum=signal.SIGHUP):  # type: (int) -> bool
+        """Reload on a signal, return False if this is not possible.
+
+        Signal handlers can only be installed by the main thread.
+        """
+        try:
+            signal.signal(signum, self.request)
+        except ValueError:
+            return False
+        return True
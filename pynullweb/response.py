@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Response - precomputed responses to be sent by the web server.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import time
+
+import pynullweb.content
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Dict, Optional, Set, Tuple, Union  # NOQA, pylint: disable=unused-import
+    ResponseKey = Tuple[Tuple[str, str], str, bool]
+    Body = Union[bytes, memoryview]
+
+
+STATUS_MESSAGES = {
+    200: "OK",
+    204: "No Content",
+    302: "Found",
+    304: "Not Modified",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    408: "Request Timeout",
+    410: "Gone",
+    431: "Request Header Fields Too Large",
+    501: "Not Implemented",
+    503: "Service Unavailable",
+}
+
+# Payloads up to this size are sent as part of the cached response
+INLINE_LIMIT = 8192
+
+CONNECTION_CLOSE = "Connection: close\r\n"
+
+CACHE_HEADERS = (
+    "Cache-control: public,max-age=86400\r\n"
+    "Expires: Wed, 01 Jan 2070 16:17:18 GMT\r\n")
+
+
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+MONTH_NAMES = (
+    "", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep",
+    "Oct", "Nov", "Dec")
+
+
+def http_date(seconds):  # type: (float) -> str
+    """Format seconds since the epoch as date for HTTP headers (RFC 7231)."""
+    now = time.gmtime(seconds)
+    return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (
+        WEEKDAY_NAMES[now.tm_wday], now.tm_mday, MONTH_NAMES[now.tm_mon],
+        now.tm_year, now.tm_hour, now.tm_min, now.tm_sec)
+
+
+def parse_http_date(value):  # type: (str) -> Optional[int]
+    """Return seconds since the epoch of an HTTP date, or None.
+
+    Only the preferred date format of RFC 7231 is accepted, the obsolete
+    formats are treated as invalid dates.
+    """
+    words = value.split()
+    if len(words) != 6 or words[5] != "GMT" or words[2] not in MONTH_NAMES:
+        return None
+    try:
+        hour, minute, second = [int(word) for word in words[4].split(":")]
+        fields = (
+            int(words[3]), MONTH_NAMES.index(words[2]), int(words[1]),
+            hour, minute, second)
+    except ValueError:
+        return None
+    import calendar
+    return calendar.timegm(fields)
+
+
+def to_bytes(content):  # type: (str) -> bytes
+    """Return content as a binary string."""
+    if isinstance(content, bytes):
+        return content
+    return content.encode("latin-1")
+
+
+class ResponseCache(object):
+    """Complete responses, including headers, for all content types.
+
+    The responses only depend on content type, request method, and the
+    current date. Everything except the date is built once. The responses
+    that include the date, including 304 Not Modified, are rebuilt at most
+    once per second. Payloads larger than INLINE_LIMIT are not copied into
+    the responses, they are returned separately as a memoryview.
+
+    Content responses carry the entity tag and the modification time of
+    their payload, so that conditional requests can be answered with 304
+    Not Modified, before the content type is negotiated.
+    """
+
+    def __init__(self, protocol_version="HTTP/1.0", payloads=None):
+        # type: (str, Optional[pynullweb.content.PayloadRegistry]) -> None
+        """Build the responses for all registered content types."""
+        self.protocol_version = protocol_version
+        self.payloads = pynullweb.content.PAYLOADS if payloads is None \
+            else payloads
+        self._prefixes = {}  # type: Dict[int, bytes]
+        self._parts = {}  # type: Dict[ResponseKey, Tuple[bytes, bytes, Body, int]]  # NOQA
+        self._responses = {}  # type: Dict[ResponseKey, bytes]
+        self._not_modified = {}  # type: Dict[Tuple[Optional[str], bool], bytes]  # NOQA
+        self._second = 0
+        self._date = b""
+        self.etags = set()  # type: Set[str]
+        self.last_modified = 0
+        for content_type in self.payloads.content_types():
+            validators = self.payloads.validators(content_type)
+            if validators is not None:
+                self.etags.add(validators[0])
+                self.last_modified = max(self.last_modified, validators[1])
+            for method in ("GET", "HEAD"):
+                for close in (False, True):
+                    self._parts[(content_type, method, close)] = \
+                        self.build_parts(content_type, method, close)
+        self._last_modified_date = http_date(self.last_modified)
+
+    def status_prefix(self, code):
+        # type: (int) -> bytes
+        """Return the status line and the headers up to the date value."""
+        prefix = self._prefixes.get(code)
+        if prefix is None:
+            prefix = self._prefixes[code] = to_bytes(
+                "%s %d %s\r\nServer: Apache\r\nDate: " % (
+                    self.protocol_version, code,
+                    STATUS_MESSAGES.get(code, "")))
+        return prefix
+
+    def build_parts(self, content_type, method, close=False):
+        # type: (Tuple[str, str], str, bool) -> Tuple[bytes, bytes, Body, int]
+        """Build the parts of a response.
+
+        These are the parts before and after the date value, the payload
+        that is sent separately, and the length of the content.
+        """
+        content = self.payloads.get(content_type)
+        if content is None:
+            content = memoryview(b"")
+        validators = self.payloads.validators(content_type)
+        suffix = to_bytes(
+            "\r\n%sContent-type: %s\r\nContent-length: %d\r\n%s%s\r\n" % (
+                CONNECTION_CLOSE if close else "", "/".join(content_type),
+                len(content), "" if validators is None else
+                "ETag: %s\r\nLast-modified: %s\r\n" % (
+                    validators[0], http_date(validators[1])),
+                CACHE_HEADERS))
+        body = b""  # type: Body
+        if method == "GET":
+            if len(content) <= INLINE_LIMIT:
+                suffix += content.tobytes()
+            else:
+                body = content
+        return self.status_prefix(200), suffix, body, len(content)
+
+    def date(self):
+        # type: () -> bytes
+        """Return the current date as a header value."""
+        now = int(time.time())
+        if now != self._second:
+            self._date = to_bytes(http_date(now))
+            self._responses = {}
+            self._not_modified = {}
+            self._second = now
+        return self._date
+
+    def content(self, content_type, method, close=False):
+        # type: (Tuple[str, str], str, bool) -> Tuple[bytes, Body, int]
+        """Return response with minimal content, its body, and content length.
+
+        The body is empty, if the content is part of the response. Otherwise
+        the body must be sent after the response. If close is True, the
+        response announces that the server closes the connection afterwards.
+        """
+        key = (content_type, method, close)
+        date = self.date()
+        parts = self._parts.get(key)
+        if parts is None:
+            parts = self._parts[key] = self.build_parts(
+                content_type, method, close)
+        response = self._responses.get(key)
+        if response is None:
+            response = self._responses[key] = parts[0] + date + parts[1]
+        return response, parts[2], parts[3]
+
+    def matching_etag(self, if_none_match):
+        # type: (str) -> Optional[str]
+        """Return the first entity tag of a payload in an If-None-Match value.
+
+        Weak entity tags match their strong counterparts. Return None, if no
+        entity tag matches.
+        """
+        if if_none_match in self.etags:  # Common case: a single strong tag
+            return if_none_match
+        for etag in if_none_match.split(","):
+            etag = etag.strip()
+            if etag.startswith("W/"):
+                etag = etag[2:]
+            if etag in self.etags:
+                return etag
+        return None
+
+    def not_modified(self, if_none_match, if_modified_since, close=False):
+        # type: (Optional[str], Optional[str], bool) -> Optional[bytes]
+        """Return response 304 Not Modified, if the validators allow it.
+
+        The client has a current copy, if it names the entity tag of any
+        payload or "*", since the negotiated content type of a request does
+        not change, or if its copy is not older than all payloads.
+        If-None-Match takes precedence over If-Modified-Since (RFC 7232).
+        Return None, if the full response must be sent.
+        """
+        etag = None
+        if if_none_match == "*":  # Any payload matches
+            pass
+        elif if_none_match is not None:
+            etag = self.matching_etag(if_none_match)
+            if etag is None:
+                return None
+        elif if_modified_since == self._last_modified_date:
+            pass  # Common case: the client echoes Last-modified
+        elif if_modified_since is not None:
+            since = parse_http_date(if_modified_since)
+            if since is None or since < self.last_modified:
+                return None
+        else:
+            return None
+        key = (etag, close)
+        date = self.date()
+        response = self._not_modified.get(key)
+        if response is None:
+            response = self._not_modified[key] = b"".join((
+                self.status_prefix(304), date,
+                b"\r\nConnection: close" if close else b"",
+                b"\r\n" if etag is None else
+                b"\r\nETag: " + to_bytes(etag) + b"\r\n",
+                to_bytes(CACHE_HEADERS), b"\r\n"))
+        return response
+
+    def redirect(self, location, close=False):
+        # type: (str, bool) -> bytes
+        """Return response that redirects to given location."""
+        return b"".join((
+            self.status_prefix(302), self.date(),
+            b"\r\nConnection: close" if close else b"",
+            b"\r\nLocation: ", to_bytes(location),
+            b"\r\nContent-length: 0\r\n\r\n"))
+
+    def status(self, code, close=False):
+        # type: (int, bool) -> bytes
+        """Return response without content for a status code."""
+        return b"".join((
+            self.status_prefix(code), self.date(),
+            b"\r\nConnection: close" if close else b"",
+            b"\r\n\r\n" if code == 204 else b"\r\nContent-length: 0\r\n\r\n"))
+
+    def document(self, mime_type, content, method="GET", close=False):
+        # type: (str, bytes, str, bool) -> bytes
+        """Return response with generated content, that must not be cached."""
+        return b"".join((
+            self.status_prefix(200), self.date(),
+            b"\r\nConnection: close" if close else b"",
+            b"\r\nContent-type: ", to_bytes(mime_type),
+            b"\r\nCache-control: no-store\r\nContent-length: ",
+            to_bytes(str(len(content))), b"\r\n\r\n",
+            content if method == "GET" else b""))
+
+    def error(self, code):
+        # type: (int) -> bytes
+        """Return response for a client error, the connection is closed."""
+        return b"".join((
+            self.status_prefix(code), self.date(),
+            b"\r\nConnection: close\r\nContent-length: 0\r\n\r\n"))
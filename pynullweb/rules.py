@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Rules - site-specific responses, compiled into a dispatch table.
+
+Every line of the setting "rules" is a rule. It matches requests by host
+domain, path prefix, file extension, and method, and names the response:
+
+    host=doubleclick.net path=/pagead/ status=204
+    host=tracker.example.org method=HEAD status=404
+    ext=js content=application/javascript header=Cache-control:no-store
+    host=news.example.com path=/paywall redirect=https://example.com/
+
+A host matches the domain and all its sub-domains, a path matches whole
+path segments. Omitted conditions match every request. The response is a
+status code without content, a redirect (302), or minimal content of a
+payload type, negotiated as usual if no type is given. Status codes must
+have a reason phrase in response.STATUS_MESSAGES, redirects are given by
+their target. Headers are added to the response; their values must not
+contain blanks. If several rules match, the first one wins.
+
+The rules are compiled into a trie of reversed host labels, whose nodes
+hold tries of path segments, whose nodes hold the rules in dicts by
+method and extension. A lookup visits one node per host label and path
+segment, independent of the number of rules.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import collections
+
+import pynullweb.hosts
+import pynullweb.response
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, Iterable, List, Optional, Set, Tuple  # NOQA, pylint: disable=unused-import
+
+
+CONDITIONS = ("host", "path", "ext", "method")
+ACTIONS = ("status", "redirect", "content")
+
+# Key of the rules of a node within the host and path tries. It cannot
+# collide with a label or a path segment, which are strings.
+RULES = None
+
+
+def path_segments(path):  # type: (str) -> List[str]
+    """Return the segments of a path, without query and empty trailer."""
+    path = path.partition("?")[0].partition("#")[0]
+    return path.strip("/").split("/") if path.strip("/") else []
+
+
+def path_extension(path):  # type: (str) -> str
+    """Return the extension of the last path segment, in lower case."""
+    name = path.partition("?")[0].partition("#")[0].rpartition("/")[2]
+    _, dot, extension = name.rpartition(".")
+    return extension.lower() if dot else ""
+
+
+class Rule(collections.namedtuple("Rule", (
+        "host", "path", "extension", "method", "status", "location",
+        "content_type", "headers"))):
+    """A rule, with its conditions and its response.
+
+    Conditions that are None match every request. Status is 302 for a
+    redirect to location, 200 for content, whose content type is None if
+    it is negotiated. Headers are given as they are inserted into the
+    response.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, line, content_types=None):
+        # type: (str, Optional[Set[Tuple[str, str]]]) -> Rule
+        """Parse a rule, raise ValueError if it is invalid.
+
+        Content types must be given to check payload types.
+        """
+        values = {}  # type: Dict[str, str]
+        headers = []  # type: List[str]
+        for word in line.split():
+            key, sep, value = word.partition("=")
+            if not sep or not value or \
+                    key not in CONDITIONS + ACTIONS + ("header",):
+                raise ValueError("Invalid rule %r: %r" % (line, word))
+            if key == "header":
+                name, sep, value = value.partition(":")
+                if not sep or not name:
+                    raise ValueError("Invalid header in rule %r" % (line,))
+                headers.append("%s: %s\r\n" % (name, value))
+            elif key in values:
+                raise ValueError("Repeated %r in rule %r" % (key, line))
+            else:
+                values[key] = value
+        actions = [key for key in ACTIONS if key in values]
+        if len(actions) > 1:
+            raise ValueError("Rule %r has several responses" % (line,))
+        status, location, content_type = 200, None, None
+        if "status" in values:
+            status = int(values["status"]) if values["status"].isdigit() \
+                else 0
+            if 300 <= status < 400:
+                raise ValueError(
+                    "Rule %r needs redirect= for a redirect" % (line,))
+            if status == 200 or \
+                    status not in pynullweb.response.STATUS_MESSAGES:
+                raise ValueError("Invalid status in rule %r" % (line,))
+        elif "redirect" in values:
+            status, location = 302, values["redirect"]
+        elif "content" in values:
+            content_type = tuple(values["content"].lower().split("/", 1))
+            if content_types is not None and \
+                    content_type not in content_types:
+                raise ValueError("Unknown payload type in rule %r" % (line,))
+        elif not headers:
+            raise ValueError("Rule %r has no response" % (line,))
+        host = values.get("host")
+        if host is not None:
+            host = pynullweb.hosts.normalize_host(host.lstrip("*."))
+        extension = values.get("ext")
+        return cls(
+            host or None, values.get("path"),
+            extension.lstrip(".").lower() if extension else None,
+            values["method"].upper() if "method" in values else None,
+            status, location, content_type,
+            "".join(headers).encode("latin-1"))
+
+    def response(self, responses, content_type, method, close=False):
+        # type: (pynullweb.response.ResponseCache, Optional[Tuple[str, str]], str, bool) -> Tuple[bytes, pynullweb.response.Body, int]  # NOQA
+        """Return response, its body, and content length, as for content.
+
+        The content type is used, if the rule does not name one.
+        """
+        body = b""  # type: pynullweb.response.Body
+        length = 0
+        if self.location is not None:
+            response = responses.redirect(self.location, close)
+        elif self.status != 200:
+            response = responses.status(self.status, close)
+        else:
+            response, body, length = responses.content(
+                self.content_type or content_type, method, close)
+        return self.add_headers(response), body, length
+
+    def add_headers(self, response):  # type: (bytes) -> bytes
+        """Return the response with the headers of the rule."""
+        if not self.headers:
+            return response
+        end = response.find(b"\r\n\r\n") + 2
+        return response[:end] + self.headers + response[end:]
+
+
+class RuleTable(object):
+    """Rules, compiled into nested tries for fast lookups."""
+
+    def __init__(self, rules=()):  # type: (Iterable[Rule]) -> None
+        """Compile the rules, in order of precedence."""
+        self.rules = list(rules)
+        self._hosts = {}  # type: Dict[Any, Any]
+        for number, rule in enumerate(self.rules):
+            node = self._hosts
+            if rule.host:
+                for label in reversed(rule.host.split(".")):
+                    node = node.setdefault(label, {})
+            node = node.setdefault(RULES, {})
+            for segment in path_segments(rule.path or ""):
+                node = node.setdefault(segment, {})
+            node.setdefault(RULES, {}).setdefault(
+                rule.method, {}).setdefault(rule.extension, number)
+
+    @classmethod
+    def from_config(cls, raw_rules, content_types=None):
+        # type: (str, Optional[Iterable[Tuple[str, str]]]) -> RuleTable
+        """Parse one rule per line, ignore empty lines and comments."""
+        if content_types is not None:
+            content_types = set(content_types)
+        return cls(
+            Rule.parse(line, content_types) for line in raw_rules.splitlines()
+            if line.strip() and not line.lstrip().startswith(("#", ";")))
+
+    def __len__(self):  # type: () -> int
+        """Return the number of rules."""
+        return len(self.rules)
+
+    def match(self, host, method, path):
+        # type: (Optional[str], str, str) -> Optional[Rule]
+        """Return the first rule that matches the request, or None."""
+        if not self.rules:
+            return None
+        tables = []
+        node = self._hosts
+        if RULES in node:
+            tables.append(node[RULES])
+        if host:
+            name = pynullweb.hosts.normalize_host(host)
+            for label in reversed(name.split(".")) if name else ():
+                node = node.get(label)
+                if node is None:
+                    break
+                if RULES in node:
+                    tables.append(node[RULES])
+        if not tables:
+            return None
+        methods = (method, None)
+        extension = path_extension(path)
+        extensions = (extension, None) if extension else (None,)
+        segments = path_segments(path) + [None]
+        best = len(self.rules)
+        for node in tables:
+            for segment in segments:
+                by_method = node.get(RULES)
+                if by_method is not None:
+                    for method_key in methods:
+                        by_extension = by_method.get(method_key)
+                        if by_extension is not None:
+                            for extension_key in extensions:
+                                number = by_extension.get(extension_key, best)
+                                if number < best:
+                                    best = number
+                if segment is None:
+                    break
+                node = node.get(segment)
+                if node is None:
+                    break
+        return self.rules[best] if best < len(self.rules) else None
@@ -10,33 +10,172 @@ Server - null web server object.
 
 from __future__ import print_function
 
-import BaseHTTPServer
+import errno
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
 
-from typing import Dict, List, Tuple  # NOQA, pylint: disable=unused-import
+try:
+    import BaseHTTPServer
+except ImportError:  # Python 3
+    import http.server as BaseHTTPServer  # type: ignore
+try:
+    import Queue
+except ImportError:  # Python 3
+    import queue as Queue  # type: ignore
 
+import pynullweb.accesslog
+import pynullweb.admission
+import pynullweb.handoff
+import pynullweb.listeners
+import pynullweb.metrics
+import pynullweb.profiler
+import pynullweb.reload
 
-def cleanup_localhosts(raw_hosts):
-    # type: (str) -> Tuple[str, ...]
-    """Transform comma-separated host names into tuple of strings."""
-    return tuple([name.strip() for name in raw_hosts.split(",")])
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Callable, Dict, List, Optional, Set, Tuple  # NOQA, pylint: disable=unused-import
+    import pynullweb.tls  # NOQA, pylint: disable=unused-import
+
+
+def default_workers(mode):
+    # type: (str) -> int
+    """Return the number of workers to use, if not configured otherwise."""
+    import multiprocessing
+    cpus = multiprocessing.cpu_count()
+    return cpus if mode == "prefork" else 4 * cpus
 
 
 class NullWebServer(BaseHTTPServer.HTTPServer):
-    """Web server with config data."""
+    """Web server with config data.
+
+    The server listens on all configured addresses. One loop accepts the
+    connections of all of them and of the TLS listener, and hands them to
+    process_request.
+
+    Connections are handled one after the other, so they are closed after
+    every response: an idle persistent connection would block all others
+    until its keep-alive timeout.
+    """
+
+    persistent_connections = False
 
     def __init__(self, server_address, request_handler, config):
         # type: (Tuple[str, int], type, Dict[str, Dict[str, str]]) -> None
         """Initialize the server data."""
+        self.protocol_version = request_handler.protocol_version
         self.setup_configuration(config)
+        self.addresses = pynullweb.listeners.from_config(
+            config["server"], server_address)
         BaseHTTPServer.HTTPServer.__init__(
             self, server_address, request_handler)
+        try:
+            self.sockets = [self.socket] + [
+                pynullweb.listeners.bind(
+                    family, address, self.request_queue_size,
+                    self._inherited)
+                for family, address in self.addresses[1:]]
+            if config["server"].get("tls_port"):
+                self.tls = self.listen_tls(
+                    config["server"], server_address[0],
+                    self.request_queue_size, self._inherited)
+        except Exception:
+            self.server_close()
+            raise
+        for listener in self._inherited:  # Address is no longer configured
+            listener.close()
+        self._inherited = []
+        if self._verbose > 0:
+            for listener in self.sockets[1:]:
+                print("- Listening   = %s" % (
+                    pynullweb.listeners.describe(listener),))
+            if self.tls is not None:
+                print("- TLS         = %s" % (
+                    pynullweb.listeners.describe(self.tls.socket),))
 
     def setup_configuration(self, config):
         # type: (Dict[str, Dict[str, str]]) -> None
         """Transform external configuration into internal representation."""
         self._verbose = int(config["server"]["verbose"])
-        self._localhosts = cleanup_localhosts(config["server"]["localhosts"])
-        self._redirect = config["server"]["redirect"]
+        self.reconfigure(config)
+        self.reloader = None  # type: Optional[pynullweb.reload.ConfigReloader]
+        self._mode = config["server"].get("mode", "single")
+        self._workers = int(config["server"].get("workers", "0")) or \
+            default_workers(self._mode)
+        self.access_log = pynullweb.accesslog.AccessLog.from_config(
+            config["server"])
+        self.keep_alive_timeout = float(
+            config["server"].get("keep_alive_timeout", "15"))
+        self.keep_alive_requests = int(
+            config["server"].get("keep_alive_requests", "100"))
+        self.metrics = pynullweb.metrics.create_metrics(self)
+        self.metrics_path = config["server"].get("metrics_path", "")
+        self.profiler = pynullweb.profiler.ProfileTrigger.from_config(
+            config["server"])
+        self.handoff = None  # type: Optional[pynullweb.handoff.Handoff]
+        self.drain_timeout = float(config["server"].get("drain_timeout", "10"))
+        self.draining = False
+        self._drain_deadline = 0.0
+        self.connections = set()  # type: Set[Any]
+        self.request_queue_size = int(config["server"].get("backlog", "128"))
+        self.header_timeout = float(
+            config["server"].get("header_timeout", "10"))
+        self.admission = pynullweb.admission.AdmissionControl.from_config(
+            config["server"])
+        self._stop_watching = threading.Event()
+        self._shutdown_request = False
+        self._is_shut_down = threading.Event()
+        self._is_shut_down.set()
+        self.sockets = []  # type: List[socket.socket]
+        self.tls = None  # type: Optional[pynullweb.tls.TlsListener]
+        self._inherited = []  # type: List[socket.socket]
+
+    def listen_tls(self, config, host, backlog, inherited):
+        # type: (Dict[str, str], str, int, List[socket.socket]) -> pynullweb.tls.TlsListener  # NOQA
+        """Create the TLS listener, TLS support is imported only if needed."""
+        import pynullweb.tls
+        listener = pynullweb.tls.TlsListener.from_config(
+            config, host, backlog, inherited)
+        pynullweb.metrics.register_tls(self.metrics, listener.contexts)
+        return listener
+
+    def reconfigure(self, config):
+        # type: (Dict[str, Dict[str, str]]) -> None
+        """Put the reloadable part of a configuration into effect.
+
+        Requests that are being handled keep the previous snapshot.
+        """
+        self.snapshot = pynullweb.reload.Snapshot.from_config(
+            config["server"], self.protocol_version)
+
+    def server_bind(self):
+        # type: () -> None
+        """Bind the socket to the first address.
+
+        If the previous server process handed over a listening socket on
+        the address, it is used instead.
+        """
+        self._inherited = pynullweb.handoff.inherited_sockets()
+        family, address = self.addresses[0]
+        self.socket.close()
+        self.socket = pynullweb.listeners.bind(
+            family, address, self.request_queue_size, self._inherited)
+        self.server_address = self.socket.getsockname()
+        if isinstance(self.server_address, tuple):
+            self.server_name = socket.getfqdn(self.server_address[0])
+            self.server_port = self.server_address[1]
+        else:  # Unix socket
+            self.server_name = "localhost"
+            self.server_port = 0
+
+    def get_request(self):
+        # type: () -> Tuple[socket.socket, Tuple[str, int]]
+        """Accept a connection of the first address."""
+        return pynullweb.listeners.accept(self.socket)
 
     def server_activate(self):
         # type: () -> None
@@ -44,18 +183,482 @@ class NullWebServer(BaseHTTPServer.HTTPServer):
         BaseHTTPServer.HTTPServer.server_activate(self)
         if self._verbose > 0:
             print("Server listening on port %d" % (self.server_port,))
+            print("- Mode        = %s (%d workers)" % (
+                self._mode, self.workers))
             print("- Local hosts = %s" % (self.localhosts,))
             print("- Redirect    = %s" % (self.redirect,))
+            if self.profiler is not None:
+                print("- Profiling   = %gs on SIGUSR1" % (
+                    self.profiler.seconds,))
+
+    def serve_forever(self, poll_interval=0.5):
+        # type: (float) -> None
+        """Handle requests until shutdown, write the access log meanwhile."""
+        self.access_log.start()
+        if self.profiler is not None:
+            self.profiler.install()
+        if self.reloader is not None:
+            self.reloader.install()
+            self.reloader.start()
+        if self.handoff is not None:
+            self.handoff.install(self.restart)
+        pynullweb.handoff.notify_ready()
+        watcher = None
+        if self.header_timeout > 0:
+            self._stop_watching.clear()
+            watcher = threading.Thread(target=self.watch_connections)
+            watcher.daemon = True
+            watcher.start()
+        try:
+            self.serve_listeners(poll_interval)
+            if self.draining:
+                self.drain(lambda: not self.connections)
+        finally:
+            if watcher is not None:
+                self._stop_watching.set()
+                watcher.join()
+            if self.reloader is not None:
+                self.reloader.stop()
+            self.access_log.stop()
+
+    def serve_listeners(self, poll_interval):
+        # type: (float) -> None
+        """Accept connections of all listeners, until shutdown.
+
+        TLS connections are processed like plain connections, the handshake
+        is done by the handler. Shed TLS connections get no response. A
+        shutdown that is requested before is not lost.
+        """
+        listeners = self.listeners
+        tls_socket = self.tls.socket if self.tls is not None else None
+        for listener in listeners:
+            listener.setblocking(False)
+        self._is_shut_down.clear()
+        try:
+            while not self._shutdown_request:
+                try:
+                    readable, _, _ = select.select(
+                        listeners, [], [], poll_interval)
+                except (OSError, select.error) as exc:  # Python 2
+                    if exc.args[0] != errno.EINTR:
+                        raise
+                    continue
+                for listener in readable:
+                    self.accept_request(listener, listener is tls_socket)
+        finally:
+            self._shutdown_request = False
+            self._is_shut_down.set()
+
+    def shutdown(self):
+        # type: () -> None
+        """Stop serve_forever from accepting, wait until it does."""
+        self._shutdown_request = True
+        self._is_shut_down.wait()
+
+    def accept_request(self, listener, tls):
+        # type: (socket.socket, bool) -> None
+        """Accept a connection of a listener and process it."""
+        try:
+            request, client_address = pynullweb.listeners.accept(listener)
+        except socket.error:  # Accepted by another worker process
+            return
+        request.setblocking(True)
+        if tls:
+            admitted = self.admission.open()
+            if not admitted:
+                self.metrics.count("shed", "connections")
+        else:
+            admitted = self.verify_request(request, client_address)
+        if not admitted:
+            self.shutdown_request(request)
+            return
+        try:
+            if tls:
+                request = self.tls.wrap(request)  # type: ignore
+            self.process_request(request, client_address)
+        except Exception:  # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def verify_request(self, request, client_address):
+        # type: (Any, Any) -> bool
+        """Admit a new connection, or shed it with a canned response."""
+        if self.admission.open():
+            return True
+        self.shed(request, "connections")
+        return False
+
+    def shed(self, request, reason):
+        # type: (socket.socket, str) -> None
+        """Count a shed connection, answer it with 503 Service Unavailable.
+
+        The connection is closed by the caller. Received data is discarded
+        before, so that closing does not reset the connection.
+        """
+        self.metrics.count("shed", reason)
+        try:
+            request.send(self.snapshot.responses.error(503))
+            request.setblocking(False)
+            while request.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def shutdown_request(self, request):
+        # type: (Any) -> None
+        """Close a connection, admitted or not.
+
+        TLS connections announce the close, without waiting for the client.
+        """
+        self.admission.close()
+        if hasattr(request, "unwrap"):
+            try:
+                request.setblocking(False)
+                request.unwrap()
+            except (socket.error, ValueError):
+                pass
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def watch_connections(self):
+        # type: () -> None
+        """Close connections that send their request head too slowly.
+
+        A request head must be complete within the header timeout. If the
+        connection is idle, the keep-alive timeout is added.
+        """
+        interval = min(self.header_timeout, 1.0)
+        while not self._stop_watching.wait(interval):
+            now = time.time()
+            for handler in list(self.connections):
+                if 0 < handler.head_deadline < now:
+                    handler.head_deadline = -1.0  # Timed out
+                    self.metrics.count("shed", "header_timeout")
+                    try:
+                        handler.connection.shutdown(socket.SHUT_RDWR)
+                    except socket.error:
+                        pass
+
+    def requests_waiting(self):
+        # type: () -> bool
+        """Return True, if connections wait to be handled."""
+        return False
+
+    def close_idle_connections(self, kept_alive=False):
+        # type: (bool) -> None
+        """Close connections that wait for another request.
+
+        If kept_alive is True, connections that wait for their first request
+        are left open.
+        """
+        for handler in list(self.connections):
+            if handler.idle and not (kept_alive and (
+                    handler.requests_left == self.keep_alive_requests)):
+                try:
+                    handler.connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+    def drain(self, finished):
+        # type: (Callable[[], bool]) -> None
+        """Close the open connections, as soon as they become idle.
+
+        Connections are closed after their current request, until finished
+        returns True. After the drain deadline, all are closed.
+        """
+        while not finished() and time.time() < self._drain_deadline:
+            self.close_idle_connections()
+            time.sleep(0.05)
+        for handler in list(self.connections):
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def shutdown_gracefully(self):
+        # type: () -> None
+        """Stop accepting connections and finish the open ones.
+
+        Return when serve_forever stops accepting; it returns after the
+        remaining connections are drained.
+        """
+        self.draining = True
+        self._drain_deadline = time.time() + self.drain_timeout
+        stopper = threading.Thread(
+            target=NullWebServer.shutdown, args=(self,))
+        stopper.daemon = True
+        stopper.start()
+        self.drain(lambda: not stopper.is_alive())
+        stopper.join()
+
+    def hand_over(self):
+        # type: () -> None
+        """Start the successor process, then stop gracefully."""
+        if self.handoff is not None and self.handoff.spawn(*self.listeners):
+            self.shutdown_gracefully()
+        else:
+            print("Restart failed: new server did not start", file=sys.stderr)
+
+    def restart(self):
+        # type: () -> None
+        """Hand over to a successor process in the background."""
+        thread = threading.Thread(target=self.hand_over)
+        thread.daemon = True
+        thread.start()
+
+    def server_close(self):
+        # type: () -> None
+        """Clean up the server, close the access log."""
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for listener in self.sockets[1:]:
+            listener.close()
+        if self.tls is not None:
+            self.tls.close()
+        self.access_log.close()
 
     @property
     def redirect(self):
         # type: () -> str
         """Return URL prefix for local redirection."""
-        return self._redirect
+        return self.snapshot.redirect
 
     @property
     def localhosts(self):
         # type: () -> Tuple[str, ...]
         """Return tuple of local host names."""
-        default = ()  # type: Tuple[str, ...]
-        return self._localhosts if self._redirect else default
+        return self.snapshot.localhosts
+
+    @property
+    def workers(self):
+        # type: () -> int
+        """Return the number of threads / processes that serve requests."""
+        return 1 if self._mode == "single" else self._workers
+
+    @property
+    def listeners(self):
+        # type: () -> List[socket.socket]
+        """Return the listening sockets, the TLS listener last."""
+        if self.tls is None:
+            return list(self.sockets)
+        return self.sockets + [self.tls.socket]
+
+
+class ThreadPoolNullWebServer(NullWebServer):
+    """Null web server that handles requests by a bounded pool of threads.
+
+    In contrast to SocketServer.ThreadingMixIn, the number of threads does not
+    grow with the number of concurrent requests. Pending requests are queued
+    until a thread becomes available. Connections are kept alive, but a
+    connection that waits for a thread lets the idle ones be closed.
+    """
+
+    daemon_threads = True
+    persistent_connections = True
+
+    def start_pool(self):
+        # type: () -> None
+        """Start the worker threads."""
+        self._requests = Queue.Queue()  # type: Queue.Queue
+        self._pool = []  # type: List[threading.Thread]
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.process_request_worker)
+            thread.daemon = self.daemon_threads
+            thread.start()
+            self._pool.append(thread)
+
+    def process_request_worker(self):
+        # type: () -> None
+        """Handle queued requests until server is closed."""
+        while True:
+            item = self._requests.get()
+            if item is None:
+                break
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:  # pylint: disable=broad-except
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        # type: (socket.socket, Tuple[str, int]) -> None
+        """Queue the request to be handled by a worker thread.
+
+        If all threads are busy, connections that are idle after a response
+        are closed, so that their threads serve the new connection.
+        """
+        self._requests.put((request, client_address))
+        if self.requests_waiting():
+            self.close_idle_connections(kept_alive=True)
+
+    def requests_waiting(self):
+        # type: () -> bool
+        """Return True, if connections wait for a thread."""
+        return not self._requests.empty()
+
+    def serve_forever(self, poll_interval=0.5):
+        # type: (float) -> None
+        """Start the thread pool and handle requests until shutdown."""
+        self.start_pool()
+        try:
+            NullWebServer.serve_forever(self, poll_interval)
+        finally:
+            for _ in self._pool:
+                self._requests.put(None)
+            if self.draining:  # Let the threads end before the process
+                for thread in self._pool:
+                    thread.join(1.0)
+
+
+# Workers that exit earlier after their start are forked again with delay
+WORKER_MIN_LIFETIME = 1.0
+WORKER_MAX_BACKOFF = 10.0
+
+
+def worker_backoff(previous, lifetime):
+    # type: (float, float) -> float
+    """Return the delay before forking a worker that exited after lifetime.
+
+    The delay doubles with every worker that fails at its start, up to
+    WORKER_MAX_BACKOFF seconds. It is reset by a worker that ran longer.
+    """
+    if lifetime >= WORKER_MIN_LIFETIME:
+        return 0.0
+    return min(WORKER_MAX_BACKOFF, max(0.1, 2 * previous))
+
+
+class PreForkNullWebServer(NullWebServer):
+    """Null web server that forks processes sharing the listening socket.
+
+    The parent process only supervises the workers: if a worker terminates
+    unexpectedly, a new one is forked. Workers inherit the bound socket, so
+    no other process can bind the port. Workers that fail at their start
+    are forked again with increasing delay.
+    """
+
+    def __init__(self, server_address, request_handler, config):
+        # type: (Tuple[str, int], type, Dict[str, Dict[str, str]]) -> None
+        """Initialize the server data."""
+        NullWebServer.__init__(self, server_address, request_handler, config)
+        self._children = {}  # type: Dict[int, float]
+        self._stopping = False
+
+    def fork_worker(self, poll_interval):
+        # type: (float) -> None
+        """Fork a new worker process that serves requests."""
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.time()
+            return
+        status = 0
+        self._children = {}
+        self.handoff = None
+        try:
+            signal.signal(signal.SIGTERM, self.terminate_worker)
+            signal.signal(signal.SIGUSR2, self.stop_worker)
+            NullWebServer.serve_forever(self, poll_interval)
+        except KeyboardInterrupt:
+            pass
+        except Exception:  # pylint: disable=broad-except
+            import traceback
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+    def stop_worker(self, *_):
+        # type: (*object) -> None
+        """Let the worker process finish its connections and exit."""
+        thread = threading.Thread(
+            target=NullWebServer.shutdown_gracefully, args=(self,))
+        thread.daemon = True
+        thread.start()
+
+    def terminate_worker(self, *_):
+        # type: (*object) -> None
+        """Write the rest of the access log and exit the worker process."""
+        self.access_log.stop()
+        os._exit(0)  # pylint: disable=protected-access
+
+    def serve_forever(self, poll_interval=0.5):
+        # type: (float) -> None
+        """Fork the workers and wait for them until shutdown.
+
+        A shutdown that is requested before is not lost: the workers are
+        stopped as soon as they are forked.
+        """
+        try:
+            signal.signal(signal.SIGTERM, lambda *_: self.shutdown())
+            signal.signal(signal.SIGHUP, self.reload_workers)
+        except ValueError:  # Not in main thread
+            pass
+        if self.handoff is not None:
+            self.handoff.install(self.restart)
+        pynullweb.handoff.notify_ready()
+        for _ in range(self.workers):
+            self.fork_worker(poll_interval)
+        if self._stopping:
+            self.shutdown()
+        backoff = 0.0
+        try:
+            while self._children:
+                try:
+                    pid, _ = os.wait()
+                except OSError as exc:
+                    if exc.errno == errno.EINTR:
+                        continue
+                    break
+                started = self._children.pop(pid, None)
+                if started is None:
+                    continue
+                backoff = worker_backoff(backoff, time.time() - started)
+                deadline = time.time() + backoff
+                while not self._stopping and time.time() < deadline:
+                    time.sleep(min(0.1, backoff))
+                if not self._stopping:
+                    self.fork_worker(poll_interval)
+        finally:
+            self.shutdown()
+            self._stopping = False
+
+    def reload_workers(self, *_):
+        # type: (*object) -> None
+        """Reload the configuration of the supervisor and all workers.
+
+        Workers that are forked later on start with the new configuration.
+        """
+        if self.reloader is None:
+            return
+        self.reloader.reload()
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except OSError:
+                pass
+
+    def shutdown_gracefully(self):
+        # type: () -> None
+        """Let all worker processes finish their connections and exit."""
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGUSR2)
+            except OSError:
+                self._children.pop(pid, None)
+
+    def shutdown(self):
+        # type: () -> None
+        """Stop all worker processes."""
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                self._children.pop(pid, None)
+
+
+SERVER_MODES = {
+    "single": NullWebServer,
+    "thread": ThreadPoolNullWebServer,
+    "prefork": PreForkNullWebServer,
+}
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TLS - answer HTTPS requests for blocked hosts with minimal content.
+
+Browsers that are sent to the null web server for a blocked HTTPS host wait
+for a TLS handshake. Without one, they spend a connect timeout per host. A
+local certificate authority mints a certificate for each requested server
+name (SNI) on demand, using the openssl command line tool. Certificates are
+stored in the directory of the authority, so they survive restarts. Clients
+that trust the authority complete the handshake and receive minimal content.
+
+SSL contexts are kept per server name in a bounded LRU cache. Session
+tickets are enabled, so that repeated handshakes of a client are cheap.
+Concurrent handshakes for a new name wait for the same certificate. Servers
+that must not block, e.g. an event loop, mint it in a background thread and
+send the default certificate meanwhile. The names waiting to be minted are
+limited, further ones are dropped. The least recently minted certificates
+are removed, if there are too many of them.
+
+The authority has no name constraints: a client that trusts it accepts its
+certificates for any host. Its key must be kept private, and its
+certificate should only be trusted by the devices that use the server.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import collections
+import os
+import re
+import ssl
+import threading
+import time
+
+try:
+    import Queue
+except ImportError:  # Python 3
+    import queue as Queue  # type: ignore
+
+import pynullweb.listeners
+
+MYPY = False
+if MYPY:  # pragma: no cover
+    from typing import Any, Dict, List, Optional, Set, Tuple  # NOQA, pylint: disable=unused-import
+    import socket  # NOQA, pylint: disable=unused-import
+
+
+# Certificate subject of clients that send no server name
+DEFAULT_NAME = "pynullweb"
+
+# Leaf certificates are minted again after this time, browsers reject
+# certificates that are valid for more than 398 days
+CERTIFICATE_DAYS = 397
+RENEW_SECONDS = 360 * 24 * 3600
+
+# Server names waiting to be minted in the background, more are dropped
+MINT_QUEUE_SIZE = 64
+
+VALID_NAME = re.compile(r"^[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?(\.[a-z0-9_]([a-z0-9_-]*[a-z0-9_])?)*$")  # NOQA
+
+LEAF_EXTENSIONS = """\
+subjectAltName=DNS:%s
+basicConstraints=critical,CA:FALSE
+keyUsage=critical,digitalSignature
+extendedKeyUsage=serverAuth
+subjectKeyIdentifier=hash
+authorityKeyIdentifier=keyid
+"""
+
+
+def valid_name(name):  # type: (Optional[str]) -> Optional[str]
+    """Return the server name in lower case, or None if it is not valid."""
+    if not name or len(name) > 253:
+        return None
+    name = name.lower().rstrip(".")
+    return name if VALID_NAME.match(name) else None
+
+
+class CertificateAuthority(object):
+    """Local certificate authority that mints certificates per server name.
+
+    Key and certificate of the authority are created on first use. All
+    leaf certificates share one key, so that minting only needs to sign.
+    Above the maximum number of certificates, the oldest ones are removed.
+    """
+
+    def __init__(self, directory, openssl="openssl", max_certificates=4096):
+        # type: (str, str, int) -> None
+        """Initialize with the directory of keys and certificates."""
+        self.directory = directory
+        self.openssl = openssl
+        self.max_certificates = max_certificates
+        self.ca_cert = os.path.join(directory, "ca.crt")
+        self.ca_key = os.path.join(directory, "ca.key")
+        self.leaf_key = os.path.join(directory, "leaf.key")
+        self.certs = os.path.join(directory, "certs")
+        self.minted = 0
+        self._lock = threading.Lock()
+
+    def run(self, arguments, data=None):
+        # type: (List[str], Optional[bytes]) -> bytes
+        """Run the openssl tool, return its output."""
+        import subprocess
+        process = subprocess.Popen(
+            [self.openssl] + arguments, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate(data)
+        if process.returncode:
+            raise RuntimeError("openssl %s failed: %s" % (
+                arguments[0], errors.decode("utf-8", "replace").strip()))
+        return output
+
+    def setup(self):  # type: () -> None
+        """Create the keys and the certificate of the authority, if needed."""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+                os.chmod(self.directory, 0o700)
+            if not os.path.isdir(self.certs):
+                os.mkdir(self.certs, 0o700)
+            if not os.path.exists(self.ca_key):
+                self.run([
+                    "req", "-x509", "-new", "-nodes", "-newkey", "ec",
+                    "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                    "-keyout", self.ca_key, "-out", self.ca_cert,
+                    "-days", "3650", "-subj", "/CN=pynullweb local CA",
+                    "-addext", "basicConstraints=critical,CA:TRUE",
+                    "-addext", "keyUsage=critical,keyCertSign,cRLSign",
+                    "-addext", "subjectKeyIdentifier=hash"])
+                os.chmod(self.ca_key, 0o600)
+            if not os.path.exists(self.leaf_key):
+                self.run([
+                    "genpkey", "-algorithm", "EC", "-pkeyopt",
+                    "ec_paramgen_curve:prime256v1", "-out", self.leaf_key])
+                os.chmod(self.leaf_key, 0o600)
+
+    def current(self, name):  # type: (str) -> Optional[str]
+        """Return the file of the certificate, if it needs no minting."""
+        path = os.path.join(self.certs, name + ".crt")
+        try:
+            if os.stat(path).st_mtime > time.time() - RENEW_SECONDS:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def certificate(self, name):  # type: (str) -> str
+        """Return the file of the certificate for a valid server name.
+
+        The certificate is minted, if it does not exist or is due for
+        renewal.
+        """
+        current = self.current(name)
+        if current is not None:
+            return current
+        path = os.path.join(self.certs, name + ".crt")
+        request = self.run(
+            ["req", "-new", "-key", self.leaf_key, "-subj", "/CN=" + name])
+        extensions = path + ".ext"
+        with open(extensions, "w") as extensions_file:
+            extensions_file.write(LEAF_EXTENSIONS % (name,))
+        try:
+            certificate = self.run([
+                "x509", "-req", "-CA", self.ca_cert, "-CAkey", self.ca_key,
+                "-set_serial", "0x" + "".join(
+                    "%02x" % (byte,) for byte in bytearray(os.urandom(16))),
+                "-days", str(CERTIFICATE_DAYS), "-extfile", extensions],
+                request)
+        finally:
+            os.remove(extensions)
+        temporary = "%s.%d.%d" % (
+            path, os.getpid(), threading.current_thread().ident)
+        with open(temporary, "wb") as certificate_file:
+            certificate_file.write(certificate)
+        os.rename(temporary, path)
+        self.minted += 1
+        self.prune()
+        return path
+
+    def prune(self):  # type: () -> None
+        """Remove the oldest certificates, if there are too many.
+
+        A tenth more are removed, so that pruning is not done per minting.
+        The default certificate is kept.
+        """
+        names = [
+            name for name in os.listdir(self.certs)
+            if name.endswith(".crt") and name != DEFAULT_NAME + ".crt"]
+        if len(names) <= self.max_certificates:
+            return
+        dated = []
+        for name in names:
+            path = os.path.join(self.certs, name)
+            try:
+                dated.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        dated.sort()
+        keep = self.max_certificates - self.max_certificates // 10
+        for _, path in dated[:max(0, len(dated) - keep)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def create_context(certificate, key):
+    # type: (str, str) -> ssl.SSLContext
+    """Create a server context with a certificate and session tickets."""
+    context = ssl.SSLContext(
+        getattr(ssl, "PROTOCOL_TLS_SERVER", ssl.PROTOCOL_SSLv23))
+    context.options |= getattr(ssl, "OP_NO_SSLv2", 0) | \
+        getattr(ssl, "OP_NO_SSLv3", 0)
+    context.options &= ~getattr(ssl, "OP_NO_TICKET", 0)
+    context.load_cert_chain(certificate, key)
+    return context
+
+
+class ContextCache(object):
+    """SSL contexts per server name, least recently used ones are dropped.
+
+    The default context is used for clients without server name. It selects
+    the context of the server name during the handshake. If no certificate
+    can be minted, the default certificate is sent. If wait is False, the
+    handshake does not wait for a certificate to be minted, but gets the
+    default certificate, too.
+    """
+
+    def __init__(self, authority, size=256, wait=True):
+        # type: (CertificateAuthority, int, bool) -> None
+        """Initialize with the authority and the maximum number of contexts."""
+        self.authority = authority
+        self.size = size
+        self.wait = wait
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.dropped = 0
+        self._contexts = collections.OrderedDict()  # type: Dict[str, ssl.SSLContext]  # NOQA
+        self._minting = {}  # type: Dict[str, threading.Event]
+        self._pending = Queue.Queue(MINT_QUEUE_SIZE)  # type: Queue.Queue
+        self._queued = set()  # type: Set[str]
+        self._minter = None  # type: Optional[threading.Thread]
+        self._lock = threading.Lock()
+        authority.setup()
+        self.default = create_context(
+            authority.certificate(DEFAULT_NAME), authority.leaf_key)
+        if hasattr(self.default, "sni_callback"):
+            self.default.sni_callback = self.select
+        else:  # Python 2, Python 3 before 3.7
+            self.default.set_servername_callback(self.select)
+
+    def get(self, name):  # type: (str) -> ssl.SSLContext
+        """Return the context of a valid server name.
+
+        If the context is being created by another thread, wait for it.
+        """
+        with self._lock:
+            context = self._contexts.pop(name, None)
+            if context is not None:
+                self._contexts[name] = context
+                self.hits += 1
+                return context
+            self.misses += 1
+            minting = self._minting.get(name)
+            creating = minting is None
+            if creating:
+                minting = self._minting[name] = threading.Event()
+        if not creating:
+            minting.wait()
+            with self._lock:
+                context = self._contexts.get(name)
+            if context is None:
+                raise RuntimeError("No certificate for %s" % (name,))
+            return context
+        try:
+            context = create_context(
+                self.authority.certificate(name), self.authority.leaf_key)
+            with self._lock:
+                self._contexts[name] = context
+                while len(self._contexts) > self.size:
+                    self._contexts.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._minting[name]
+            minting.set()
+        return context
+
+    def mint(self, name):  # type: (str) -> None
+        """Create the context of a server name in the background.
+
+        The name is dropped, if too many names wait to be minted.
+        """
+        with self._lock:
+            if name in self._minting or name in self._queued:
+                return
+            try:
+                self._pending.put_nowait(name)
+            except Queue.Full:
+                self.dropped += 1
+                return
+            self._queued.add(name)
+            if self._minter is None:
+                self._minter = threading.Thread(target=self.mint_pending)
+                self._minter.daemon = True
+                self._minter.start()
+
+    def mint_pending(self):  # type: () -> None
+        """Create the contexts of the waiting server names, one by one."""
+        while True:
+            name = self._pending.get()
+            self.select_name(name)
+            with self._lock:
+                self._queued.discard(name)
+
+    def select_name(self, name):  # type: (str) -> Optional[ssl.SSLContext]
+        """Return the context of a valid server name, None on failures."""
+        try:
+            return self.get(name)
+        except (RuntimeError, EnvironmentError, ssl.SSLError):
+            self.failures += 1
+            return None
+
+    def select(self, ssl_object, server_name, _context):
+        # type: (Any, Optional[str], ssl.SSLContext) -> None
+        """Select the context of the server name, as SNI callback.
+
+        Without waiting, the context is selected only if its certificate
+        needs no minting, otherwise it is minted in the background.
+        """
+        name = valid_name(server_name)
+        if name is None:
+            return
+        if not self.wait and name not in self._contexts and \
+                self.authority.current(name) is None:
+            self.mint(name)
+            return
+        context = self.select_name(name)
+        if context is not None:
+            ssl_object.context = context
+
+    def __len__(self):  # type: () -> int
+        """Return the number of cached contexts."""
+        return len(self._contexts)
+
+
+class TlsListener(object):
+    """Listening socket, whose connections are secured by TLS."""
+
+    def __init__(self, listener, contexts):
+        # type: (socket.socket, ContextCache) -> None
+        """Initialize with the listening socket and the contexts."""
+        self.socket = listener
+        self.contexts = contexts
+
+    @classmethod
+    def from_config(cls, config, host, backlog, inherited=(), wait=True):
+        # type: (Dict[str, str], str, int, List[socket.socket], bool) -> TlsListener  # NOQA
+        """Create the TLS listener of the server configuration.
+
+        The TLS port may be a listen address; a port alone listens on the
+        default host. If the previous server process handed over a socket
+        on the address, it is used. If wait is False, handshakes do not
+        wait for certificates to be minted.
+        """
+        contexts = ContextCache(
+            CertificateAuthority(
+                os.path.expanduser(
+                    config.get("tls_dir", "") or "~/.pynullweb/tls"),
+                max_certificates=int(config.get("tls_certificates", "4096"))),
+            int(config.get("tls_contexts", "256")), wait)
+        family, address = pynullweb.listeners.parse_address(
+            config["tls_port"], host)
+        return cls(pynullweb.listeners.bind(
+            family, address, backlog, inherited), contexts)
+
+    @property
+    def context(self):  # type: () -> ssl.SSLContext
+        """Return the context that starts every handshake."""
+        return self.contexts.default
+
+    @property
+    def port(self):  # type: () -> int
+        """Return the port number of the listening socket."""
+        return self.socket.getsockname()[1]
+
+    def wrap(self, connection):  # type: (socket.socket) -> ssl.SSLSocket
+        """Wrap an accepted connection, the handshake is done later."""
+        return self.context.wrap_socket(
+            connection, server_side=True, do_handshake_on_connect=False)
+
+    def close(self):  # type: () -> None
+        """Close the listening socket."""
+        self.socket.close()
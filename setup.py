@@ -42,5 +42,6 @@ if __name__ == "__main__":
             "Environment :: Web Environment",
             "License :: OSI Approved :: Apache Software License",
             "Programming Language :: Python :: 2.7",
+            "Programming Language :: Python :: 3",
         ],
     )
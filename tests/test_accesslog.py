@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test accesslog module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pynullweb.accesslog
+
+
+class ListSink(object):
+    """Sink that collects all written lines."""
+
+    def __init__(self):
+        """Initialize the list of lines."""
+        self.lines = []
+        self.closed = False
+
+    def write(self, lines):
+        """Collect the lines."""
+        self.lines.extend(lines)
+
+    def close(self):
+        """Mark the sink as closed."""
+        self.closed = True
+
+
+class FormatRecordTestCase(unittest.TestCase):
+    """Test function accesslog.format_record."""
+
+    def test_request(self):
+        """Requests are formatted in common log format."""
+        self.assertEqual(
+            '10.0.0.1 ads.example.com - [date] "GET /a.gif HTTP/1.1" 200 43\n',
+            pynullweb.accesslog.format_record(
+                (0, "10.0.0.1", "ads.example.com", b"GET", "/a.gif",
+                 b"HTTP/1.1", 200, "43"), "date"))
+
+    def test_message(self):
+        """Records without method contain a message."""
+        self.assertEqual(
+            "10.0.0.1 - - [date] code 400\n",
+            pynullweb.accesslog.format_record(
+                (0, "10.0.0.1", "-", None, "code 400", None, None, None),
+                "date"))
+
+
+class AccessLogTestCase(unittest.TestCase):
+    """Test class accesslog.AccessLog."""
+
+    def test_flush(self):
+        """Queued records are written by flush, in order."""
+        sink = ListSink()
+        access_log = pynullweb.accesslog.AccessLog(sink)
+        access_log.log("1.2.3.4", "a.example.com", "GET", "/", "HTTP/1.0", 200)
+        access_log.message("1.2.3.4", "-", "error")
+        self.assertEqual([], sink.lines)
+        access_log.flush()
+        self.assertEqual(2, len(sink.lines))
+        self.assertIn('"GET / HTTP/1.0" 200 -', sink.lines[0])
+        self.assertTrue(sink.lines[1].endswith("] error\n"))
+        self.assertEqual(2, access_log.stats()["written"])
+
+    def test_sample(self):
+        """Only every n-th request is logged, messages always."""
+        sink = ListSink()
+        access_log = pynullweb.accesslog.AccessLog(sink, sample=3)
+        for i in range(9):
+            access_log.log("-", "-", "GET", "/%d" % i, "HTTP/1.0", 200)
+        access_log.message("-", "-", "error")
+        access_log.flush()
+        self.assertEqual(4, len(sink.lines))
+        self.assertIn("/2 ", sink.lines[0])
+        self.assertEqual(6, access_log.stats()["sampled"])
+
+    def test_drop(self):
+        """Records are dropped and counted, if the queue is full."""
+        sink = ListSink()
+        access_log = pynullweb.accesslog.AccessLog(sink, capacity=2)
+        for i in range(5):
+            access_log.log("-", "-", "GET", "/%d" % i, "HTTP/1.0", 200)
+        self.assertEqual(3, access_log.stats()["dropped"])
+        access_log.flush()
+        self.assertEqual(3, len(sink.lines))
+        self.assertTrue(sink.lines[2].endswith("dropped 3 records\n"))
+        access_log.flush()
+        self.assertEqual(3, len(sink.lines))
+
+    def test_disabled(self):
+        """Without sink, nothing is queued."""
+        access_log = pynullweb.accesslog.AccessLog.from_config(
+            {"access_log": ""})
+        self.assertFalse(access_log.enabled)
+        access_log.log("-", "-", "GET", "/", "HTTP/1.0", 200)
+        access_log.start()
+        access_log.close()
+        self.assertEqual(0, access_log.stats()["requests"])
+
+    def test_writer_thread(self):
+        """The writer thread writes all records until it is stopped."""
+        sink = ListSink()
+        access_log = pynullweb.accesslog.AccessLog(sink, interval=0.01)
+        access_log.start()
+        for i in range(100):
+            access_log.log("-", "-", "GET", "/%d" % i, "HTTP/1.0", 200)
+        access_log.close()
+        self.assertEqual(100, len(sink.lines))
+        self.assertTrue(sink.closed)
+
+    def test_file(self):
+        """Records are appended to a log file."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "access.log")
+        for _ in range(2):
+            access_log = pynullweb.accesslog.AccessLog.from_config(
+                {"access_log": path})
+            access_log.log("-", "-", "GET", "/", "HTTP/1.0", 200)
+            access_log.close()
+        with open(path) as log_file:
+            self.assertEqual(2, len(log_file.readlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test admission module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import unittest
+
+import pynullweb.admission
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """Test class admission.RateLimiter."""
+
+    def test_burst(self):
+        """A client may send a burst of requests, then has to wait."""
+        limiter = pynullweb.admission.RateLimiter(2.0, 3)
+        self.assertEqual(
+            [True, True, True, False],
+            [limiter.allow("10.0.0.1", 100.0) for _ in range(4)])
+        self.assertTrue(limiter.allow("10.0.0.2", 100.0))
+        self.assertFalse(limiter.allow("10.0.0.1", 100.25))
+        self.assertTrue(limiter.allow("10.0.0.1", 100.5))
+        self.assertFalse(limiter.allow("10.0.0.1", 100.5))
+
+    def test_refill(self):
+        """Buckets fill up to the burst size."""
+        limiter = pynullweb.admission.RateLimiter(1.0, 2)
+        self.assertTrue(limiter.allow("10.0.0.1", 100.0))
+        self.assertTrue(limiter.allow("10.0.0.1", 100.0))
+        self.assertEqual(
+            [True, True, False],
+            [limiter.allow("10.0.0.1", 200.0) for _ in range(3)])
+
+    def test_default_burst(self):
+        """Without a burst size, the rate of one second is allowed at once."""
+        self.assertEqual(5, pynullweb.admission.RateLimiter(5).burst)
+        self.assertEqual(1, pynullweb.admission.RateLimiter(0.1).burst)
+
+    def test_prune(self):
+        """The least recent buckets are removed, with too many clients."""
+        limiter = pynullweb.admission.RateLimiter(1.0, 1, max_clients=2)
+        limiter.allow("10.0.0.1", 100.0)
+        limiter.allow("10.0.0.2", 101.0)
+        self.assertEqual(2, len(limiter))
+        limiter.allow("10.0.0.3", 101.5)
+        self.assertEqual(2, len(limiter))
+        self.assertFalse(limiter.allow("10.0.0.2", 101.5))
+        for number in range(4, 8):
+            limiter.allow("10.0.0.%d" % number, 101.5)
+        self.assertEqual(2, len(limiter))
+        self.assertTrue(limiter.allow("10.0.0.2", 101.5))
+
+
+class AdmissionControlTestCase(unittest.TestCase):
+    """Test class admission.AdmissionControl."""
+
+    def test_max_connections(self):
+        """Connections above the limit are rejected, but counted."""
+        admission = pynullweb.admission.AdmissionControl(max_connections=2)
+        self.assertEqual([True, True, False],
+                         [admission.open() for _ in range(3)])
+        admission.close()
+        admission.close()
+        self.assertTrue(admission.open())
+        self.assertEqual(2, admission.active)
+
+    def test_no_limits(self):
+        """By default, everything is admitted."""
+        admission = pynullweb.admission.AdmissionControl.from_config({})
+        self.assertTrue(all(admission.open() for _ in range(100)))
+        self.assertTrue(all(admission.allow("10.0.0.1") for _ in range(100)))
+        self.assertIsNone(admission.limiter)
+
+    def test_from_config(self):
+        """Limits are taken from the server configuration."""
+        admission = pynullweb.admission.AdmissionControl.from_config({
+            "max_connections": "10", "rate_limit": "5", "rate_burst": "20"})
+        self.assertEqual(10, admission.max_connections)
+        self.assertEqual(5, admission.limiter.rate)
+        self.assertEqual(20, admission.limiter.burst)
+
+
+if __name__ == '__main__':
+    unittest.main()
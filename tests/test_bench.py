@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test bench module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import socket
+import unittest
+
+import pynullweb.bench
+
+
+class PercentileTestCase(unittest.TestCase):
+    """Test function bench.percentile."""
+
+    def test_percentile(self):
+        """Test some percentiles."""
+        values = [float(i) for i in range(1001)]
+        self.assertEqual(500.0, pynullweb.bench.percentile(values, 0.5))
+        self.assertEqual(990.0, pynullweb.bench.percentile(values, 0.99))
+        self.assertEqual(999.0, pynullweb.bench.percentile(values, 0.999))
+        self.assertEqual(0.0, pynullweb.bench.percentile([], 0.5))
+
+
+class ReadResponseTestCase(unittest.TestCase):
+    """Test function bench.read_response."""
+
+    def test_pipelined(self):
+        """Responses are separated by their content length."""
+        server, client = socket.socketpair()
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+        server.sendall(
+            b"HTTP/1.1 200 OK\r\nContent-length: 3\r\n\r\nabc"
+            b"HTTP/1.1 302 Found\r\nConnection: close\r\n"
+            b"Content-length: 0\r\n\r\n")
+        status, close, buf = pynullweb.bench.read_response(client, b"")
+        self.assertEqual((200, False), (status, close))
+        status, close, buf = pynullweb.bench.read_response(client, buf)
+        self.assertEqual((302, True), (status, close))
+        self.assertEqual(b"", buf)
+
+
+class RunBenchmarkTestCase(unittest.TestCase):
+    """Test function bench.run_benchmark."""
+
+    def test_run(self):
+        """A short benchmark against a started server produces a report."""
+        port = pynullweb.bench.free_port()
+        process = pynullweb.bench.start_server(port)
+        try:
+            report = pynullweb.bench.run_benchmark(
+                ("127.0.0.1", port), 4, 0.5, 0.3)
+        finally:
+            pynullweb.bench.stop_server(process)
+        self.assertGreater(report["requests"], 0)
+        self.assertEqual(0, report["errors"])
+        self.assertEqual(
+            report["requests"], sum(report["status_codes"].values()))
+        self.assertIn("302", report["status_codes"])
+        latency = report["latency_ms"]
+        self.assertLessEqual(latency["p50"], latency["p99"])
+        self.assertLessEqual(latency["p99"], latency["p999"])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test blocklist module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import pynullweb.blocklist
+
+
+def write_file(directory, name, content):
+    """Write a file into a directory, return its path."""
+    path = os.path.join(directory, name)
+    with open(path, "wb") as list_file:
+        list_file.write(content)
+    return path
+
+
+class ParseLineTestCase(unittest.TestCase):
+    """Test function blocklist.parse_line."""
+
+    def test_parse(self):
+        """Domain names are taken from hosts files and plain lists."""
+        for line, name in (
+                ("0.0.0.0 ads.example.com", "ads.example.com"),
+                ("127.0.0.1\tTracker.Example.NET. # comment",
+                 "tracker.example.net"),
+                ("pixel.example.org\n", "pixel.example.org"),
+                ("# 0.0.0.0 ads.example.com", None), ("", None),
+                ("127.0.0.1 localhost", None), ("::1 ip6-localhost", None),
+                ("192.168.1.1 nas.lan", None), ("localhost", None)):
+            self.assertEqual(name, pynullweb.blocklist.parse_line(line), line)
+
+
+class DomainIndexTestCase(unittest.TestCase):
+    """Test class blocklist.DomainIndex."""
+
+    names = ["example.com", "ads.example.net", "a-b.example.net", "x.y.z.org"]
+
+    def assert_index(self, index):
+        """Check membership of names in an index built from self.names."""
+        self.assertEqual(4, len(index))
+        for name in ("example.com", "ads.example.com", "a.b.example.com",
+                     "ads.example.net", "x.ads.example.net", "x.y.z.org"):
+            self.assertIn(name, index)
+        for name in ("com", "example.net", "b.example.net", "y.z.org",
+                     "xexample.com", "example.com.org", "ads-example.net"):
+            self.assertNotIn(name, index)
+
+    def test_build(self):
+        """Names and sub-domains of names are in the index."""
+        index = pynullweb.blocklist.DomainIndex.build(self.names + self.names)
+        self.assert_index(index)
+        self.assertEqual(b"com.example", index[0])
+        self.assertNotIn("example.com", pynullweb.blocklist.DomainIndex.build(
+            []))
+
+    def test_save_load(self):
+        """Saved indexes can be loaded again."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "list.idx")
+        pynullweb.blocklist.DomainIndex.build(self.names).save(path)
+        self.assert_index(pynullweb.blocklist.DomainIndex.load(path))
+
+        with open(path, "rb") as index_file:
+            data = index_file.read()
+        for broken in (data[:-1], data[:10], b"X" + data[1:]):
+            write_file(directory, "broken.idx", broken)
+            self.assertRaises(
+                ValueError, pynullweb.blocklist.DomainIndex.load,
+                os.path.join(directory, "broken.idx"))
+
+    def test_load_domain_list(self):
+        """Indexes of domain lists are saved, reused, and replaced."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_file(
+            directory, "hosts", b"0.0.0.0 ads.example.com\nexample.net\n")
+        index = pynullweb.blocklist.load_domain_list(path)
+        self.assertIn("ads.example.com", index)
+        saved_path = pynullweb.blocklist.index_path(path)
+        self.assertTrue(os.path.isfile(saved_path))
+        old_index = pynullweb.blocklist.load_domain_list(path)
+        write_file(directory, "hosts", b"example.net\nother.example.org\n")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        new_index = pynullweb.blocklist.load_domain_list(path)
+        self.assertIn("ads.example.com", old_index)
+        self.assertNotIn("other.example.org", old_index)
+        self.assertIn("other.example.org", new_index)
+        self.assertEqual([saved_path.rpartition(os.sep)[2]], [
+            name for name in os.listdir(directory) if ".idx" in name])
+        write_file(directory, "hosts.idx", b"garbage")
+        self.assertIn(
+            "x.example.net", pynullweb.blocklist.load_domain_list(path))
+
+
+class BlocklistsTestCase(unittest.TestCase):
+    """Test class blocklist.Blocklists."""
+
+    def test_spec(self):
+        """Specifications consist of path and optional status."""
+        for spec, result in (
+                ("ads.txt:204", ("ads.txt", 204)),
+                (" ads.txt ", ("ads.txt", 200)),
+                ("C:/ads.txt", ("C:/ads.txt", 200))):
+            self.assertEqual(
+                result, pynullweb.blocklist.parse_blocklist_spec(spec))
+
+    def test_classify(self):
+        """The first list containing a host determines its status."""
+        build = pynullweb.blocklist.DomainIndex.build
+        blocklists = pynullweb.blocklist.Blocklists([
+            (204, build(["ads.example.com"])),
+            (404, build(["example.com"]))], cache_size=2)
+        self.assertEqual(2, len(blocklists))
+        for _ in range(2):
+            for host, status in (
+                    ("ads.example.com", 204), ("x.ADS.example.com:80", 204),
+                    ("example.com", 404), ("example.org", None), (None, None)):
+                self.assertEqual(status, blocklists.classify(host), host)
+        self.assertIsNone(pynullweb.blocklist.Blocklists().classify("x.com"))
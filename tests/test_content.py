@@ -8,7 +8,11 @@ Test content module.
 :license: Apache 2.0, see LICENSE
 """
 
+import os
+import shutil
+import tempfile
 import unittest
+import zlib
 
 import pynullweb.content
 
@@ -21,10 +25,18 @@ class ContentTypeTestCase(unittest.TestCase):
         content_types = pynullweb.content.content_types()
         expected_types = (
             ("text", "html"), ("image", "gif"), ("image", "jpeg"),
-            ("image", "png"))
+            ("image", "png"), ("image", "webp"), ("image", "svg+xml"),
+            ("text", "css"), ("text", "javascript"), ("application", "json"),
+            ("text", "plain"), ("font", "woff2"),
+            ("application", "octet-stream"))
         for content_type in expected_types:
             self.assertIn(content_type, content_types)
 
+    def test_html_first(self):
+        """HTML is preferred if the Accept header does not decide."""
+        self.assertEqual(
+            ("text", "html"), pynullweb.content.content_types()[0])
+
 
 class MinimalContentTestCase(unittest.TestCase):
     """Test function content.minimal_content."""
@@ -33,10 +45,64 @@ class MinimalContentTestCase(unittest.TestCase):
         """Test that for each known content type some content is available."""
         for content_type in pynullweb.content.content_types():
             content = pynullweb.content.minimal_content(content_type)
-            self.assertNotEqual("", content)
+            self.assertNotEqual(b"", content)
 
     def test_illegal_content_types(self):
         """Test for empty content when content type is not supported."""
         for content_type in (None, ('foo', 'bar')):
             content = pynullweb.content.minimal_content(content_type)
-            self.assertEqual("", content)
+            self.assertEqual(b"", content)
+
+
+class PayloadRegistryTestCase(unittest.TestCase):
+    """Test class content.PayloadRegistry."""
+
+    def test_register(self):
+        """Payloads are read-only views, registered types keep their order."""
+        registry = pynullweb.content.PayloadRegistry()
+        registry.register(("text", "html"), "<html></html>")
+        registry.register(("image", "gif"), b"GIF")
+        registry.register(("text", "html"), b"<p>")
+        self.assertEqual(
+            [("text", "html"), ("image", "gif")], registry.content_types())
+        payload = registry.get(("text", "html"))
+        self.assertEqual(b"<p>", payload.tobytes())
+        self.assertTrue(payload.readonly)
+        self.assertIsNone(registry.get(("text", "plain")))
+
+    def test_load_directory(self):
+        """Files of a directory are memory-mapped, typed by extension."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name, content in (
+                ("pixel.gif", b"GIF89a"), ("empty.txt", b""),
+                ("unknown.qwertz", b"?"), ("style.css.gz", b"gz")):
+            with open(os.path.join(directory, name), "wb") as payload_file:
+                payload_file.write(content)
+        os.mkdir(os.path.join(directory, "sub.html"))
+        registry = pynullweb.content.PayloadRegistry()
+        self.assertEqual(
+            [("text", "plain"), ("image", "gif")],
+            registry.load_directory(directory))
+        self.assertEqual(b"GIF89a", registry.get(("image", "gif")).tobytes())
+        self.assertEqual(b"", registry.get(("text", "plain")).tobytes())
+        self.assertEqual(
+            int(os.stat(os.path.join(directory, "pixel.gif")).st_mtime),
+            registry.validators(("image", "gif"))[1])
+
+    def test_validators(self):
+        """Entity tags are stable, they depend on content type and content."""
+        registry = pynullweb.content.PayloadRegistry()
+        registry.register(("text", "plain"), b"x", 1500000000)
+        registry.register(("text", "css"), b"x")
+        etag, modified = registry.validators(("text", "plain"))
+        self.assertEqual(1500000000, modified)
+        self.assertEqual('"%08x"' % (
+            zlib.crc32(b"x", zlib.crc32(b"text/plain")) & 0xffffffff,), etag)
+        self.assertEqual(
+            ('"%08x"' % (zlib.crc32(b"x", zlib.crc32(b"text/css")) &
+                         0xffffffff,), pynullweb.content.BUILTIN_MODIFIED),
+            registry.validators(("text", "css")))
+        registry.register(("text", "plain"), b"y")
+        self.assertNotEqual(etag, registry.validators(("text", "plain"))[0])
+        self.assertIsNone(registry.validators(("image", "gif")))
@@ -0,0 +1,627 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test the behaviour of request handling for all server implementations.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import io
+import os
+import shutil
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import pynullweb.handler
+import pynullweb.modes
+
+if sys.version_info >= (3, 4):
+    import pynullweb.aioserver
+
+HAS_IPV6 = socket.has_ipv6 and os.path.exists("/proc/net/if_inet6")
+HAS_OPENSSL = any(
+    os.access(os.path.join(directory, "openssl"), os.X_OK)
+    for directory in os.environ.get("PATH", "").split(os.pathsep))
+
+
+class QuietHandler(pynullweb.handler.NullWebHandler):
+    """Handler that does not log to stderr."""
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log anything."""
+
+
+class ParseOnlyHandler(pynullweb.handler.NullWebHandler):
+    """Handler that only parses a request head, without connection."""
+
+    def __init__(self, head):  # pylint: disable=super-init-not-called
+        """Prepare the head to be parsed."""
+        self.rfile = io.BytesIO(head)
+        self.wfile = io.BytesIO()
+        self.raw_requestline = self.rfile.readline(65537)
+        self.request_version = self.default_request_version
+        self.client_address = ("127.0.0.1", 0)
+
+    def log_request(self, code="-", size="-"):
+        """Do not log anything."""
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log anything."""
+
+    def parsed(self):
+        """Return the request as parsed, and the headers used."""
+        return (
+            self.command, self.path, self.request_version,
+            bool(self.close_connection),
+            [(self.headers.get(name) or "").strip() for name in (
+                "Host", "Accept", "Connection", "If-None-Match",
+                "If-Modified-Since")])
+
+
+def parse_response(data):
+    """Split a response into status line, header dict, and body."""
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return lines[0], headers, body
+
+
+def receive_all(client):
+    """Read from client socket until the connection is closed."""
+    chunks = []
+    while True:
+        chunk = client.recv(4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class HandlerBehaviourMixin(object):
+    """Behaviour that all server implementations must provide."""
+
+    def start_server(self, localhosts="", redirect="", **options):
+        """Start a server in a background thread, return its port."""
+        raise NotImplementedError
+
+    def connect(self, port):
+        """Open a client connection to the server."""
+        client = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.addCleanup(client.close)
+        return client
+
+    def request(self, port, path="/", host="ads.example.com", accept=None,
+                method="GET", extra=()):
+        """Send a HTTP/1.0 request and return the parsed response."""
+        lines = ["%s %s HTTP/1.0" % (method, path)]
+        if host is not None:
+            lines.append("Host: " + host)
+        if accept is not None:
+            lines.append("Accept: " + accept)
+        lines.extend(extra)
+        client = socket.create_connection(("127.0.0.1", port), timeout=5)
+        try:
+            client.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("ascii"))
+            return parse_response(receive_all(client))
+        finally:
+            client.close()
+
+    def test_redirect_localhost(self):
+        """Requests for local hosts are redirected."""
+        port = self.start_server("router.lan, nas", "http://nas:8080")
+        for host in ("router.lan", "nas:2468", None):
+            status, headers, _ = self.request(port, "/foo?bar", host)
+            self.assertTrue(status.endswith(" 302 Found"))
+            self.assertEqual("http://nas:8080/foo?bar", headers["location"])
+
+    def test_redirect_domain(self):
+        """Requests for hosts within local domains are redirected."""
+        port = self.start_server("*.lan", "http://router.lan")
+        status, headers, _ = self.request(port, "/x", "nas.lan:80")
+        self.assertTrue(status.endswith(" 302 Found"))
+        self.assertEqual("http://router.lan/x", headers["location"])
+        status, _, _ = self.request(port, "/x", "lan.example.com")
+        self.assertTrue(status.endswith(" 200 OK"))
+
+    def test_blocklist(self):
+        """Hosts on blocklists get the status code of their list."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for name, content in (("ads", b"0.0.0.0 ads.example.com\n"),
+                              ("trackers", b"example.org\n")):
+            paths.append(os.path.join(directory, name))
+            with open(paths[-1], "wb") as list_file:
+                list_file.write(content)
+        port = self.start_server(
+            blocklists="%s:204, %s" % tuple(paths))
+        status, headers, body = self.request(port, "/a.gif", "ads.example.com")
+        self.assertTrue(status.endswith(" 204 No Content"))
+        self.assertNotIn("content-length", headers)
+        self.assertEqual(b"", body)
+        status, headers, _ = self.request(port, "/a.gif", "x.example.org")
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual("image/gif", headers["content-type"])
+
+    def test_rules(self):
+        """Rules decide the response, before blocklists and validators."""
+        port = self.start_server(
+            "router.lan", "http://router.lan", metrics_path="/.metrics",
+            rules="host=ads.example.com path=/pagead status=204\n"
+            "host=router.lan status=404\n"
+            "path=/r redirect=https://example.com/ header=X-Rule:1\n"
+            "ext=js content=application/javascript header=X-Rule:2")
+        status, headers, body = self.request(port, "/pagead/a.gif")
+        self.assertTrue(status.endswith(" 204 No Content"))
+        self.assertEqual(b"", body)
+        status, _, _ = self.request(port, "/pagead", "router.lan")
+        self.assertTrue(status.endswith(" 302 Found"))
+        status, headers, _ = self.request(port, "/r/a.gif")
+        self.assertTrue(status.endswith(" 302 Found"))
+        self.assertEqual("https://example.com/", headers["location"])
+        self.assertEqual("1", headers["x-rule"])
+        status, headers, body = self.request(port, "/a.js", accept="image/*")
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual("application/javascript", headers["content-type"])
+        self.assertEqual("2", headers["x-rule"])
+        self.assertEqual(str(len(body)), headers["content-length"])
+        status, headers, _ = self.request(
+            port, "/a.js", extra=["If-None-Match: " + headers["etag"]])
+        self.assertTrue(status.endswith(" 304 Not Modified"))
+        self.assertEqual("2", headers["x-rule"])
+        _, _, body = self.request(port, "/.metrics", "router.lan")
+        self.assertIn(
+            'pynullweb_responses_total{kind="rule",status="204"} 1\n',
+            body.decode("utf-8"))
+
+    def test_access_log(self):
+        """Answered requests are written to the access log."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "access.log")
+        port = self.start_server(access_log=path)
+        self.request(port, "/a.gif", "ads.example.com")
+        deadline = time.time() + 5
+        content = ""
+        while "\n" not in content and time.time() < deadline:
+            time.sleep(0.05)
+            with open(path) as log_file:
+                content = log_file.read()
+        self.assertIn(" ads.example.com - [", content)
+        self.assertIn('"GET /a.gif HTTP/1.0" 200 ', content)
+
+    def test_metrics(self):
+        """Metrics are served on the configured path."""
+        port = self.start_server(
+            "router.lan", "http://router.lan", metrics_path="/.metrics")
+        self.request(port, "/a.gif", "ads.example.com")
+        self.request(port, "/", "router.lan")
+        status, headers, body = self.request(port, "/.metrics", "router.lan")
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertTrue(headers["content-type"].startswith("text/plain"))
+        self.assertEqual(str(len(body)), headers["content-length"])
+        text = body.decode("utf-8")
+        self.assertIn(
+            'pynullweb_responses_total{kind="content",'
+            'content_type="image/gif"} 1\n', text)
+        self.assertIn('pynullweb_responses_total{kind="redirect"} 1\n', text)
+        self.assertIn("pynullweb_request_duration_seconds_count 2\n", text)
+
+    def test_no_redirect(self):
+        """Without redirection, only empty host names are redirected."""
+        port = self.start_server("router.lan", "")
+        status, _, _ = self.request(port, "/", "router.lan")
+        self.assertTrue(status.endswith(" 200 OK"))
+        status, headers, _ = self.request(port, "/foo", None)
+        self.assertTrue(status.endswith(" 302 Found"))
+        self.assertEqual("/foo", headers["location"])
+
+    def test_html_content(self):
+        """Without hints, minimal HTML is delivered."""
+        port = self.start_server()
+        status, headers, body = self.request(port)
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual("Apache", headers["server"])
+        self.assertIn("date", headers)
+        self.assertEqual("text/html", headers["content-type"])
+        self.assertEqual(str(len(body)), headers["content-length"])
+        self.assertEqual(b"<html></html>\n", body)
+        self.assertEqual("public,max-age=86400", headers["cache-control"])
+        self.assertEqual("Wed, 01 Jan 2070 16:17:18 GMT", headers["expires"])
+
+    def test_content_type(self):
+        """Content type is negotiated by Accept header and path."""
+        port = self.start_server()
+        for accept, path, content_type in (
+                ("image/png,image/*;q=0.8", "/", "image/png"),
+                (None, "/foo.gif", "image/gif"),
+                ("*/*", "/foo.jpg", "image/jpeg"),
+                ("text/html;q=0.5,image/gif", "/foo.png", "image/gif")):
+            _, headers, body = self.request(port, path, accept=accept)
+            self.assertEqual(content_type, headers["content-type"])
+            self.assertEqual(str(len(body)), headers["content-length"])
+            self.assertTrue(body)
+
+    def test_head(self):
+        """HEAD requests do not retrieve content."""
+        port = self.start_server()
+        status, headers, body = self.request(port, "/foo.gif", method="HEAD")
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual("image/gif", headers["content-type"])
+        self.assertNotEqual("0", headers["content-length"])
+        self.assertEqual(b"", body)
+
+    def test_not_modified(self):
+        """Requests with current validators are answered without content."""
+        port = self.start_server()
+        _, headers, _ = self.request(port, "/foo.gif")
+        etag, modified = headers["etag"], headers["last-modified"]
+        for extra in (
+                ["If-None-Match: " + etag],
+                ['If-None-Match: "x", W/' + etag],
+                ["If-Modified-Since: " + modified]):
+            status, headers, body = self.request(port, "/foo.gif", extra=extra)
+            self.assertTrue(status.endswith(" 304 Not Modified"), extra)
+            self.assertNotIn("content-type", headers)
+            self.assertEqual(b"", body)
+        self.assertEqual(etag, headers.get("etag", etag))
+        for extra in (
+                ['If-None-Match: "x"', "If-Modified-Since: " + modified],
+                ["If-Modified-Since: Sun, 01 Jan 2012 00:00:00 GMT"]):
+            status, headers, body = self.request(port, "/foo.gif", extra=extra)
+            self.assertTrue(status.endswith(" 200 OK"), extra)
+            self.assertEqual(etag, headers["etag"])
+            self.assertTrue(body)
+
+    def test_keep_alive(self):
+        """HTTP/1.1 connections are kept alive, pipelined requests work."""
+        port = self.start_server()
+        client = self.connect(port)
+        request = b"GET /foo.gif HTTP/1.1\r\nHost: ads.example.com\r\n\r\n"
+        client.sendall(request)
+        first = client.recv(4096)
+        self.assertTrue(first.startswith(b"HTTP/1.1 200 OK\r\n"))
+        client.sendall(request * 2 + b"GET / HTTP/1.1\r\n" +
+                       b"Host: ads.example.com\r\nConnection: close\r\n\r\n")
+        rest = receive_all(client)
+        self.assertEqual(3, rest.count(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(rest.startswith(first))
+        self.assertTrue(rest.endswith(b"<html></html>\n"))
+
+    def test_http10_closes(self):
+        """HTTP/1.0 connections are closed after the response."""
+        port = self.start_server()
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n"
+                       b"Host: ads.example.com\r\n\r\n")
+        status, headers, body = parse_response(receive_all(client))
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual(headers["content-length"], str(len(body)))
+
+    def test_request_limit(self):
+        """Connections are closed after a maximum number of requests."""
+        port = self.start_server(keep_alive_requests="2")
+        client = self.connect(port)
+        request = b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n"
+        client.sendall(request * 2)
+        responses = receive_all(client)
+        self.assertEqual(2, responses.count(b" 200 OK\r\n"))
+        self.assertEqual(1, responses.count(b"\r\nConnection: close\r\n"))
+
+    def test_redirect_keep_alive(self):
+        """Redirects can be pipelined on a persistent connection."""
+        port = self.start_server("nas", "http://nas")
+        client = self.connect(port)
+        client.sendall(b"GET /a HTTP/1.1\r\nHost: nas\r\n\r\n"
+                       b"GET /b HTTP/1.1\r\nHost: nas\r\n"
+                       b"Connection: close\r\n\r\n")
+        responses = receive_all(client)
+        self.assertEqual(2, responses.count(b" 302 Found\r\n"))
+        self.assertIn(b"\r\nLocation: http://nas/b\r\n", responses)
+
+    def test_reconfigure(self):
+        """A new configuration applies to open connections, too."""
+        port = self.start_server()
+        client = self.connect(port)
+        client.sendall(b"GET /a HTTP/1.1\r\nHost: nas\r\n\r\n")
+        self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.httpd.reconfigure({"server": {
+            "localhosts": "nas", "redirect": "http://nas"}})
+        client.sendall(b"GET /b HTTP/1.1\r\nHost: nas\r\n"
+                       b"Connection: close\r\n\r\n")
+        status, headers, _ = parse_response(receive_all(client))
+        self.assertTrue(status.endswith(" 302 Found"))
+        self.assertEqual("http://nas/b", headers["location"])
+
+    def test_idle_timeout(self):
+        """Idle connections are closed."""
+        port = self.start_server(keep_alive_timeout="0.2")
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        start = time.time()
+        response = receive_all(client)
+        self.assertLess(time.time() - start, 3)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+
+    def test_keep_alive_disabled(self):
+        """Without keep-alive timeout, connections close after a response."""
+        port = self.start_server(keep_alive_timeout="0")
+        client = self.connect(port)
+        time.sleep(0.2)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        status, headers, _ = parse_response(receive_all(client))
+        self.assertTrue(status.endswith(" 200 OK"))
+        self.assertEqual("close", headers["connection"])
+
+    def test_rate_limit(self):
+        """Requests above the rate of a client are shed."""
+        port = self.start_server(rate_limit="0.001", rate_burst="2")
+        for _ in range(2):
+            status, _, _ = self.request(port)
+            self.assertTrue(status.endswith(" 200 OK"))
+        status, headers, _ = self.request(port)
+        self.assertTrue(status.endswith(" 503 Service Unavailable"))
+        self.assertEqual("close", headers["connection"])
+        self.assertEqual(1, self.httpd.metrics.merged()[("shed", "rate")])
+
+    def test_header_timeout(self):
+        """Connections that send their request head too slowly are closed."""
+        port = self.start_server(header_timeout="0.2")
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n")
+        start = time.time()
+        response = receive_all(client)
+        self.assertLess(time.time() - start, 3)
+        self.assertNotIn(b" 200 OK", response)
+        self.assertEqual(
+            1, self.httpd.metrics.merged()[("shed", "header_timeout")])
+
+    def test_shutdown_gracefully(self):
+        """Idle connections are closed when the server stops gracefully."""
+        port = self.start_server()
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.httpd.shutdown_gracefully()
+        self.assertEqual(b"", receive_all(client))
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+    def test_listen(self):
+        """The server answers on all its listen addresses."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "pynullweb.sock")
+        addresses = ["127.0.0.1:0", "unix:" + path]
+        if HAS_IPV6:
+            addresses.append("[::1]:0")
+        self.start_server(listen=",".join(addresses))
+        self.assertEqual(len(addresses), len(self.httpd.sockets))
+        for listener in self.httpd.sockets:
+            client = socket.socket(listener.family, socket.SOCK_STREAM)
+            self.addCleanup(client.close)
+            client.settimeout(5)
+            client.connect(listener.getsockname())
+            client.sendall(b"GET / HTTP/1.0\r\nHost: ads.example.com\r\n\r\n")
+            status, _, _ = parse_response(receive_all(client))
+            self.assertTrue(status.endswith(" 200 OK"), listener)
+
+    @unittest.skipUnless(HAS_OPENSSL, "needs the openssl tool")
+    def test_tls(self):
+        """The TLS listener answers with a certificate for the server name."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.start_server(tls_port="0", tls_dir=directory)
+        context = ssl.create_default_context(
+            cafile=os.path.join(directory, "ca.crt"))
+        contexts = self.httpd.tls.contexts
+        if not contexts.wait:  # The first handshake only starts minting
+            client = socket.create_connection(
+                ("127.0.0.1", self.httpd.tls.port), timeout=5)
+            self.addCleanup(client.close)
+            with self.assertRaises((socket.error, ValueError)):
+                context.wrap_socket(client, server_hostname="ads.example.com")
+            deadline = time.time() + 10
+            while not len(contexts) and time.time() < deadline:
+                time.sleep(0.05)
+        session = None
+        for _ in range(2):
+            client = socket.create_connection(
+                ("127.0.0.1", self.httpd.tls.port), timeout=5)
+            options = {} if session is None else {"session": session}
+            client = context.wrap_socket(
+                client, server_hostname="ads.example.com", **options)
+            self.addCleanup(client.close)
+            client.sendall(b"GET /a.gif HTTP/1.1\r\nHost: ads.example.com\r\n"
+                           b"Connection: close\r\n\r\n")
+            status, headers, _ = parse_response(receive_all(client))
+            self.assertTrue(status.endswith(" 200 OK"))
+            self.assertEqual("image/gif", headers["content-type"])
+            session = getattr(client, "session", None)
+        if session is not None:
+            self.assertTrue(client.session_reused)
+        self.assertEqual(2, contexts.authority.minted)
+
+    def test_unsupported_method(self):
+        """Methods other than GET and HEAD are not supported."""
+        port = self.start_server()
+        status, _, _ = self.request(port, method="POST")
+        self.assertTrue(status.endswith(" 501 Not Implemented") or
+                        status.endswith(" 501 Unsupported method ('POST')"))
+
+
+class ParseRequestTestCase(unittest.TestCase):
+    """Test the fast path of NullWebHandler.parse_request."""
+
+    HEADS = [
+        b"GET /a.gif HTTP/1.1\r\nHost: ads.example.com\r\n"
+        b"User-Agent: Mozilla/5.0\r\nAccept: image/webp,*/*\r\n"
+        b"Accept-Encoding: gzip\r\nIf-None-Match:  \"abc\" \r\n\r\n",
+        b"HEAD / HTTP/1.0\nhost: x.example.org\nCONNECTION: keep-alive\n\n",
+        b"GET /x?y=1 HTTP/1.1\r\nHost: a\r\nConnection: close\r\n\r\n",
+        b"GET / HTTP/1.1\r\nHost: a\r\n",
+    ]
+
+    def test_same_as_base(self):
+        """The fast path parses requests like the base method."""
+        base = pynullweb.handler.BaseHTTPServer.BaseHTTPRequestHandler
+        for head in self.HEADS:
+            fast = ParseOnlyHandler(head)
+            self.assertTrue(fast.parse_request())
+            self.assertIsInstance(fast.headers, dict)
+            full = ParseOnlyHandler(head)
+            self.assertTrue(base.parse_request(full))
+            self.assertEqual(full.parsed(), fast.parsed(), head)
+
+    def test_network_path(self):
+        """Paths that start with two slashes are not network paths."""
+        handler = ParseOnlyHandler(b"GET //example.com/x HTTP/1.1\r\n\r\n")
+        self.assertTrue(handler.parse_request())
+        self.assertEqual("/example.com/x", handler.path)
+
+    def test_fallback(self):
+        """Unusual requests are parsed by the base method."""
+        head = (b"GET /x HTTP/1.1\r\nUser-Agent: a\r\n b\r\n"
+                b"Host: ads.example.com\r\n\r\nGET /next HTTP/1.1\r\n")
+        handler = ParseOnlyHandler(head)
+        self.assertTrue(handler.parse_request())
+        self.assertNotIsInstance(handler.headers, dict)
+        self.assertEqual("ads.example.com", handler.headers.get("Host"))
+        self.assertEqual(b"GET /next HTTP/1.1\r\n", handler.rfile.readline())
+        for head in (b"GET /x HTTP/1.1\r\ngarbage\r\nHost: a\r\n\r\n",
+                     b"GET /x HTTP/1.1\r\nExpect: 100-continue\r\n\r\n",
+                     b"GET /x HTTP/1.1\r\nHost: a\r\nHost: b\r\n\r\n",
+                     b"GET /x HTTP/1.2\r\nHost: a\r\n\r\n"):
+            handler = ParseOnlyHandler(head)
+            handler.parse_request()
+            self.assertNotIsInstance(handler.headers, dict, head)
+
+    def test_errors(self):
+        """Malformed request lines are answered with an error."""
+        for head in (b"GET / HTTP/x.y\r\n\r\n", b"GET / HTTP/1.1 x\r\n\r\n"):
+            handler = ParseOnlyHandler(head)
+            self.assertFalse(handler.parse_request())
+            self.assertIn(b" 400 ", handler.wfile.getvalue())
+
+
+class ServerThreadMixin(object):
+    """Run a server in a background thread."""
+
+    mode = "single"
+
+    def start_server(self, localhosts="", redirect="", **options):
+        """Start a server in a background thread, return its port."""
+        config = {"server": {
+            "verbose": "0", "localhosts": localhosts, "redirect": redirect,
+            "mode": self.mode, "workers": "1", "access_log": ""}}
+        config["server"].update(options)
+        httpd = self.httpd = self.create_server(config)
+        thread = self.thread = threading.Thread(
+            target=httpd.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(httpd.shutdown)
+        return httpd.server_port
+
+    def create_server(self, config):
+        """Create the server object."""
+        return pynullweb.modes.create_server(
+            ("127.0.0.1", 0), QuietHandler, config)
+
+
+class NullWebHandlerTestCase(
+        ServerThreadMixin, HandlerBehaviourMixin, unittest.TestCase):
+    """Test the BaseHTTPServer-based handler, with persistent connections."""
+
+    mode = "thread"
+
+
+@unittest.skipIf(sys.version_info < (3, 4), "asyncio needs Python 3.4")
+class AsyncNullWebServerTestCase(
+        ServerThreadMixin, HandlerBehaviourMixin, unittest.TestCase):
+    """Test the asyncio-based server."""
+
+    mode = "asyncio"
+
+    def create_server(self, config):
+        """Create the server object."""
+        return pynullweb.aioserver.AsyncNullWebServer(
+            ("127.0.0.1", 0), None, config)
+
+    def test_bad_request(self):
+        """Malformed requests are rejected."""
+        port = self.start_server()
+        client = self.connect(port)
+        client.sendall(b"GARBAGE\r\n\r\n")
+        status, _, _ = parse_response(receive_all(client))
+        self.assertEqual("HTTP/1.1 400 Bad Request", status)
+
+    def test_max_connections(self):
+        """Connections above the limit are shed."""
+        port = self.start_server(max_connections="1")
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200 OK\r\n"))
+        status, _, _ = self.request(port)
+        self.assertTrue(status.endswith(" 503 Service Unavailable"))
+        self.assertEqual(
+            1, self.httpd.metrics.merged()[("shed", "connections")])
+        client.close()
+        time.sleep(0.1)
+        status, _, _ = self.request(port)
+        self.assertTrue(status.endswith(" 200 OK"))
+
+    def test_pipelined_partial_request(self):
+        """A partial request after another one gets its own header timeout."""
+        port = self.start_server(keep_alive_timeout="0.2", header_timeout="1")
+        client = self.connect(port)
+        request = b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n"
+        client.sendall(request)
+        time.sleep(0.7)
+        client.sendall(b"\r\n" + request)
+        time.sleep(0.7)
+        client.sendall(b"\r\n")
+        responses = receive_all(client)
+        self.assertEqual(2, responses.count(b" 200 OK\r\n"))
+        self.assertNotIn(b" 408 ", responses)
+
+    def test_shed_connection_timeout(self):
+        """Shed connections that stay open do not stop the idle timeouts."""
+        port = self.start_server(
+            max_connections="1", header_timeout="0.3", keep_alive_timeout="1")
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200 OK\r\n"))
+        shed = self.connect(port)
+        self.assertTrue(shed.recv(4096).startswith(b"HTTP/1.1 503 "))
+        start = time.time()
+        self.assertEqual(b"", receive_all(client))
+        self.assertLess(time.time() - start, 3)
+
+    def test_drain_partial_request(self):
+        """A partial request is answered while the server drains."""
+        port = self.start_server(drain_timeout="5")
+        client = self.connect(port)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n")
+        time.sleep(0.1)
+        stopper = threading.Thread(target=self.httpd.shutdown_gracefully)
+        stopper.start()
+        time.sleep(0.1)
+        client.sendall(b"\r\n")
+        status, headers, _ = parse_response(receive_all(client))
+        stopper.join(5)
+        self.assertEqual("HTTP/1.1 200 OK", status)
+        self.assertEqual("close", headers["connection"])
+        self.assertFalse(self.thread.is_alive())
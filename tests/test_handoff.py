@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test handoff module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import socket
+import sys
+import unittest
+
+import pynullweb.handoff
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Successor that answers one connection with the targets of its descriptors
+SUCCESSOR = """
+import os, sys
+sys.path.insert(0, %r)
+import pynullweb.handoff
+listener = pynullweb.handoff.inherited_sockets()[0]
+pynullweb.handoff.notify_ready()
+connection, _ = listener.accept()
+targets = []
+for name in os.listdir("/proc/self/fd"):
+    try:
+        targets.append(os.readlink("/proc/self/fd/" + name))
+    except OSError:  # Descriptor of the listing
+        pass
+connection.sendall(" ".join(targets).encode())
+connection.close()
+""" % (ROOT,)
+
+
+class InheritedSocketTestCase(unittest.TestCase):
+    """Test functions handoff.inherited_sockets and handoff.notify_ready."""
+
+    def test_inherited_sockets(self):
+        """Several sockets are taken from the environment, in order."""
+        self.assertEqual([], pynullweb.handoff.inherited_sockets())
+        listeners = []
+        for _ in range(2):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.addCleanup(listener.close)
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(1)
+            listeners.append(listener)
+        os.environ[pynullweb.handoff.LISTEN_FD] = ",".join(
+            str(os.dup(listener.fileno())) for listener in listeners)
+        inherited = pynullweb.handoff.inherited_sockets()
+        for listener in inherited:
+            self.addCleanup(listener.close)
+        self.assertEqual([listener.getsockname() for listener in listeners],
+                         [listener.getsockname() for listener in inherited])
+
+    def test_notify_ready(self):
+        """Readiness is reported through the pipe."""
+        pynullweb.handoff.notify_ready()
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        os.environ[pynullweb.handoff.READY_FD] = str(write_fd)
+        pynullweb.handoff.notify_ready()
+        self.assertEqual(b"1", os.read(read_fd, 2))
+        self.assertNotIn(pynullweb.handoff.READY_FD, os.environ)
+
+
+class HandoffTestCase(unittest.TestCase):
+    """Test class handoff.Handoff."""
+
+    def setUp(self):
+        """Create a listening socket."""
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(self.listener.close)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(5)
+
+    @unittest.skipUnless(
+        os.path.isdir("/proc/self/fd"), "needs /proc to list descriptors")
+    def test_spawn(self):
+        """The successor serves the socket, and inherits nothing else."""
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+        if hasattr(os, "set_inheritable"):
+            os.set_inheritable(write_fd, True)
+        handoff = pynullweb.handoff.Handoff([sys.executable, "-c", SUCCESSOR])
+        self.assertTrue(handoff.spawn(self.listener))
+        self.addCleanup(handoff.process.wait)
+        self.assertFalse(handoff.spawn(self.listener))
+        client = socket.create_connection(self.listener.getsockname(), 5)
+        self.addCleanup(client.close)
+        targets = client.recv(4096).decode().split()
+        self.assertIn("socket:[%d]" % os.fstat(self.listener.fileno()).st_ino,
+                      targets)
+        self.assertNotIn("pipe:[%d]" % os.fstat(write_fd).st_ino, targets)
+
+    def test_not_ready(self):
+        """A successor that does not report in time is terminated."""
+        handoff = pynullweb.handoff.Handoff(
+            [sys.executable, "-c", "import time; time.sleep(10)"], 0.1)
+        self.assertFalse(handoff.spawn(self.listener))
+        self.assertIsNotNone(handoff.process.poll())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -75,6 +75,44 @@ class ParseAcceptHeaderTestCase(unittest.TestCase):
             "text/html;level=2;q=0.4, */*;q=0.5")
 
 
+class IterAcceptHeaderTestCase(unittest.TestCase):
+    """Test function header.iter_accept_header."""
+
+    def assert_ranges(self, expected, accept_header, max_length=None):
+        """Test whether accept header is tokenized to expected list."""
+        self.assertEqual(expected, list(pynullweb.header.iter_accept_header(
+            accept_header, max_length)))
+
+    def test_order(self):
+        """Media ranges are yielded in order of appearance."""
+        self.assert_ranges([], None)
+        self.assert_ranges(
+            [("image", "*", 0.5), ("text", "*", 1)], "image;q=.5,text")
+        self.assert_ranges(
+            [("text", "html", 1), ("image", "png", 0.3)],
+            " Text/HTML , , image/png;Q=0.3")
+
+    def test_parameters(self):
+        """Parameters after the weight are ignored."""
+        self.assert_ranges(
+            [("text", "html;level=1", 0.5), ("image", "gif", 1)],
+            "text/html;level=1 ; q=0.5;ext=\"a\";x, image/gif")
+        self.assert_ranges(
+            [("text", "html", 1), ("text", "plain", 0), ("*", "*", 1)],
+            "text/html;q=2,text/plain;q=0x,*/*;q=")
+
+    def test_max_length(self):
+        """Only complete media ranges within maximum length are used."""
+        header = "text/html,image/gif;q=0.5,*/*"
+        self.assert_ranges([("text", "html", 1)], header, 10)
+        self.assert_ranges([("text", "html", 1)], header, 24)
+        self.assert_ranges(
+            [("text", "html", 1), ("image", "gif", 0.5)], header, 25)
+        self.assert_ranges([], header, 8)
+        self.assertEqual(3, len(list(
+            pynullweb.header.iter_accept_header(header, len(header)))))
+
+
 class DoesTypeMatchTestCase(unittest.TestCase):
     """Test function header.does_type_match."""
 
@@ -126,5 +164,145 @@ class BestMatchOnPathTestCase(unittest.TestCase):
         self.assert_type(("text", "html"), None)
 
 
+class NegotiatorTestCase(unittest.TestCase):
+    """Test class header.Negotiator."""
+
+    content_types = [
+        ("text", "html"), ("image", "gif"), ("image", "png"),
+        ("text", "plain"), ("application", "json")]
+
+    accept_headers = (
+        "", "*/*", "image/*", "image/png", "text/*;q=0.5,image/*",
+        "image/png;q=0.5,text/*", "image/jpeg,image/png;q=0.9",
+        "image/*;q=0.8,text/plain", "text/html;level=1,image/gif;q=0.5",
+        "image/png;q=0,image/*", "*/*;q=0.1,application/json;q=0.1",
+        "*/json", "audio/*; q=0.2, audio/basic",
+        "text/plain; q=0.5, text/html, text/x-dvi; q=0.8, text/x-c",
+        "text/*, text/plain, text/plain;format=flowed, */*",
+        "text/*;q=0.3, text/html;q=0.7, text/html;level=1, "
+        "text/html;level=2;q=0.4, */*;q=0.5")
+
+    def test_same_as_best_match(self):
+        """Results are the same as those of function best_match."""
+        for content_types in (
+                self.content_types, list(reversed(self.content_types)),
+                self.content_types + [("image", "png")], [("text", "html")],
+                []):
+            negotiator = pynullweb.header.Negotiator(content_types)
+            for accept in self.accept_headers:
+                values = pynullweb.header.parse_accept_header(accept)
+                self.assertEqual(
+                    pynullweb.header.best_match(values, content_types),
+                    negotiator.best_match(values), (accept, content_types))
+
+    def test_negotiate(self):
+        """Negotiation on the header is the same as on the sorted list."""
+        negotiator = pynullweb.header.Negotiator(self.content_types)
+        for accept in self.accept_headers:
+            self.assertEqual(
+                negotiator.best_match(
+                    pynullweb.header.parse_accept_header(accept)),
+                negotiator.negotiate(accept), accept)
+
+    def test_negotiate_max_length(self):
+        """Negotiation ignores media ranges after the maximum length."""
+        negotiator = pynullweb.header.Negotiator(self.content_types, 10)
+        self.assertEqual(
+            ("image", "png"), negotiator.negotiate("image/png,text/html"))
+        self.assertEqual(
+            ("text", "html"), negotiator.negotiate("text/html,image/png"))
+        self.assertIsNone(negotiator.negotiate("image/" + "y" * 30))
+
+    def test_resolve(self):
+        """Media ranges are resolved to the first matching content type."""
+        negotiator = pynullweb.header.Negotiator(self.content_types)
+        self.assertEqual(2, negotiator.resolve("image", "png"))
+        self.assertEqual(1, negotiator.resolve("image", "*"))
+        self.assertEqual(0, negotiator.resolve("*", "json"))
+        self.assertIsNone(negotiator.resolve("*", "*"))
+        self.assertIsNone(negotiator.resolve("image", "jpeg"))
+
+
 class GetContentTypeTestCase(unittest.TestCase):
     """Test function header.get_content_type."""
+
+
+class PathSuffixTestCase(unittest.TestCase):
+    """Test function header.path_suffix."""
+
+    def test_suffix(self):
+        """Test the suffix of some paths."""
+        for path, suffix in (
+                ("/foo.gif", ".gif"), ("/a.b/foo", ""), ("/A.GIF", ".gif"),
+                ("/foo.tar.gz", ".gz"), ("/", ""), ("", ""), (None, ""),
+                ("/.gif", ""), ("/x?u=a.gif", ""), ("/x.png#a.gif", ".png"),
+                ("http://x.org/y.png", ".png")):
+            self.assertEqual(suffix, pynullweb.header.path_suffix(path))
+
+
+class NegotiationCacheTestCase(unittest.TestCase):
+    """Test class header.NegotiationCache."""
+
+    content_types = [("text", "html"), ("image", "gif"), ("image", "png")]
+
+    def test_same_result(self):
+        """Cached results are the same as computed results."""
+        cache = pynullweb.header.NegotiationCache(self.content_types)
+        for _ in range(2):
+            for accept, path in (
+                    ("image/*", "/foo"), ("*/*", "/foo.png"), (None, "/a.txt"),
+                    ("", "/foo.gif"), ("image/png;q=0.5,text/*", "/foo.png"),
+                    ("application/json", "/foo.tar.gz")):
+                self.assertEqual(
+                    pynullweb.header.get_content_type(
+                        accept, self.content_types, path),
+                    cache.get_content_type(accept, path))
+
+    def test_cache_order(self):
+        """Results do not depend on the paths that were cached before."""
+        paths = ("/x?u=a.gif", "/a.gif", "/b.gif#c.png", "/c.PNG", "/.png")
+        expected = [
+            pynullweb.header.get_content_type("", self.content_types, path)
+            for path in paths]
+        for order in (paths, tuple(reversed(paths))):
+            cache = pynullweb.header.NegotiationCache(self.content_types)
+            for _ in range(2):
+                self.assertEqual(
+                    [expected[paths.index(path)] for path in order],
+                    [cache.get_content_type("", path) for path in order])
+
+    def test_counters(self):
+        """Hits and misses are counted."""
+        cache = pynullweb.header.NegotiationCache(self.content_types)
+        cache.get_content_type("image/*", "/foo")
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+        cache.get_content_type("image/*", "/bar")
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        cache.get_content_type("*/*", "/foo.gif")
+        self.assertEqual((1, 3), (cache.hits, cache.misses))
+        cache.get_content_type("*/*", "/bar.gif")
+        self.assertEqual((3, 3), (cache.hits, cache.misses))
+
+    def test_long_header(self):
+        """Long headers are cached by the prefix used for negotiation."""
+        cache = pynullweb.header.NegotiationCache(
+            self.content_types, max_length=10)
+        cache.get_content_type("image/png," + "a/b," * 100, "/")
+        self.assertEqual(
+            ("image", "png"),
+            cache.get_content_type("image/png," + "c/d," * 100, "/"))
+        self.assertEqual(1, cache.hits)
+
+    def test_eviction(self):
+        """Least recently used entries are evicted."""
+        cache = pynullweb.header.NegotiationCache(self.content_types, 2)
+        cache.get_content_type("image/gif", "/")
+        cache.get_content_type("image/png", "/")
+        cache.get_content_type("image/gif", "/")
+        cache.get_content_type("text/html", "/")
+        self.assertEqual(2, len(cache))
+        misses = cache.misses
+        cache.get_content_type("image/gif", "/")
+        self.assertEqual(misses, cache.misses)
+        cache.get_content_type("image/png", "/")
+        self.assertEqual(misses + 1, cache.misses)
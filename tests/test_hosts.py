@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test hosts module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import unittest
+
+import pynullweb.hosts
+
+
+class StripPortTestCase(unittest.TestCase):
+    """Test function hosts.strip_port."""
+
+    def test_strip(self):
+        """Ports are removed from host names and addresses."""
+        for host, name in (
+                ("nas", "nas"), ("nas:8080", "nas"),
+                ("10.0.0.1:80", "10.0.0.1"), ("[::1]:8080", "[::1]"),
+                ("[::1]", "[::1]"), ("", "")):
+            self.assertEqual(name, pynullweb.hosts.strip_port(host))
+
+
+class HostMatcherTestCase(unittest.TestCase):
+    """Test class hosts.HostMatcher."""
+
+    def test_exact(self):
+        """Exact names match regardless of port and case."""
+        matcher = pynullweb.hosts.HostMatcher(
+            ["router.lan", " NAS:2468 ", "", "[::1]"])
+        for host in ("router.lan", "Router.LAN:80", "nas", "nas.", "[::1]:80"):
+            self.assertTrue(matcher.match(host), host)
+        for host in ("lan", "x.router.lan", "router", "nas.lan", "[::2]"):
+            self.assertFalse(matcher.match(host), host)
+
+    def test_suffix(self):
+        """Domain suffixes match all sub-domains, but not the domain."""
+        matcher = pynullweb.hosts.HostMatcher(
+            ["*.lan", ".home.arpa", "fritz.box"])
+        for host in ("a.lan", "b.a.LAN:8080", "nas.home.arpa", "fritz.box"):
+            self.assertTrue(matcher.match(host), host)
+        for host in ("lan", "home.arpa", "arpa", "a.lan.example.com",
+                     "x.fritz.box", "alan"):
+            self.assertFalse(matcher.match(host), host)
+
+    def test_no_host(self):
+        """Requests without host name are local."""
+        matcher = pynullweb.hosts.HostMatcher([])
+        self.assertTrue(matcher.match(None))
+        self.assertTrue(matcher.match(""))
+        self.assertFalse(matcher.match("ads.example.com"))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test listeners module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import pynullweb.listeners
+
+
+def has_ipv6():
+    """Return True, if the loopback interface has an IPv6 address."""
+    if not socket.has_ipv6:
+        return False
+    probe = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    try:
+        probe.bind(("::1", 0))
+    except socket.error:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+HAS_IPV6 = has_ipv6()
+
+
+class ParseAddressTestCase(unittest.TestCase):
+    """Test function listeners.parse_address."""
+
+    def test_ipv4(self):
+        """A port alone listens on the default host, or on all interfaces."""
+        parse = pynullweb.listeners.parse_address
+        self.assertEqual((socket.AF_INET, ("0.0.0.0", 80)), parse("80"))
+        self.assertEqual((socket.AF_INET, ("0.0.0.0", 80)), parse(":80"))
+        self.assertEqual(
+            (socket.AF_INET, ("127.0.0.1", 80)), parse("80", "127.0.0.1"))
+        self.assertEqual(
+            (socket.AF_INET, ("10.0.0.1", 8080)), parse(" 10.0.0.1:8080 "))
+
+    def test_ipv6(self):
+        """IPv6 addresses are written in brackets."""
+        family, address = pynullweb.listeners.parse_address("[::]:443")
+        self.assertEqual(socket.AF_INET6, family)
+        self.assertEqual(("::", 443), address[:2])
+
+    def test_unix(self):
+        """Unix sockets are given by their path."""
+        self.assertEqual(
+            (socket.AF_UNIX, "/run/pynullweb.sock"),
+            pynullweb.listeners.parse_address("unix:/run/pynullweb.sock"))
+
+    def test_invalid(self):
+        """Addresses without port or path are rejected."""
+        for text in ("", "localhost", "[::1]", "[::1]80", "host:http",
+                     "unix:"):
+            with self.assertRaises(ValueError):
+                pynullweb.listeners.parse_address(text)
+
+    def test_from_config(self):
+        """Without listen addresses, the server address is used."""
+        self.assertEqual(
+            [(socket.AF_INET, ("127.0.0.1", 2468))],
+            pynullweb.listeners.from_config({}, ("127.0.0.1", 2468)))
+        self.assertEqual(
+            [(socket.AF_INET, ("0.0.0.0", 80)),
+             (socket.AF_UNIX, "/tmp/x.sock")],
+            pynullweb.listeners.from_config(
+                {"listen": "80, unix:/tmp/x.sock"}, ("", 2468)))
+
+
+class BindTestCase(unittest.TestCase):
+    """Test functions listeners.bind and listeners.accept."""
+
+    def test_inherited(self):
+        """An inherited socket on the same address is used."""
+        listener = pynullweb.listeners.bind(
+            socket.AF_INET, ("127.0.0.1", 0), 5)
+        self.addCleanup(listener.close)
+        other = pynullweb.listeners.bind(socket.AF_INET, ("127.0.0.1", 0), 5)
+        self.addCleanup(other.close)
+        inherited = [other, listener]
+        self.assertIs(listener, pynullweb.listeners.bind(
+            socket.AF_INET, listener.getsockname(), 5, inherited))
+        self.assertEqual([other], inherited)
+
+    def test_unix(self):
+        """A stale Unix socket is replaced, its clients have no address."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "pynullweb.sock")
+        pynullweb.listeners.bind(socket.AF_UNIX, path, 1).close()
+        listener = pynullweb.listeners.bind(socket.AF_UNIX, path, 1)
+        self.addCleanup(listener.close)
+        self.assertEqual(
+            "unix:" + path, pynullweb.listeners.describe(listener))
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(path)
+        connection, client_address = pynullweb.listeners.accept(listener)
+        connection.close()
+        self.assertEqual(pynullweb.listeners.LOCAL_CLIENT, client_address)
+
+    def test_unix_in_use(self):
+        """Other files and Unix sockets of running servers are kept."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "notasocket.txt")
+        with open(path, "w") as text_file:
+            text_file.write("keep")
+        with self.assertRaises(socket.error):
+            pynullweb.listeners.bind(socket.AF_UNIX, path, 1)
+        self.assertTrue(os.path.isfile(path))
+        path = os.path.join(directory, "pynullweb.sock")
+        listener = pynullweb.listeners.bind(socket.AF_UNIX, path, 1)
+        self.addCleanup(listener.close)
+        with self.assertRaises(socket.error):
+            pynullweb.listeners.bind(socket.AF_UNIX, path, 1)
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(path)
+
+    @unittest.skipUnless(HAS_IPV6, "needs IPv6")
+    def test_dual_stack(self):
+        """IPv4 and IPv6 sockets can listen on the same port."""
+        listener = pynullweb.listeners.bind(socket.AF_INET, ("0.0.0.0", 0), 5)
+        self.addCleanup(listener.close)
+        port = listener.getsockname()[1]
+        family, address = pynullweb.listeners.parse_address("[::]:%d" % port)
+        listener6 = pynullweb.listeners.bind(family, address, 5)
+        self.addCleanup(listener6.close)
+        self.assertEqual("[::]:%d" % port,
+                         pynullweb.listeners.describe(listener6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test metrics module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import threading
+import unittest
+
+import pynullweb.metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Test class metrics.Metrics."""
+
+    def test_count(self):
+        """Responses are counted by kind and detail."""
+        metrics = pynullweb.metrics.Metrics()
+        metrics.count("content", ("image", "gif"))
+        metrics.count("content", ("image", "gif"))
+        metrics.count("redirect")
+        metrics.count("blocked", 204)
+        text = metrics.render()
+        self.assertIn(
+            'pynullweb_responses_total{kind="content",'
+            'content_type="image/gif"} 2\n', text)
+        self.assertIn('pynullweb_responses_total{kind="redirect"} 1\n', text)
+        self.assertIn(
+            'pynullweb_responses_total{kind="blocked",status="204"} 1\n',
+            text)
+
+    def test_histogram(self):
+        """Durations are counted in cumulative buckets."""
+        metrics = pynullweb.metrics.Metrics(buckets=(0.001, 0.01))
+        for seconds in (0.0005, 0.001, 0.005, 0.5):
+            metrics.observe(seconds)
+        text = metrics.render()
+        self.assertIn(
+            'pynullweb_request_duration_seconds_bucket{le="0.001"} 2\n', text)
+        self.assertIn(
+            'pynullweb_request_duration_seconds_bucket{le="0.01"} 3\n', text)
+        self.assertIn(
+            'pynullweb_request_duration_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn("pynullweb_request_duration_seconds_count 4\n", text)
+        self.assertIn(
+            "pynullweb_request_duration_seconds_sum 0.506500\n", text)
+
+    def test_threads(self):
+        """Counters of all threads are merged."""
+        metrics = pynullweb.metrics.Metrics()
+
+        def work():
+            """Count some responses and a connection."""
+            metrics.connection(1)
+            for _ in range(100):
+                metrics.count("redirect")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(400, metrics.merged()[("redirect", None)])
+        self.assertIn("pynullweb_connections 4\n", metrics.render())
+
+    def test_callback(self):
+        """Registered callbacks are rendered with their description."""
+        metrics = pynullweb.metrics.Metrics()
+        metrics.register("test_value", "gauge", "A value.", lambda: 42)
+        text = metrics.render()
+        self.assertIn("# HELP test_value A value.\n", text)
+        self.assertIn("# TYPE test_value gauge\n", text)
+        self.assertTrue(text.endswith("\ntest_value 42\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test microbench module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import json
+import os
+import unittest
+
+import pynullweb.microbench
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "microbench_baseline.json")
+
+
+class CompareTestCase(unittest.TestCase):
+    """Test function microbench.compare."""
+
+    def test_regression(self):
+        """Results beyond the threshold are regressions."""
+        baseline = {
+            "a": {"ns_per_op": 100.0, "alloc_bytes": 1000},
+            "b": {"ns_per_op": 100.0, "alloc_bytes": None}}
+        results = {
+            "a": {"ns_per_op": 140.0, "alloc_bytes": 1600},
+            "b": {"ns_per_op": 160.0, "alloc_bytes": 100},
+            "c": {"ns_per_op": 1000.0, "alloc_bytes": 100}}
+        regressions = pynullweb.microbench.compare(results, baseline, 1.5)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith("a: alloc_bytes"))
+        self.assertTrue(regressions[1].startswith("b: ns_per_op"))
+
+    def test_relative(self):
+        """Relative times are compared, if both results have them."""
+        baseline = {"a": {"ns_per_op": 100.0, "relative": 1.0},
+                    "b": {"ns_per_op": 100.0, "relative": 1.0}}
+        results = {"a": {"ns_per_op": 200.0, "relative": 1.2},
+                   "b": {"ns_per_op": 100.0, "relative": 1.6}}
+        regressions = pynullweb.microbench.compare(results, baseline, 1.5)
+        self.assertEqual(1, len(regressions))
+        self.assertTrue(regressions[0].startswith("b: relative"))
+
+
+class MergeTestCase(unittest.TestCase):
+    """Test function microbench.merge."""
+
+    def test_merge(self):
+        """Only results of new benchmarks are added to the baseline."""
+        merged = pynullweb.microbench.merge(
+            {"a": {"ns_per_op": 100.0}},
+            {"a": {"ns_per_op": 200.0}, "b": {"ns_per_op": 300.0}})
+        self.assertEqual(
+            {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 300.0}}, merged)
+
+
+class RunTestCase(unittest.TestCase):
+    """Test function microbench.run."""
+
+    def test_selection(self):
+        """Only selected benchmarks are run."""
+        results = pynullweb.microbench.run(0.001, "does_type_match")
+        self.assertEqual(
+            ["calibration", "does_type_match/exact",
+             "does_type_match/wildcard"], sorted(results))
+        for result in results.values():
+            self.assertGreater(result["ns_per_op"], 0)
+            self.assertGreater(result["relative"], 0)
+
+    def test_baseline_complete(self):
+        """The stored baseline covers all benchmarks."""
+        with open(BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, _, _ in pynullweb.microbench.benchmarks():
+            self.assertIn(name, baseline)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test mimetable module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import mimetypes
+import sys
+import unittest
+
+import pynullweb.mimetable
+
+
+class GuessTypeTestCase(unittest.TestCase):
+    """Test function mimetable.guess_type."""
+
+    def test_guess(self):
+        """Content types are found by the extension of the last segment."""
+        for path, content_type in (
+                ("/pixel.gif", ("image", "gif")),
+                ("/a/b/Banner.PNG", ("image", "png")),
+                ("/banner.png?id=1.html", ("image", "png")),
+                ("/x.css#top", ("text", "css")),
+                ("track.js", ("text", "javascript")),
+                ("/a.tar.gz", None),
+                ("/dir.jpg/index", None),
+                ("/.gif", None),
+                ("/file.", None),
+                ("/", None),
+                ("", None),
+                (None, None)):
+            self.assertEqual(
+                content_type, pynullweb.mimetable.guess_type(path), path)
+
+    @unittest.skipIf(
+        sys.version_info[0] == 2, "Python 2 reads the system MIME databases")
+    def test_consistent_with_mimetypes(self):
+        """Types known to module mimetypes agree with the table."""
+        guesser = mimetypes.MimeTypes(filenames=())
+        for extension, content_type in \
+                pynullweb.mimetable.EXTENSION_TYPES.items():
+            mime_type, _ = guesser.guess_type("file" + extension)
+            if mime_type and extension not in (".js", ".mjs"):
+                self.assertEqual(
+                    mime_type, "/".join(content_type), extension)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test modes module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import unittest
+
+import pynullweb.modes
+
+
+class ServerModesTestCase(unittest.TestCase):
+    """Test function modes.server_modes."""
+
+    def test_default_mode(self):
+        """The default mode is available."""
+        self.assertIn(
+            pynullweb.modes.DEFAULT_MODE, pynullweb.modes.server_modes())
+
+    def test_legacy_modes(self):
+        """The BaseHTTPServer-based modes are always available."""
+        for mode in ("single", "thread", "prefork"):
+            self.assertIn(mode, pynullweb.modes.server_modes())
+
+    def test_unknown_mode(self):
+        """An unknown mode is rejected without creating a server."""
+        with self.assertRaises(ValueError):
+            pynullweb.modes.create_server(
+                ("127.0.0.1", 0), None, {"server": {"mode": "unknown"}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test profiler module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+import pynullweb.profiler
+
+
+def busy_loop(started, stop):
+    """Spin until stop is set."""
+    started.set()
+    while not stop.is_set():
+        sum(range(100))
+
+
+class StackSamplerTestCase(unittest.TestCase):
+    """Test class profiler.StackSampler."""
+
+    def test_sample(self):
+        """Stacks of other threads are counted, outermost frame first."""
+        started, stop = threading.Event(), threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(started, stop))
+        thread.start()
+        started.wait()
+        try:
+            sampler = pynullweb.profiler.StackSampler(0.001)
+            sampler.run(0.05)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertTrue(sampler.samples > 0)
+        stacks = [
+            line for line in sampler.lines()
+            if "test_profiler.busy_loop" in line]
+        self.assertTrue(stacks)
+        self.assertTrue(stacks[0].startswith("threading."))
+        self.assertEqual(
+            sampler.samples, sum(int(line.split()[-1]) for line in stacks))
+        for line in sampler.lines():
+            self.assertNotIn("StackSampler.sample", line)
+
+
+class ProfileTriggerTestCase(unittest.TestCase):
+    """Test class profiler.ProfileTrigger."""
+
+    def test_disabled(self):
+        """Without a duration, there is no trigger."""
+        self.assertIsNone(pynullweb.profiler.ProfileTrigger.from_config({}))
+
+    def test_signal(self):
+        """A signal starts a profile, that is written to a file."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        trigger = pynullweb.profiler.ProfileTrigger.from_config({
+            "profile_seconds": "0.05",
+            "profile_output": os.path.join(directory, "profile-%d.folded")})
+        for signum in (signal.SIGUSR1, signal.SIGPROF):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        self.assertTrue(trigger.install())
+        os.kill(os.getpid(), signal.SIGUSR1)
+        deadline = time.time() + 5
+        while trigger.thread is None and time.time() < deadline:
+            time.sleep(0.01)
+        while trigger.thread.is_alive() and time.time() < deadline:
+            sum(range(100))  # The profiling timer measures used CPU time
+        trigger.thread.join()
+        self.assertEqual(
+            os.path.join(directory, "profile-%d.folded" % (os.getpid(),)),
+            trigger.last_output)
+        with open(trigger.last_output) as profile_file:
+            self.assertIn("test_profiler.", profile_file.read())
+
+    def test_thread(self):
+        """Outside the main thread, a sampling thread is started."""
+        trigger = pynullweb.profiler.ProfileTrigger(0.05, os.devnull)
+        starter = threading.Thread(target=trigger.start)
+        starter.start()
+        starter.join()
+        trigger.thread.join()
+        self.assertEqual(os.devnull, trigger.last_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
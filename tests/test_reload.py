@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test reload module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unittest
+
+import pynullweb.content
+import pynullweb.reload
+
+
+def wait_for(condition, timeout=5):
+    """Wait until the condition is true, return its final value."""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class SnapshotTestCase(unittest.TestCase):
+    """Test class reload.Snapshot."""
+
+    def test_from_config(self):
+        """Local hosts are only used with a redirect URL."""
+        snapshot = pynullweb.reload.Snapshot.from_config(
+            {"localhosts": "nas, router"}, "HTTP/1.1")
+        self.assertEqual((), snapshot.localhosts)
+        self.assertFalse(snapshot.host_matcher.match("nas"))
+        self.assertIs(pynullweb.content.PAYLOADS, snapshot.responses.payloads)
+        snapshot = pynullweb.reload.Snapshot.from_config(
+            {"localhosts": "nas, router", "redirect": "http://nas"},
+            "HTTP/1.1")
+        self.assertEqual(("nas", "router"), snapshot.localhosts)
+        self.assertTrue(snapshot.host_matcher.match("nas"))
+
+    def test_payloads(self):
+        """Payloads of a directory are added to the built-in payloads."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "a.avif"), "wb") as payload_file:
+            payload_file.write(b"AVIF")
+        snapshot = pynullweb.reload.Snapshot.from_config(
+            {"payloads": directory}, "HTTP/1.1")
+        self.assertEqual(
+            ("image", "avif"),
+            snapshot.negotiator.get_content_type("image/avif", "/"))
+        self.assertNotIn(
+            ("image", "avif"), pynullweb.content.PAYLOADS.content_types())
+
+    def test_rules(self):
+        """Rules may name the payload types of the configuration."""
+        snapshot = pynullweb.reload.Snapshot.from_config(
+            {"rules": "ext=gif content=image/gif"}, "HTTP/1.1")
+        self.assertEqual(1, len(snapshot.rules))
+        with self.assertRaises(ValueError):
+            pynullweb.reload.Snapshot.from_config(
+                {"rules": "ext=avif content=image/avif"}, "HTTP/1.1")
+
+    def test_immutable(self):
+        """A snapshot cannot be changed."""
+        snapshot = pynullweb.reload.Snapshot.from_config({}, "HTTP/1.1")
+        with self.assertRaises(AttributeError):
+            snapshot.redirect = "http://nas"
+
+
+class ConfigReloaderTestCase(unittest.TestCase):
+    """Test class reload.ConfigReloader."""
+
+    def setUp(self):
+        """Create a reloader that records the loaded configurations."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "pynullweb.ini")
+        self.write("1")
+        self.activated = []
+        self.reloader = pynullweb.reload.ConfigReloader(
+            self.load, self.activated.append, self.path, 0.01)
+
+    def write(self, content):
+        """Write the configuration file."""
+        with open(self.path, "w") as config_file:
+            config_file.write(content)
+
+    def load(self):
+        """Read the configuration file."""
+        with open(self.path) as config_file:
+            return int(config_file.read())
+
+    def test_reload(self):
+        """The loaded configuration is activated."""
+        self.assertTrue(self.reloader.reload())
+        self.assertEqual([1], self.activated)
+        self.assertEqual(1, self.reloader.reloads)
+        self.assertEqual(0, self.reloader.failures)
+
+    def test_failure(self):
+        """A configuration that cannot be loaded is not activated."""
+        self.write("x")
+        devnull = open(os.devnull, "w")
+        self.addCleanup(devnull.close)
+        self.addCleanup(setattr, sys, "stderr", sys.stderr)
+        sys.stderr = devnull
+        self.assertFalse(self.reloader.reload())
+        self.assertEqual([], self.activated)
+        self.assertEqual(0, self.reloader.reloads)
+        self.assertEqual(1, self.reloader.failures)
+
+    def test_file_change(self):
+        """A changed configuration file is reloaded."""
+        self.reloader.start()
+        self.addCleanup(self.reloader.stop)
+        time.sleep(0.05)
+        self.assertEqual([], self.activated)
+        self.write("22")
+        self.assertTrue(wait_for(lambda: self.activated))
+        self.assertEqual([22], self.activated)
+
+    def test_signal(self):
+        """A signal requests a reload."""
+        self.addCleanup(
+            signal.signal, signal.SIGHUP, signal.getsignal(signal.SIGHUP))
+        self.reloader.interval = 60
+        self.assertTrue(self.reloader.install())
+        self.reloader.start()
+        self.addCleanup(self.reloader.stop)
+        os.kill(os.getpid(), signal.SIGHUP)
+        self.assertTrue(wait_for(lambda: self.activated))
+        self.assertEqual([1], self.activated)
+
+
+if __name__ == '__main__':
+    unittest.main()
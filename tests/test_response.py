@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test response module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import unittest
+from email.utils import formatdate
+
+import pynullweb.content
+import pynullweb.response
+
+
+class HttpDateTestCase(unittest.TestCase):
+    """Test function response.http_date."""
+
+    def test_format(self):
+        """Dates are formatted like email.utils.formatdate does."""
+        for seconds in (0, 951782400, 1500000000, 4102444799):
+            self.assertEqual(
+                formatdate(seconds, usegmt=True),
+                pynullweb.response.http_date(seconds))
+
+
+class ParseHttpDateTestCase(unittest.TestCase):
+    """Test function response.parse_http_date."""
+
+    def test_parse(self):
+        """Formatted dates are parsed back."""
+        for seconds in (0, 951782400, 1500000000, 4102444799):
+            self.assertEqual(
+                seconds, pynullweb.response.parse_http_date(
+                    pynullweb.response.http_date(seconds)))
+
+    def test_invalid(self):
+        """Invalid and obsolete date formats result in None."""
+        for value in (
+                "", "yesterday", "Sun, 06 Nov 1994 08:49:37 UTC",
+                "Sun, 06 Foo 1994 08:49:37 GMT", "Sun, 06 Nov 1994 08:49 GMT",
+                "Sunday, 06-Nov-94 08:49:37 GMT", "Sun Nov  6 08:49:37 1994"):
+            self.assertIsNone(pynullweb.response.parse_http_date(value))
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """Test class response.ResponseCache."""
+
+    def setUp(self):
+        """Create a response cache."""
+        self.cache = pynullweb.response.ResponseCache("HTTP/1.1")
+
+    def test_content(self):
+        """Responses contain headers and the minimal content."""
+        for content_type in pynullweb.content.content_types():
+            content = pynullweb.response.to_bytes(
+                pynullweb.content.minimal_content(content_type))
+            response, body, length = self.cache.content(content_type, "GET")
+            self.assertEqual(len(content), length)
+            self.assertEqual(b"", body)
+            self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+            self.assertTrue(response.endswith(b"\r\n\r\n" + content))
+            self.assertIn(
+                ("Content-type: %s\r\n" % "/".join(content_type)).encode(
+                    "ascii"), response)
+            self.assertIn(
+                ("Content-length: %d\r\n" % length).encode("ascii"),
+                response)
+
+    def test_head(self):
+        """Responses to HEAD requests have no content."""
+        response, _, length = self.cache.content(("image", "gif"), "HEAD")
+        self.assertNotEqual(0, length)
+        self.assertTrue(response.endswith(
+            b"\r\nExpires: Wed, 01 Jan 2070 16:17:18 GMT\r\n\r\n"))
+
+    def test_unknown_content_type(self):
+        """Unknown content types result in empty content."""
+        response, _, length = self.cache.content(("foo", "bar"), "GET")
+        self.assertEqual(0, length)
+        self.assertIn(b"\r\nContent-type: foo/bar\r\n", response)
+
+    def test_large_payload(self):
+        """Large payloads are not copied into the response."""
+        payloads = pynullweb.content.PayloadRegistry()
+        payload = b"x" * (pynullweb.response.INLINE_LIMIT + 1)
+        payloads.register(("text", "plain"), payload)
+        cache = pynullweb.response.ResponseCache("HTTP/1.1", payloads)
+        response, body, length = cache.content(("text", "plain"), "GET")
+        self.assertEqual(len(payload), length)
+        self.assertEqual(payload, body.tobytes())
+        self.assertTrue(response.endswith(b"\r\n\r\n"))
+        _, body, _ = cache.content(("text", "plain"), "HEAD")
+        self.assertEqual(b"", body)
+
+    def test_date(self):
+        """The date is patched in, responses are reused within a second."""
+        first, _, _ = self.cache.content(("text", "html"), "GET")
+        second, _, _ = self.cache.content(("text", "html"), "GET")
+        self.assertIn(b"\r\nDate: " + self.cache.date() + b"\r\n", first)
+        self.assertIs(first, second)
+
+    def test_redirect(self):
+        """Redirect responses contain the location."""
+        response = self.cache.redirect("http://nas/foo")
+        self.assertTrue(response.startswith(b"HTTP/1.1 302 Found\r\n"))
+        self.assertTrue(response.endswith(
+            b"\r\nLocation: http://nas/foo\r\nContent-length: 0\r\n\r\n"))
+
+    def test_document(self):
+        """Generated content is sent without caching."""
+        response = self.cache.document("text/plain", b"abc")
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"\r\nCache-control: no-store\r\n", response)
+        self.assertTrue(response.endswith(
+            b"\r\nContent-length: 3\r\n\r\nabc"))
+        response = self.cache.document("text/plain", b"abc", "HEAD", True)
+        self.assertIn(b"\r\nConnection: close\r\n", response)
+        self.assertTrue(response.endswith(b"\r\n\r\n"))
+
+    def test_status(self):
+        """Responses without content have a status code only."""
+        response = self.cache.status(204, close=True)
+        self.assertTrue(response.startswith(b"HTTP/1.1 204 No Content\r\n"))
+        self.assertTrue(response.endswith(b"\r\nConnection: close\r\n\r\n"))
+        response = self.cache.status(410)
+        self.assertTrue(response.startswith(b"HTTP/1.1 410 Gone\r\n"))
+        self.assertTrue(response.endswith(b"\r\nContent-length: 0\r\n\r\n"))
+
+    def test_validators(self):
+        """Content responses carry entity tag and modification time."""
+        response, _, _ = self.cache.content(("image", "gif"), "GET")
+        etag, modified = pynullweb.content.PAYLOADS.validators(
+            ("image", "gif"))
+        self.assertIn(("\r\nETag: %s\r\nLast-modified: %s\r\n" % (
+            etag, pynullweb.response.http_date(modified))).encode("ascii"),
+                      response)
+        self.assertIn(etag, self.cache.etags)
+        self.assertEqual(
+            pynullweb.content.BUILTIN_MODIFIED, self.cache.last_modified)
+
+    def test_not_modified(self):
+        """Matching validators result in 304 Not Modified."""
+        etag, modified = pynullweb.content.PAYLOADS.validators(
+            ("text", "html"))
+        since = pynullweb.response.http_date(modified)
+        for if_none_match, if_modified_since in (
+                (etag, None), ('"x", W/' + etag, None), ("*", None),
+                (None, since), (etag, "yesterday")):
+            response = self.cache.not_modified(
+                if_none_match, if_modified_since)
+            self.assertTrue(response.startswith(
+                b"HTTP/1.1 304 Not Modified\r\n"))
+            self.assertNotIn(b"Content-length", response)
+            self.assertTrue(response.endswith(b"\r\n\r\n"))
+        self.assertIn(("\r\nETag: %s\r\n" % (etag,)).encode("ascii"),
+                      self.cache.not_modified(etag, None, True))
+        for if_none_match, if_modified_since in (
+                (None, None), ('"x"', since), (None, "yesterday"),
+                (None, pynullweb.response.http_date(modified - 1))):
+            self.assertIsNone(self.cache.not_modified(
+                if_none_match, if_modified_since))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test rules module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import unittest
+
+import pynullweb.content
+import pynullweb.response
+import pynullweb.rules
+
+
+class RuleTestCase(unittest.TestCase):
+    """Test class rules.Rule."""
+
+    def test_parse(self):
+        """Conditions are normalized, the response is taken from its key."""
+        rule = pynullweb.rules.Rule.parse(
+            "host=*.Ads.Example.COM. path=/pagead/ ext=.GIF method=head "
+            "status=204 header=X-Robots-Tag:noindex")
+        self.assertEqual(pynullweb.rules.Rule(
+            "ads.example.com", "/pagead/", "gif", "HEAD", 204, None, None,
+            b"X-Robots-Tag: noindex\r\n"), rule)
+        rule = pynullweb.rules.Rule.parse("path=/r redirect=https://a.b/")
+        self.assertEqual((302, "https://a.b/"), (rule.status, rule.location))
+        rule = pynullweb.rules.Rule.parse(
+            "ext=js content=application/javascript",
+            pynullweb.content.content_types())
+        self.assertEqual(
+            (200, ("application", "javascript")),
+            (rule.status, rule.content_type))
+        rule = pynullweb.rules.Rule.parse("header=Cache-control:no-store")
+        self.assertEqual((200, None), (rule.status, rule.content_type))
+
+    def test_invalid(self):
+        """Invalid rules are rejected."""
+        for line in ("host=a.b", "status=204 status=404", "status=200",
+                     "status=abc", "size=1 status=204", "host status=204",
+                     "status=204 redirect=/x", "header=no-colon",
+                     "content=image/unknown", "status=302", "status=304",
+                     "status=299", "status=418"):
+            with self.assertRaises(ValueError):
+                pynullweb.rules.Rule.parse(
+                    line, pynullweb.content.content_types())
+
+    def test_response(self):
+        """Headers of a rule are added to its response."""
+        responses = pynullweb.response.ResponseCache("HTTP/1.1")
+        rule = pynullweb.rules.Rule.parse(
+            "status=404 header=X-Robots-Tag:noindex")
+        response, body, length = rule.response(responses, None, "GET")
+        self.assertTrue(response.startswith(b"HTTP/1.1 404 Not Found\r\n"))
+        self.assertIn(b"\r\nX-Robots-Tag: noindex\r\n", response)
+        self.assertTrue(response.endswith(b"\r\n\r\n"))
+        self.assertEqual((b"", 0), (body, length))
+        rule = pynullweb.rules.Rule.parse("content=image/gif header=X-A:1")
+        response, body, length = rule.response(
+            responses, ("text", "html"), "GET")
+        self.assertIn(b"Content-type: image/gif\r\n", response)
+        self.assertIn(b"\r\nX-A: 1\r\n\r\nGIF", response)
+        self.assertEqual(length, len(response) - response.index(b"GIF"))
+
+
+class RuleTableTestCase(unittest.TestCase):
+    """Test class rules.RuleTable."""
+
+    def setUp(self):
+        """Compile some rules."""
+        self.rules = pynullweb.rules.RuleTable.from_config("""
+            # Comments and empty lines are ignored
+
+            host=ads.example.com path=/pagead ext=gif status=204
+            host=example.com method=HEAD status=404
+            host=ads.example.com status=410
+            path=/track status=204
+            ext=js content=application/javascript
+            """)
+
+    def match(self, host, path, method="GET"):
+        """Return the status of the matching rule, or None."""
+        rule = self.rules.match(host, method, path)
+        return None if rule is None else rule.status
+
+    def test_conditions(self):
+        """All conditions of a rule must match."""
+        self.assertEqual(5, len(self.rules))
+        self.assertEqual(204, self.match("x.ads.example.com", "/pagead/a.gif"))
+        self.assertEqual(
+            204, self.match("ads.example.com", "/pagead/b/c.GIF"))
+        self.assertEqual(410, self.match("ads.example.com", "/pagead/a.png"))
+        self.assertEqual(410, self.match("ads.example.com", "/pageadx/a.gif"))
+        self.assertEqual(404, self.match("example.com", "/", "HEAD"))
+        self.assertEqual(None, self.match("example.com", "/"))
+        self.assertEqual(None, self.match("badexample.com", "/", "HEAD"))
+        self.assertEqual(204, self.match(None, "/track?id=1"))
+        self.assertEqual(200, self.match("a.b", "/x/y.js?z"))
+        self.assertEqual(None, self.match("a.b", "/x/y.json"))
+
+    def test_first_rule_wins(self):
+        """Of several matching rules, the first one is used."""
+        self.assertEqual(404, self.match("ads.example.com", "/", "HEAD"))
+        self.assertEqual(410, self.match("ads.example.com", "/track"))
+        self.assertEqual(410, self.match("ads.example.com", "/a.js"))
+
+    def test_empty(self):
+        """Without rules, nothing matches."""
+        rules = pynullweb.rules.RuleTable()
+        self.assertEqual(0, len(rules))
+        self.assertIsNone(rules.match("ads.example.com", "GET", "/"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test server module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import socket
+import threading
+import time
+import unittest
+
+import pynullweb.handler
+import pynullweb.modes
+import pynullweb.server
+
+
+class QuietHandler(pynullweb.handler.NullWebHandler):
+    """Handler that does not log to stderr."""
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log anything."""
+
+
+def make_config(mode, workers, **options):
+    """Create a server configuration."""
+    config = {"server": {
+        "verbose": "0", "redirect": "", "localhosts": "",
+        "mode": mode, "workers": str(workers), "access_log": ""}}
+    config["server"].update(options)
+    return config
+
+
+def fetch(port, path="/"):
+    """Retrieve the full response for the given path."""
+    client = socket.create_connection(("127.0.0.1", port), timeout=5)
+    try:
+        client.sendall(
+            b"GET " + path.encode("ascii") + b" HTTP/1.0\r\n"
+            b"Host: ads.example.com\r\n\r\n")
+        chunks = []
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+    return b"".join(chunks)
+
+
+class ServerTestMixin(object):
+    """Start and stop a server in a background thread."""
+
+    def start_server(self, mode, workers, **options):
+        """Start a server in the given mode."""
+        httpd = pynullweb.modes.create_server(
+            ("127.0.0.1", 0), QuietHandler,
+            make_config(mode, workers, **options))
+        thread = self.thread = threading.Thread(
+            target=httpd.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(httpd.shutdown)
+        return httpd
+
+
+class CreateServerTestCase(unittest.TestCase):
+    """Test function modes.create_server for the legacy servers."""
+
+    def test_modes(self):
+        """Every mode results in a specific server class."""
+        for mode, server_class in pynullweb.server.SERVER_MODES.items():
+            httpd = pynullweb.modes.create_server(
+                ("127.0.0.1", 0), QuietHandler, make_config(mode, 2))
+            try:
+                self.assertIsInstance(httpd, server_class)
+                self.assertEqual(1 if mode == "single" else 2, httpd.workers)
+            finally:
+                httpd.server_close()
+
+    def test_unknown_mode(self):
+        """An unknown mode is rejected."""
+        with self.assertRaises(ValueError):
+            pynullweb.modes.create_server(
+                ("127.0.0.1", 0), QuietHandler, make_config("unknown", 1))
+
+
+def request_idle(port):
+    """Send a HTTP/1.1 request, return the connection and the response."""
+    client = socket.create_connection(("127.0.0.1", port), timeout=5)
+    client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+    return client, client.recv(4096)
+
+
+class SingleServerTestCase(ServerTestMixin, unittest.TestCase):
+    """Test the server that handles one connection after the other."""
+
+    def test_idle_client(self):
+        """Connections are closed after the response, even for HTTP/1.1."""
+        httpd = self.start_server("single", 1)
+        client, response = request_idle(httpd.server_port)
+        self.addCleanup(client.close)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"\r\nConnection: close\r\n", response)
+        start = time.time()
+        self.assertTrue(fetch(httpd.server_port).startswith(
+            b"HTTP/1.1 200 OK\r\n"))
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(b"", client.recv(4096))
+
+    def test_one_accept_loop(self):
+        """Connections of all listeners are accepted by serve_forever."""
+        httpd = self.start_server(
+            "single", 1, listen="127.0.0.1:0,127.0.0.1:0")
+        threads = []
+        process_request = httpd.process_request
+
+        def record(request, client_address):
+            """Record the thread that processes the request."""
+            threads.append(threading.current_thread())
+            process_request(request, client_address)
+
+        httpd.process_request = record
+        for listener in httpd.sockets:
+            self.assertTrue(fetch(listener.getsockname()[1]).startswith(
+                b"HTTP/1.1 200 OK\r\n"))
+        self.assertEqual([self.thread, self.thread], threads)
+
+
+class ThreadPoolServerTestCase(ServerTestMixin, unittest.TestCase):
+    """Test the thread pool server."""
+
+    def test_idle_client(self):
+        """An idle connection is closed if another one needs its thread."""
+        httpd = self.start_server("thread", 1)
+        client, response = request_idle(httpd.server_port)
+        self.addCleanup(client.close)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertNotIn(b"\r\nConnection: close\r\n", response)
+        start = time.time()
+        self.assertTrue(fetch(httpd.server_port).startswith(
+            b"HTTP/1.1 200 OK\r\n"))
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(b"", client.recv(4096))
+
+    def test_stalled_client(self):
+        """A stalled client must not block other clients."""
+        httpd = self.start_server("thread", 2)
+        stalled = socket.create_connection(("127.0.0.1", httpd.server_port))
+        self.addCleanup(stalled.close)
+        stalled.sendall(b"GET / HTTP/1.0\r\nHost: ads.example.com\r\n")
+        time.sleep(0.1)
+        start = time.time()
+        response = fetch(httpd.server_port, "/foo.gif")
+        self.assertLess(time.time() - start, 1.0)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"Content-type: image/gif\r\n", response)
+        stalled.sendall(b"\r\n")
+        self.assertTrue(stalled.recv(4096).startswith(b"HTTP/1.1 200 OK"))
+
+    def test_max_connections(self):
+        """Connections above the limit are shed."""
+        httpd = self.start_server("thread", 2, max_connections="1")
+        client = socket.create_connection(("127.0.0.1", httpd.server_port))
+        self.addCleanup(client.close)
+        client.sendall(b"GET / HTTP/1.1\r\nHost: ads.example.com\r\n\r\n")
+        self.assertTrue(client.recv(4096).startswith(b"HTTP/1.1 200 OK"))
+        self.assertTrue(fetch(httpd.server_port).startswith(
+            b"HTTP/1.1 503 Service Unavailable\r\n"))
+        self.assertEqual(1, httpd.metrics.merged()[("shed", "connections")])
+        client.close()
+        time.sleep(0.1)
+        self.assertTrue(fetch(httpd.server_port).startswith(
+            b"HTTP/1.1 200 OK\r\n"))
+        self.assertEqual(0, httpd.admission.active)
+
+    def test_backlog(self):
+        """The size of the backlog is configurable."""
+        httpd = self.start_server("thread", 1, backlog="7")
+        self.assertEqual(7, httpd.request_queue_size)
+
+
+class PreForkServerTestCase(ServerTestMixin, unittest.TestCase):
+    """Test the pre-fork server."""
+
+    def test_requests(self):
+        """Worker processes serve the requests."""
+        httpd = self.start_server("prefork", 2)
+        for _ in range(4):
+            response = fetch(httpd.server_port)
+            self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+
+    @unittest.skipUnless(
+        hasattr(socket, "SO_REUSEPORT"), "SO_REUSEPORT not available")
+    def test_port_not_shared(self):
+        """Another socket cannot bind the port of the workers."""
+        httpd = self.start_server("prefork", 1)
+        other = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(other.close)
+        other.setsockopt(
+            socket.SOL_SOCKET, getattr(socket, "SO_REUSEPORT"), 1)
+        with self.assertRaises(socket.error):
+            other.bind(("127.0.0.1", httpd.server_port))
+
+    def test_worker_backoff(self):
+        """Workers that fail at their start are forked with growing delay."""
+        backoff = pynullweb.server.worker_backoff
+        delays = [0.0]
+        for _ in range(10):
+            delays.append(backoff(delays[-1], 0.01))
+        self.assertEqual([0.0, 0.1, 0.2, 0.4], delays[:4])
+        self.assertEqual(pynullweb.server.WORKER_MAX_BACKOFF, delays[-1])
+        self.assertEqual(0.0, backoff(delays[-1], 60.0))
+
+    def test_shutdown_gracefully(self):
+        """Worker processes finish their connections and exit."""
+        httpd = self.start_server("prefork", 2)
+        self.assertTrue(fetch(httpd.server_port).startswith(b"HTTP/1.1 200"))
+        httpd.shutdown_gracefully()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(httpd._children)  # pylint: disable=protected-access
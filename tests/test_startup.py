@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test the start-up time of the null web server.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import json
+import subprocess
+import sys
+import unittest
+
+import pynullweb.modes
+
+
+# Modules needed to start the server in its default mode
+STARTUP_MODULES = [
+    "pynullweb.__main__", "pynullweb.content", "pynullweb.header",
+    "pynullweb.response", "pynullweb.hosts", "pynullweb.blocklist"]
+if pynullweb.modes.DEFAULT_MODE == "asyncio":
+    STARTUP_MODULES.append("pynullweb.aioserver")
+else:
+    STARTUP_MODULES.extend(["pynullweb.server", "pynullweb.handler"])
+
+# Modules that must not be imported on start-up, because they are slow to
+# import or to initialize. Some of them are imported by asyncio, they are
+# only checked for the other modes.
+SLOW_MODULES = ["argparse", "base64", "email.utils", "mimetypes", "typing"]
+
+# Upper limit for the time to import all start-up modules, in seconds
+IMPORT_BUDGET = 0.25
+
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+start = time.time()
+for name in %r:
+    __import__(name)
+elapsed = time.time() - start
+json.dump({"elapsed": elapsed, "modules": sorted(set(sys.modules) - before)},
+          sys.stdout)
+"""
+
+
+def probe_startup():
+    """Import the start-up modules in a fresh interpreter.
+
+    Return the import time and the names of all newly imported modules.
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-c", PROBE % (STARTUP_MODULES,)])
+    result = json.loads(output.decode("utf-8"))
+    return result["elapsed"], result["modules"]
+
+
+class StartupTestCase(unittest.TestCase):
+    """Test that the server starts fast."""
+
+    def test_no_slow_imports(self):
+        """Slow modules of the standard library are not imported."""
+        baseline = subprocess.check_output([
+            sys.executable, "-c",
+            "import sys; sys.stdout.write(' '.join(sys.modules))"
+            if pynullweb.modes.DEFAULT_MODE != "asyncio" else
+            "import asyncio, sys; sys.stdout.write(' '.join(sys.modules))"])
+        preloaded = set(baseline.decode("utf-8").split())
+        _, modules = probe_startup()
+        for name in SLOW_MODULES:
+            if name not in preloaded:
+                self.assertNotIn(name, modules)
+
+    def test_import_budget(self):
+        """Importing the start-up modules stays within its time budget."""
+        elapsed = min(probe_startup()[0] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Test tls module.
+
+:copyright: (c) 2017 by Detlef Kreuz
+:license: Apache 2.0, see LICENSE
+"""
+
+import os
+import shutil
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import pynullweb.tls
+
+HAS_OPENSSL = any(
+    os.access(os.path.join(directory, "openssl"), os.X_OK)
+    for directory in os.environ.get("PATH", "").split(os.pathsep))
+
+
+def client_context(authority):
+    """Return a client context that trusts only the authority."""
+    context = ssl.create_default_context(cafile=authority.ca_cert)
+    context.check_hostname = True
+    return context
+
+
+class ValidNameTestCase(unittest.TestCase):
+    """Test function tls.valid_name."""
+
+    def test_valid(self):
+        """Host names are normalized to lower case."""
+        self.assertEqual(
+            "ads.example.com", pynullweb.tls.valid_name("Ads.Example.COM."))
+        self.assertEqual("x_1.b-2.c", pynullweb.tls.valid_name("x_1.b-2.c"))
+
+    def test_invalid(self):
+        """Names that cannot be part of a file name or subject are rejected."""
+        for name in (None, "", "../etc", "a/b", "a..b", "-a.b", "a b",
+                     "a,CN=b", "x" * 254):
+            self.assertIsNone(pynullweb.tls.valid_name(name), name)
+
+
+@unittest.skipUnless(HAS_OPENSSL, "needs the openssl tool")
+class ContextCacheTestCase(unittest.TestCase):
+    """Test classes tls.CertificateAuthority and tls.ContextCache."""
+
+    def setUp(self):
+        """Create a certificate authority in a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.authority = pynullweb.tls.CertificateAuthority(self.directory)
+        self.client_context = None
+
+    def handshake(self, contexts, name, session=None):
+        """Connect to the default context, return the client socket."""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        client_socket = socket.create_connection(listener.getsockname(), 5)
+        server_socket, _ = listener.accept()
+
+        def serve():
+            """Do the server side of the handshake, send one byte."""
+            try:
+                connection = contexts.default.wrap_socket(
+                    server_socket, server_side=True)
+                connection.sendall(b"x")
+                connection.recv(1)
+            except (socket.error, ssl.SSLError):
+                pass
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(server_socket.close)
+        self.addCleanup(client_socket.close)
+        options = {} if session is None else {"session": session}
+        if self.client_context is None:
+            self.client_context = client_context(self.authority)
+        client = self.client_context.wrap_socket(
+            client_socket, server_hostname=name, **options)
+        self.assertEqual(b"x", client.recv(1))
+        return client
+
+    def test_mint(self):
+        """Certificates are minted per server name and verified by clients."""
+        contexts = pynullweb.tls.ContextCache(self.authority)
+        client = self.handshake(contexts, "ads.example.com")
+        subject = dict(item[0] for item in client.getpeercert()["subject"])
+        self.assertEqual("ads.example.com", subject["commonName"])
+        self.handshake(contexts, "tracker.example.org")
+        self.assertEqual(3, self.authority.minted)
+        self.assertEqual(2, len(contexts))
+        self.assertEqual(0, contexts.failures)
+
+    def test_private_keys(self):
+        """Keys and their directory are accessible by the owner only."""
+        authority = pynullweb.tls.CertificateAuthority(
+            os.path.join(self.directory, "new"))
+        authority.setup()
+        for path in (authority.directory, authority.certs):
+            self.assertEqual(0o700, os.stat(path).st_mode & 0o777, path)
+        for path in (authority.ca_key, authority.leaf_key):
+            self.assertEqual(0o600, os.stat(path).st_mode & 0o777, path)
+
+    def test_reuse_certificates(self):
+        """Certificates are kept in the directory of the authority."""
+        pynullweb.tls.ContextCache(self.authority).get("ads.example.com")
+        authority = pynullweb.tls.CertificateAuthority(self.directory)
+        pynullweb.tls.ContextCache(authority).get("ads.example.com")
+        self.assertEqual(0, authority.minted)
+
+    def test_lru(self):
+        """The least recently used contexts are dropped."""
+        contexts = pynullweb.tls.ContextCache(self.authority, 2)
+        for name in ("a.example", "b.example", "a.example", "c.example",
+                     "a.example", "b.example"):
+            contexts.get(name)
+        self.assertEqual(2, len(contexts))
+        self.assertEqual(2, contexts.hits)
+        self.assertEqual(4, contexts.misses)
+
+    def test_failure(self):
+        """If no certificate can be minted, the default one is sent."""
+        contexts = pynullweb.tls.ContextCache(self.authority)
+        self.authority.openssl = os.path.join(self.directory, "missing")
+        with self.assertRaises((socket.error, ValueError)):
+            self.handshake(contexts, "ads.example.com")
+        self.assertEqual(1, contexts.failures)
+
+    def test_concurrent(self):
+        """Concurrent requests for a new server name mint it once."""
+        contexts = pynullweb.tls.ContextCache(self.authority)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                contexts.get("ads.example.com"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(4, len(results))
+        self.assertEqual(1, len(set(id(context) for context in results)))
+        self.assertEqual(2, self.authority.minted)
+
+    def test_no_wait(self):
+        """Without waiting, certificates are minted in the background."""
+        contexts = pynullweb.tls.ContextCache(self.authority, wait=False)
+        with self.assertRaises((socket.error, ValueError)):
+            self.handshake(contexts, "ads.example.com")
+        deadline = time.time() + 10
+        while not len(contexts) and time.time() < deadline:
+            time.sleep(0.05)
+        client = self.handshake(contexts, "ads.example.com")
+        subject = dict(item[0] for item in client.getpeercert()["subject"])
+        self.assertEqual("ads.example.com", subject["commonName"])
+        self.assertEqual(0, contexts.failures)
+
+    def test_mint_queue(self):
+        """Names are minted one by one, too many waiting ones are dropped."""
+        size = pynullweb.tls.MINT_QUEUE_SIZE
+        pynullweb.tls.MINT_QUEUE_SIZE = 2
+        self.addCleanup(setattr, pynullweb.tls, "MINT_QUEUE_SIZE", size)
+        contexts = pynullweb.tls.ContextCache(self.authority, wait=False)
+        release = threading.Event()
+        run = self.authority.run
+
+        def blocked_run(*args):
+            """Run openssl after the test releases it."""
+            release.wait(10)
+            return run(*args)
+
+        self.authority.run = blocked_run
+        contexts.mint("a.example")
+        deadline = time.time() + 10
+        while "a.example" not in contexts._minting and \
+                time.time() < deadline:  # pylint: disable=protected-access
+            time.sleep(0.01)
+        for name in ("b.example", "c.example", "d.example", "b.example"):
+            contexts.mint(name)
+        self.assertEqual(1, contexts.dropped)
+        release.set()
+        while len(contexts) < 3 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(3, len(contexts))
+        self.assertEqual(4, self.authority.minted)
+
+    def test_prune(self):
+        """The oldest certificates are removed, if there are too many."""
+        self.authority.max_certificates = 3
+        self.authority.setup()
+        for number, name in enumerate("abcde"):
+            path = os.path.join(self.authority.certs, name + ".crt")
+            with open(path, "w") as certificate_file:
+                certificate_file.write("x")
+            os.utime(path, (1000 + number, 1000 + number))
+        self.authority.certificate("ads.example.com")
+        self.assertEqual(
+            ["ads.example.com.crt", "d.crt", "e.crt"],
+            sorted(os.listdir(self.authority.certs)))
+
+    @unittest.skipIf(sys.version_info < (3, 6), "needs SSLSocket.session")
+    def test_session_resumption(self):
+        """Repeated handshakes of a client resume its session."""
+        contexts = pynullweb.tls.ContextCache(self.authority)
+        client = self.handshake(contexts, "ads.example.com")
+        self.assertFalse(client.session_reused)
+        client = self.handshake(
+            contexts, "ads.example.com", session=client.session)
+        self.assertTrue(client.session_reused)
+
+
+if __name__ == '__main__':
+    unittest.main()